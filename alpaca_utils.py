@@ -1,310 +1,324 @@
-from alpaca.data.live import StockDataStream
-from alpaca.data.models import Trade, Quote, Bar
-from alpaca.data.enums import DataFeed
+from market_stream import MarketDataStream, Trade, Quote, Bar, SIP_URL
+    # NOTE: nothing under alpaca.data is imported on the live path, its __init__ alone loads pandas/numpy/pydantic models
+    # historical client/requests, bar_seeder and indicators (numpy) are imported in seed_history_recalc_on_bar, the only user
 
-from alpaca.data.historical.stock import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
-from alpaca.data.timeframe import TimeFrame
-
-import pandas as pd
-import pandas_ta as ta
 import statistics
-
-from alpaca.trading.client import TradingClient
-from alpaca.trading.requests import MarketOrderRequest
-from alpaca.trading.requests import LimitOrderRequest
-from alpaca.trading.enums import OrderSide, TimeInForce, OrderType
-
-import datetime, pytz, asyncio, aiofiles
-from decimal import Decimal, ROUND_UP, ROUND_DOWN
-from collections import defaultdict, deque
-from dataclasses import dataclass
+from market_state import MarketState, timestamp_ns
+from market_bus import MarketBus
+from bar_aggregator import BarAggregator
+
+from order_gateway import OrderGateway, BUY, SELL, MARKET, LIMIT, DAY
+import pricing
+from order_manager import OrderManager
+from trade_stream import TradeUpdatesStream, PAPER_STREAM_URL, LIVE_STREAM_URL, stream_url
+from log_sink import LogSink
+from feed_monitor import FeedMonitor
+from metrics import registry as metrics
+from journal import CLOSE_ALL_EXIT
+
+import datetime, asyncio, time
+from collections import defaultdict
 
 from dotenv import load_dotenv
 import os
-import json
-
-import tracemalloc
-tracemalloc.start()
 
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
 SECRET_KEY = os.getenv("SECRET_KEY")
 USE_PAPER_TRADING = os.getenv("USE_PAPER_TRADING")
+TRADING_URL_OVERRIDE = os.getenv("TRADING_URL_OVERRIDE") # e.g. fake_broker.py for local testing
+STREAM_URL_OVERRIDE = os.getenv("STREAM_URL_OVERRIDE") # e.g. fake_stream.py for local testing
+
+from config_store import store as config_store
+import clock
+
+# entry filter thresholds, module-level so replay.py can tune them offline
+GAP_UP_THRESHOLD = 1.015 # 1.5%, TWEAK
+GAP_UP_CONSOLIDATION_TICKS = 100 # TWEAK
+ENTRY_CONSOLIDATION_TICKS = 50 # TWEAK
+
+# ghost tick filter: drop trades with no quote within GHOST_MAX_GAP_NS, or priced outside the quote +/- GHOST_TOLERANCE
+    # off unless GHOST_FILTER=1, also subscribes the quote stream when on
+GHOST_FILTER = os.getenv("GHOST_FILTER") == "1"
+GHOST_MAX_GAP_NS = 1_000_000_000 # 1sec
+GHOST_TOLERANCE = 0.02 # 2.0%
+
+# extended-hours limit prices (pricing.py): LIMIT_PRICING=last -> last trade +/- LIMIT_OFFSET (default)
+    # LIMIT_PRICING=quote -> LIMIT_THROUGH_TICKS through the latest bid/ask (subscribes the quote stream),
+    # falls back to last trade when the quote is missing, older than LIMIT_QUOTE_MAX_AGE_NS or crossed
+LIMIT_PRICING = os.getenv("LIMIT_PRICING", "last")
+LIMIT_OFFSET = 0.01 # 1%
+LIMIT_THROUGH_TICKS = 2
+LIMIT_QUOTE_MAX_AGE_NS = 2_000_000_000 # 2sec
+SUBSCRIBE_QUOTES = GHOST_FILTER or LIMIT_PRICING == "quote"
+
+# feed lag (exchange trade timestamp -> handle_trade) past FEED_LAG_DEGRADE_MS -> degraded mode for that symbol until it's back
+    # under FEED_LAG_RECOVER_MS: stock_stream passes on only its newest round lot per websocket frame, no per-tick log lines
+    # one alert when the first symbol degrades and one when the last recovers (feed_monitor.py)
+    # conflated trades are missing from trade-built bars (bar_aggregator), the stream's 1m bars still carry them
+FEED_LAG_DEGRADE_MS = float(os.getenv("FEED_LAG_DEGRADE_MS", "500"))
+FEED_LAG_RECOVER_MS = float(os.getenv("FEED_LAG_RECOVER_MS", "100"))
+
+market_state = MarketState() # symbol -> SymbolState (prices, highs, bar data, gap/tick filter counters)
+bar_aggregator = BarAggregator(timeframes=(5, 15)) # 1m stream bars (trades when bars are late) -> 5m/15m bar-close events
+market_bus = MarketBus(market_state) # change notifications + snapshots of market_state for the strategy (market_bus.py)
+
+
+# ===== FEED LAG ===== #
+feed_alert = None # e.g. main's notifier, called with a message when a symbol enters/leaves degraded mode
+
+def set_feed_alert(callback):
+    global feed_alert
+    feed_alert = callback
+
+def on_feed_lag_change(symbol, degraded, lag_ms):
+    metrics.count("feed_degraded", symbol, "on" if degraded else "off")
+    if degraded and len(feed_monitor.degraded) == 1:
+        message = f"Feed {lag_ms:.0f}ms behind on {symbol}, degraded: conflating ticks, per-tick logs off"
+    elif not degraded and not feed_monitor.degraded:
+        message = f"Feed caught up ({symbol} {lag_ms:.0f}ms), back to per-tick processing"
+    else:
+        return # mid-episode, per-symbol switches are in metrics (feed_degraded)
+    print(f"[FEED] {message}")
+    if feed_alert is not None:
+        feed_alert(message)
 
-CONFIG_PATH = "configs.json"
-with open("configs.json", "r") as f:
-    configs = json.load(f)
-
-gap_up_first_tick = {}
-gap_counter = {}
-last_tick = {}
-tick_counter = {}
-
-latest_prices = {}
-day_high = {}
-
-latest_macd = {}
-latest_rsi = {}
+feed_monitor = FeedMonitor(FEED_LAG_DEGRADE_MS, FEED_LAG_RECOVER_MS, on_change=on_feed_lag_change)
 
-vwaps = {}
-latest_highs = {}
-latest_timestamps = {}
 
-eastern = pytz.timezone("US/Eastern")
-now = datetime.datetime.now(eastern)
+# per-symbol wakeups (wait_for_update), set from market_bus on every confirmed price/bar update
+update_events = defaultdict(asyncio.Event)
+update_received_ns = {}
 
-historical_client = StockHistoricalDataClient(api_key=API_KEY, secret_key=SECRET_KEY)
-trading_client = TradingClient(api_key=API_KEY, secret_key=SECRET_KEY, paper=USE_PAPER_TRADING)
-stock_stream = StockDataStream(api_key=API_KEY, secret_key=SECRET_KEY, feed=DataFeed.SIP)
 
+historical_client = None # get_historical_client(), only needed for indicator seeding
+log_sink = LogSink()
+gateway = OrderGateway(api_key=API_KEY, secret_key=SECRET_KEY, paper=USE_PAPER_TRADING, base_url=TRADING_URL_OVERRIDE)
+trade_stream = TradeUpdatesStream(
+    api_key=API_KEY, secret_key=SECRET_KEY,
+    url=stream_url(TRADING_URL_OVERRIDE) if TRADING_URL_OVERRIDE else (PAPER_STREAM_URL if USE_PAPER_TRADING else LIVE_STREAM_URL),
+)
+stock_stream = MarketDataStream(api_key=API_KEY, secret_key=SECRET_KEY, url=STREAM_URL_OVERRIDE or SIP_URL)
 
-# ===== WEBSOCKETS, DATA STREAM HANDLERS + MACD CALC ===== #
-@dataclass
-class QuoteEntry:
-    bid: float
-    ask: float
-    timestamp: datetime.datetime
+metrics.gauge("log_queue_depth", lambda: len(log_sink.buffer)) # module lookups, replay/benchmarks swap these
+metrics.gauge("log_dropped", lambda: log_sink.dropped)
+metrics.gauge("degraded_symbols", lambda: len(feed_monitor.degraded))
+metrics.gauge("conflated_trades", lambda: stock_stream.conflated)
+metrics.gauge("working_orders", lambda: sum(len(orders) for orders in order_manager.working.values()))
 
-@dataclass
-class BarEntry:
-    open: float
-    high: float
-    low: float
-    close: float
-    volume: int
-    vwap: float
-    timestamp: datetime.datetime
 
+# ===== WEBSOCKETS, DATA STREAM HANDLERS + INDICATORS ===== #
 class DataHandler:
     def __init__(self):
-        self.quote_window = defaultdict(lambda: deque(maxlen=500))
-        self.bar_window = defaultdict(lambda: deque(maxlen=5))
-            # consider getting rid of deque altogether...
-            # and computing EMAs incrementally, manually... (without pandas-ta)
+        self.indicators = None # symbol -> SymbolIndicators, O(1) per bar RSI/MACD/EMA/ATR/VWAP, created on first use
+        self.last_fed = None # symbol -> ns start of the last 15m bar fed to its indicators, once seeding starts
+
+    def symbol_indicators(self, symbol):
+        if self.indicators is None:
+            from indicators import SymbolIndicators # numpy, deferred until an indicator feature asks for it
+            self.indicators = defaultdict(SymbolIndicators)
+        return self.indicators[symbol]
 
     async def handle_quote(self, quote: Quote):
-        self.quote_window[quote.symbol].append(
-            QuoteEntry(
-                bid=quote.bid_price,
-                ask=quote.ask_price,
-                timestamp=quote.timestamp
-            )
-        )
+        market_state[quote.symbol].quotes.append(timestamp_ns(quote.timestamp), quote.bid_price, quote.ask_price)
 
     async def handle_trade(self, trade: Trade):
-        symbol = trade.symbol
-        trade_time = trade.timestamp
-        trade_price = trade.price
-        setup = next((s for s in configs if s["symbol"] == symbol), None)
-        entry = setup["entry_price"]
-        exit = setup["stop_loss"]
-        now = datetime.datetime.now(eastern)
-
-        #quotes: deque[QuoteEntry] = self.quote_window[symbol]
-        #if not quotes:
-        #    async with aiofiles.open(f"price-stream-logs/price_stream_log_{trade.symbol}.txt", "a") as file:
-        #        await file.write(f"[GHOST no quotes] {now},{trade.symbol},PRICE {trade.price},VOL {trade.size}, COND {trade.conditions}" + "\n")
-        #    return
-        
-        #closest_quote = min(quotes, key=lambda q: abs((q.timestamp - trade_time).total_seconds()))
-        #if abs((closest_quote.timestamp - trade_time).total_seconds()) > 1:
-        #    async with aiofiles.open(f"price-stream-logs/price_stream_log_{trade.symbol}.txt", "a") as file:
-        #        await file.write(f"[GHOST >1sec gap] {now},{trade.symbol},PRICE {trade.price},VOL {trade.size}, COND {trade.conditions}" + "\n")
-        #    return  
-        
-        #tolerance = 0.02 # 2.0%
-        #if not (closest_quote.bid * (1 - tolerance) <= trade_price <= closest_quote.ask * (1 - tolerance)):
-        #    async with aiofiles.open(f"price-stream-logs/price_stream_log_{trade.symbol}.txt", "a") as file:
-        #        await file.write(f"[GHOST >2% price diff] {now},{trade.symbol},PRICE {trade.price},VOL {trade.size}, COND {trade.conditions}" + "\n")
-        #    return
-
-        if trade.size < 100:
-            async with aiofiles.open(f"price-stream-logs/price_stream_log_{trade.symbol}.txt", "a") as file:
-                await file.write(f"[ODD LOT] {now},{trade.symbol},PRICE {trade.price},VOL {trade.size}, COND {trade.conditions}" + "\n")
+        # one trade object (replay, benchmarks, a stream without a batch handler), published right away
+        received_ns = time.perf_counter_ns()
+        now = clock.now()
+        self.fold_trade(trade.symbol, timestamp_ns(trade.timestamp), trade.price, trade.size, trade.conditions, now, timestamp_ns(now), received_ns)
+        market_bus.flush()
+
+    async def handle_trade_batch(self, msgs, received_ns):
+        # stock_stream.trade_batch_handler: a websocket frame's trades as raw dicts, no Trade objects
+            # all folded into market_state first, then one bus flush, so consumers see each symbol's end-of-frame state once
+            # one clock read for the whole frame (log lines and feed lag use the frame's time)
+        now = clock.now()
+        now_ns = timestamp_ns(now)
+        fold_trade = self.fold_trade
+        for msg in msgs:
+            fold_trade(msg["S"], msg["t"].to_unix_nano(), msg["p"], msg["s"], msg.get("c"), now, now_ns, received_ns)
+        market_bus.flush()
+        metrics.observe("frame_us", "", (time.perf_counter_ns() - received_ns) // 1000)
+
+    def fold_trade(self, symbol, trade_ns, trade_price, size, conditions, now, now_ns, received_ns):
+        # entry filters + per-symbol state for one trade; sync, confirmed updates wait in market_bus until the next flush
+        setup = config_store.get(symbol)
+        if setup is None: # removed from configs mid-session
+            return
+        entry = setup.entry_price
+        exit = setup.stop_loss
+        state = market_state[symbol]
+
+        # how far behind the exchange
+        lag_us = (now_ns - trade_ns) // 1000
+        metrics.observe("feed_lag_us", symbol, lag_us)
+        verbose = not feed_monitor.observe(symbol, lag_us, received_ns) # degraded: stock_stream conflates, per-tick lines off
+        verbose = verbose and not log_sink.under_pressure # writer behind: shed the per-tick lines before the ring drops real ones
+
+        if GHOST_FILTER:
+            closest_quote = state.quotes.nearest(trade_ns)
+            if closest_quote is None:
+                log_sink.log("[GHOST no quotes]", now, symbol, trade_price, size, conditions)
+                metrics.count("trade_verdicts", symbol, "ghost")
+                return
+
+            gap_ns, bid, ask = closest_quote
+            if gap_ns > GHOST_MAX_GAP_NS:
+                log_sink.log("[GHOST >1sec gap]", now, symbol, trade_price, size, conditions)
+                metrics.count("trade_verdicts", symbol, "ghost")
+                return
+
+            if not (bid * (1 - GHOST_TOLERANCE) <= trade_price <= ask * (1 + GHOST_TOLERANCE)):
+                log_sink.log("[GHOST >2% price diff]", now, symbol, trade_price, size, conditions)
+                metrics.count("trade_verdicts", symbol, "ghost")
+                return
+
+        bar_aggregator.on_trade(symbol, trade_ns, trade_price, size) # odd lots included, they count towards bar volume
+        state.add_trade(trade_ns, trade_price, size)
+        market_bus.traded(symbol)
+
+        if size < 100:
+            if verbose:
+                log_sink.log("[ODD LOT]", now, symbol, trade_price, size, conditions)
+            metrics.count("trade_verdicts", symbol, "odd_lot")
             return
         
         # if all conditions pass:
         if trade_price > entry:
-            if symbol not in gap_up_first_tick:
-                gap_up_first_tick[symbol] = trade_price
-                gap_counter[symbol] = 0
-            elif symbol not in last_tick:
-                last_tick[symbol] = trade_price
-                tick_counter[symbol] = 0
-
-            if gap_up_first_tick[symbol] > entry:
-                if trade_price > gap_up_first_tick[symbol] * 1.015 or trade_price <= exit: # 1.5%, TWEAK
-                    latest_prices[symbol] = trade_price
-                    if symbol not in day_high or trade_price > day_high[symbol]:
-                        day_high[symbol] = trade_price
-                    async with aiofiles.open(f"price-stream-logs/price_stream_log_{trade.symbol}.txt", "a") as file:
-                        await file.write(f"[GAP UP] {now},{trade.symbol},PRICE {trade.price},VOL {trade.size}, COND {trade.conditions}" + "\n")
+            if state.gap_first_tick is None:
+                state.gap_first_tick = trade_price
+                state.gap_counter = 0
+            elif state.last_tick is None:
+                state.last_tick = trade_price
+                state.tick_counter = 0
+
+            if state.gap_first_tick > entry:
+                if trade_price > state.gap_first_tick * GAP_UP_THRESHOLD or trade_price <= exit:
+                    state.last_price = trade_price
+                    if state.day_high is None or trade_price > state.day_high:
+                        state.day_high = trade_price
+                    market_bus.publish(symbol, received_ns)
+                    log_sink.log("[GAP UP]", now, symbol, trade_price, size, conditions)
+                    metrics.count("trade_verdicts", symbol, "gap_up")
                 else:
-                    gap_counter[symbol] += 1
-                    async with aiofiles.open(f"price-stream-logs/price_stream_log_{trade.symbol}.txt", "a") as file:
-                        await file.write(f"[GAP UP - {gap_counter[symbol]}/100] {now},{trade.symbol},PRICE {trade.price},VOL {trade.size}, COND {trade.conditions}" + "\n")
-
-                if gap_counter[symbol] >= 100: # 100 consolidation ticks, TWEAK
-                    gap_up_first_tick[symbol] = 0 # only tracked once, then last_tick tracked instead
-                    async with aiofiles.open(f"price-stream-logs/price_stream_log_{trade.symbol}.txt", "a") as file:
-                        await file.write(f"[GAP UP MONITORING ENDED] {now},{trade.symbol},PRICE {trade.price},VOL {trade.size}, COND {trade.conditions}" + "\n")
+                    state.gap_counter += 1
+                    if verbose:
+                        log_sink.log(f"[GAP UP - {state.gap_counter}/{GAP_UP_CONSOLIDATION_TICKS}]", now, symbol, trade_price, size, conditions)
+                    metrics.count("trade_verdicts", symbol, "gap_up_hold")
+
+                if state.gap_counter >= GAP_UP_CONSOLIDATION_TICKS:
+                    state.gap_first_tick = 0 # only tracked once, then last_tick tracked instead
+                    log_sink.log("[GAP UP MONITORING ENDED]", now, symbol, trade_price, size, conditions)
             else:
-                if exit < trade_price < last_tick[symbol]:
-                    tick_counter[symbol] += 1
-                    async with aiofiles.open(f"price-stream-logs/price_stream_log_{trade.symbol}.txt", "a") as file:
-                        await file.write(f"[>ENTRY - {tick_counter[symbol]}/50] {now},{trade.symbol},PRICE {trade.price},VOL {trade.size}, COND {trade.conditions}" + "\n")
+                if exit < trade_price < state.last_tick:
+                    state.tick_counter += 1
+                    if verbose:
+                        log_sink.log(f"[>ENTRY - {state.tick_counter}/{ENTRY_CONSOLIDATION_TICKS}]", now, symbol, trade_price, size, conditions)
+                    metrics.count("trade_verdicts", symbol, "entry_hold")
                 else:
-                    latest_prices[symbol] = trade_price
-                    if symbol not in day_high or trade_price > day_high[symbol]:
-                        day_high[symbol] = trade_price
-                    async with aiofiles.open(f"price-stream-logs/price_stream_log_{trade.symbol}.txt", "a") as file:
-                        await file.write(f"[CONFIRMED TICK] {now},{trade.symbol},PRICE {trade.price},VOL {trade.size}, COND {trade.conditions}" + "\n")
-
-                if tick_counter[symbol] >= 50:
-                    last_tick.pop(symbol)
-                    async with aiofiles.open(f"price-stream-logs/price_stream_log_{trade.symbol}.txt", "a") as file:
-                        await file.write(f"[>ENTRY MONITORING ENDED] {now},{trade.symbol},PRICE {trade.price},VOL {trade.size}, COND {trade.conditions}" + "\n")
+                    state.last_price = trade_price
+                    if state.day_high is None or trade_price > state.day_high:
+                        state.day_high = trade_price
+                    market_bus.publish(symbol, received_ns)
+                    log_sink.log("[CONFIRMED TICK]", now, symbol, trade_price, size, conditions)
+                    metrics.count("trade_verdicts", symbol, "confirmed")
+
+                if state.tick_counter >= ENTRY_CONSOLIDATION_TICKS:
+                    state.last_tick = None
+                    log_sink.log("[>ENTRY MONITORING ENDED]", now, symbol, trade_price, size, conditions)
         elif trade_price <= exit:
-            latest_prices[symbol] = trade_price
-            async with aiofiles.open(f"price-stream-logs/price_stream_log_{trade.symbol}.txt", "a") as file:
-                await file.write(f"[AROUND EXIT] {now},{trade.symbol},PRICE {trade.price},VOL {trade.size}, COND {trade.conditions}" + "\n")
+            state.last_price = trade_price
+            market_bus.publish(symbol, received_ns)
+            log_sink.log("[AROUND EXIT]", now, symbol, trade_price, size, conditions)
+            metrics.count("trade_verdicts", symbol, "around_exit")
+        else:
+            metrics.count("trade_verdicts", symbol, "between") # stop < price <= entry, nothing to act on
 
         
         #else:
-        #    latest_prices[symbol] = trade_price
-        #    if symbol not in day_high or trade_price > day_high[symbol]:
-        #        day_high[symbol] = trade_price
+        #    state.last_price = trade_price
+        #    if state.day_high is None or trade_price > state.day_high:
+        #        state.day_high = trade_price
 
         # print(f"[WebSocket] {trade.symbol} @ {trade.price}") # comment out while not testing
 
-        #async with aiofiles.open(f"price-stream-logs/price_stream_log_{trade.symbol}.txt", "a") as file:
-        #    await file.write(f"{now},{trade.symbol},PRICE {trade.price},VOL {trade.size}, COND {trade.conditions}" + "\n")
+        #log_sink.log("", now, symbol, trade_price, size, conditions)
 
     async def handle_bar(self, bar: Bar): 
-        self.bar_window[bar.symbol].append(
-            BarEntry(
-                open=bar.open,
-                high=bar.high,
-                low=bar.low,
-                close=bar.close,
-                volume=bar.volume,
-                vwap=bar.vwap,
-                timestamp=bar.timestamp
-            )
-        )
-        # bars = list(self.bar_window[bar.symbol])
-        # latest_macd[bar.symbol] = self.compute_macd(pd.DataFrame([b.__dict__ for b in bars]))
-        # latest_rsi[bar.symbol] = self.compute_rsi(pd.DataFrame([b.__dict__ for b in bars]))
-
-        vwaps.setdefault(bar.symbol, []).append(bar.vwap)
+        received_ns = time.perf_counter_ns()
+        state = market_state[bar.symbol]
+        bar_ns = timestamp_ns(bar.timestamp)
+        state.bars.append(bar_ns, bar.open, bar.high, bar.low, bar.close, bar.volume, bar.vwap)
+        bar_aggregator.on_bar(bar.symbol, bar_ns, bar.open, bar.high, bar.low, bar.close, bar.volume, bar.vwap) # 5m/15m closes fire from here
 
         # VWAP STDEV (NOT IN USE):
-        #if len(vwaps[bar.symbol]) > 1:
-        #    vwap_stdevs[bar.symbol] = statistics.stdev(vwaps[bar.symbol])
+        #if len(state.bars) > 1:
+        #    vwap_stdevs[bar.symbol] = statistics.stdev(state.bars.column("vwap"))
 
-        # 5MIN BARS (NOT IN USE):
-        #if len(self.bar_window[bar.symbol]) == 5:
-        #    last_entry = self.bar_window[bar.symbol][-1]
-        #    latest_5m_closes[bar.symbol] = last_entry.close
+        state.vwap = bar.vwap
+        state.high_1m = bar.high
+        state.bar_timestamp = bar.timestamp
+        market_bus.publish(bar.symbol, received_ns)
+        market_bus.flush()
 
-        #    bar_highs = []
-        #    for bar_1m in self.bar_window[bar.symbol]:
-        #        bar_highs.append(bar_1m.high)
-        #    latest_5m_highs[bar.symbol] = max(bar_highs)
 
-        #    latest_5m_timestamps[bar.symbol] = last_entry.timestamp
-        #    self.bar_window[bar.symbol].clear()
+    
+    async def seed_history_recalc_on_bar(self, symbols):
+        # one-shot: batched/cached 5m bars (bar_seeder) -> 15m bars -> indicators, call again for symbols added mid-session
+            # after that the indicators move on 15m bar closes from bar_aggregator (on_15m_close), no REST polling
+        from bar_seeder import BarSeeder, resample, MINUTE_NS
+        seeder = BarSeeder(get_historical_client())
+        if self.last_fed is None:
+            self.last_fed = {}
+            bar_aggregator.subscribe(15, self.on_15m_close)
+
+        lookback = datetime.timedelta(minutes=20 * 15) # 20 bars, 100 for macd, 20 for rsi
+        width = 15 * MINUTE_NS
+        now = clock.now()
+        bars = await seeder.bars(symbols, now - lookback, now)
+        complete_until = seeder.complete_until(now)
+
+        for symbol, symbol_bars in bars.items():
+            # NOTE: bar timestamps are the START of the bar, e.g. 10:00 = 10:00-10:14:59
+            bars_15m = resample(symbol_bars, 15)
+            bars_15m = bars_15m[bars_15m["ts"] + width <= complete_until]
+            if not len(bars_15m):
+                continue
+            indicators = self.symbol_indicators(symbol)
+            indicators.seed(bars_15m["high"], bars_15m["low"], bars_15m["close"], bars_15m["volume"])
+            self.last_fed[symbol] = int(bars_15m["ts"][-1])
+
+            # 15m bars the stream closed while the fetch was in flight
+            streamed = market_state[symbol].bars_15m
+            for i in range(len(streamed)):
+                ts, open, high, low, close, volume, vwap = streamed.get(i)
+                if ts > self.last_fed[symbol]:
+                    indicators.update(open, high, low, close, volume)
+                    self.last_fed[symbol] = ts
+            self.publish_indicators(symbol, indicators)
+
+    def on_15m_close(self, bar):
+        last_fed = self.last_fed.get(bar.symbol)
+        if last_fed is None or bar.start_ns <= last_fed: # not seeded yet / already in the seed
+            return
+        indicators = self.symbol_indicators(bar.symbol)
+        indicators.update(bar.open, bar.high, bar.low, bar.close, bar.volume)
+        self.last_fed[bar.symbol] = bar.start_ns
+        self.publish_indicators(bar.symbol, indicators)
 
-        last_entry = self.bar_window[bar.symbol][-1]
-        latest_highs[bar.symbol] = last_entry.high
-        latest_timestamps[bar.symbol] = last_entry.timestamp
+    def publish_indicators(self, symbol, indicators):
+        state = market_state[symbol]
+        state.macd = indicators.macd.as_dict()
+        state.rsi = indicators.rsi.value
 
 
-    
-    async def seed_history_recalc_on_bar(self, symbol):
-        lookback_bars = 20 # 100 for macd, 20 for rsi
-        lookback_minutes = lookback_bars * 15
-        now = datetime.datetime.now(eastern)
-        start_time = now - datetime.timedelta(minutes=lookback_minutes)
-        after_first_bar = now.replace(hour=4, minute=14, second=0, microsecond=0)
-
-        request_params = StockBarsRequest(
-            symbol_or_symbols=symbol,
-            timeframe=TimeFrame(5, TimeFrame.Minute),
-            start=start_time,
-            end=now,
-            adjustment="raw",
-            feed="sip"
-        )
-
-        bars = historical_client.get_stock_bars(request_params).df
-        if isinstance(bars.index, pd.MultiIndex):
-            df = bars.xs(symbol, level=0).sort_index()
-        else:
-            df = bars.sort_index()
-    
-        # NOTE: bar timestamps are actually the START of the bar, e.g. 10:00 = 10:00-10:04:59
-        print("TIMESTAMPS", df.index[:5]) # REMOVE LATER - returns DatetimeIndex list/RangeIndex...
-        print("TIMEZONE", df.index.tz) # REMOVE LATER - UTC confirmed
-
-        df_15m = df.resample("15min").agg({
-            "open": "first",
-            "high": "max",
-            "low": "min",
-            "close": "last",
-            "volume": "sum"
-        })
-        df_15m = df_15m.dropna()
-
-        for _, row in df_15m.iterrows():
-            self.bar_window[symbol].append(row)
-        
-        # latest_macd[symbol] = self.compute_macd(sdf)
-        latest_rsi[symbol] = self.compute_rsi(pd.DataFrame(self.bar_window[symbol]))
-        print("SEED DATA", self.bar_window[symbol]) # REMOVE LATER
-        print("SEED RSI", latest_rsi[symbol]) # REMOVE LATER
-
-        last_bar_time = None
-        while True:
-            now = datetime.datetime.now(eastern)
-
-            if now.minute % 15 == 0 and now.second < 2 and now > after_first_bar:
-                latest_bar_request = StockBarsRequest(
-                    symbol_or_symbols=symbol,
-                    timeframe=TimeFrame(5, TimeFrame.Minute),
-                    limit=1
-                )
-
-                bars = historical_client.get_stock_bars(latest_bar_request).df
-                print("BARS", bars.head()) # REMOVE LATER
-                if bars.empty:
-                    await asyncio.sleep(2)
-                    continue
-
-                latest_bar_time = bars.index[-1]
-                if latest_bar_time != last_bar_time:
-                    last_bar_time = latest_bar_time
-
-                    for _, row in bars.iterrows():
-                        self.bar_window[symbol].append(row)
-                    latest_rsi[symbol] = self.compute_rsi(pd.DataFrame(self.bar_window[symbol]))
-                    print("RSI LIST", latest_rsi[symbol]) # REMOVE LATER
-            await asyncio.sleep(1)    
-
-    def compute_macd(self, df: pd.DataFrame) -> pd.DataFrame:
-        if df.empty:
-            return df
-        df = df.copy()
-        macd = ta.macd(df['close'], fast=12, slow=26, signal=9, append=True)
-        return macd
-    
-    def compute_rsi(self, df: pd.DataFrame) -> float:
-        if df.empty:
-            return 0
-        df = df.copy()
-        rsi = ta.rsi(df['close'], length=14)
-        return float(rsi.iloc[-1])
+def get_historical_client():
+    global historical_client
+    if historical_client is None:
+        from alpaca.data.historical.stock import StockHistoricalDataClient
+        historical_client = StockHistoricalDataClient(api_key=API_KEY, secret_key=SECRET_KEY)
+    return historical_client
 
 
 # ===== OPEN/CLOSE STREAM, HANDLER CALL UTILS ===== #
@@ -314,14 +328,16 @@ async def start_price_quote_bar_stream(symbols):
     retries = 0
     while True:
         try:
+            # asyncio.create_task(handler.seed_history_recalc_on_bar(symbols))
+            stock_stream.conflate = feed_monitor.degraded # same set, the stream conflates a symbol while it's degraded
+            stock_stream.trade_batch_handler = handler.handle_trade_batch # a frame's trades in one call, one bus flush per frame
             for symbol in symbols:
-                # asyncio.create_task(handler.seed_history_recalc_on_bar(symbol))
-
                 stock_stream.subscribe_trades(handler.handle_trade, symbol)
-                # stock_stream.subscribe_quotes(handler.handle_quote, symbol)
+                if SUBSCRIBE_QUOTES:
+                    stock_stream.subscribe_quotes(handler.handle_quote, symbol)
                 stock_stream.subscribe_bars(handler.handle_bar, symbol)
             
-            await stock_stream._run_forever()
+            await stock_stream.run_forever()
         except asyncio.CancelledError:
             print("[WebSocket] Cancelled")
             raise
@@ -340,109 +356,196 @@ async def start_price_quote_bar_stream(symbols):
             print("[WebSocket] Stopped gracefully")
             break
 
+# mid-session adds/removes (config watcher, EOD, strategy errors)
+async def subscribe_price_quote_bar_stream(symbol):
+    try:
+        await stock_stream.subscribe("trades", symbol, handler.handle_trade)
+        if SUBSCRIBE_QUOTES:
+            await stock_stream.subscribe("quotes", symbol, handler.handle_quote)
+        await stock_stream.subscribe("bars", symbol, handler.handle_bar)
+        print(f"[{symbol}] price/quote stream subscribed")
+    except Exception as e:
+        print(f"[WebSocket] Error subscribing to {symbol}: {e}")
+
 async def stop_price_quote_bar_stream(symbol):
     try:
-        stock_stream.unsubscribe_trades(symbol)
-        # stock_stream.unsubscribe_quotes(symbol)
-        stock_stream.unsubscribe_bars(symbol)
+        for channel in ("trades", "quotes", "bars"):
+            await stock_stream.unsubscribe(channel, symbol)
+        bar_aggregator.reset(symbol)
         print(f"[{symbol}] price/quote stream unsubscribed")
     except Exception as e:
         print (f"[WebSocket] Error unsubscribing from {symbol}: {e}")
 
 
+
+# ===== EVENT-DRIVEN DISPATCH (to main) ===== #
+def subscribe_updates(callback):
+    # callback(symbol, received_ns) once per flush for each symbol with a confirmed tick/bar, e.g. main's StrategyEngine.notify
+    market_bus.subscribe(callback)
+
+def on_update(symbol, received_ns):
+    update_received_ns[symbol] = received_ns
+    update_events[symbol].set()
+
+market_bus.subscribe(on_update)
+
+async def wait_for_update(symbol, timeout=None):
+    # wakes as soon as the handler publishes a new confirmed tick/bar for this symbol only
+    # timeout keeps time-based checks (EOD exit) running when the ticker goes quiet
+    event = update_events[symbol]
+    if not event.is_set():
+        if not await clock.wait(event, timeout): # simulated time under replay
+            return False
+    event.clear()
+    return True
+
+def get_update_latency_us(symbol):
+    # time since the websocket handler received the update the caller is acting on
+    received_ns = update_received_ns.get(symbol)
+    if received_ns is None:
+        return None
+    return (time.perf_counter_ns() - received_ns) / 1000
+
+
+# ===== BAR CLOSE EVENTS (to main) ===== #
+def record_bar_close(bar):
+    state = market_state[bar.symbol]
+    ring = state.bars_5m if bar.minutes == 5 else state.bars_15m
+    ring.append(bar.start_ns, bar.open, bar.high, bar.low, bar.close, bar.volume, bar.vwap)
+
+for minutes in bar_aggregator.timeframes:
+    bar_aggregator.subscribe(minutes, record_bar_close)
+
+def subscribe_bar_close(minutes, callback):
+    # callback(bar) on every closed 5m/15m bar (bar_aggregator.AggregateBar), e.g. 5m candle take-profit logic
+    bar_aggregator.subscribe(minutes, callback)
+
+def unsubscribe_bar_close(minutes, callback):
+    bar_aggregator.unsubscribe(minutes, callback)
+
+async def run_bar_close_timer():
+    # one wakeup a minute for every symbol: closes bars whose 1m stream bar never came (no trades, lagging feed)
+    minute_ns = 60_000_000_000
+    while True:
+        now_ns = timestamp_ns(clock.now())
+        wake_ns = (now_ns // minute_ns + 1) * minute_ns + bar_aggregator.grace_ns
+        await clock.sleep((wake_ns - now_ns) / 1e9)
+        bar_aggregator.flush(timestamp_ns(clock.now()))
+
+
 # ===== VALUE RETRIEVAL UTILS (to main) ===== #
+def get_snapshot(symbol):
+    # consistent copy of everything the handlers keep for the symbol (market_bus.Snapshot), None before its first message
+    return market_bus.snapshot(symbol)
+
 def get_current_price(symbol):
-    return latest_prices.get(symbol)
+    state = market_state.get(symbol)
+    return state.last_price if state else None
 
 def get_day_high(symbol):
-    return day_high.get(symbol)
+    state = market_state.get(symbol)
+    return state.day_high if state else None
 
 def get_latest_macd(symbol):
-    df = latest_macd.get(symbol)
-    return df.iloc[-1]
+    state = market_state.get(symbol)
+    return state.macd if state else None # {"MACD_12_26_9", "MACDh_12_26_9", "MACDs_12_26_9"}
 
 def get_latest_rsi(symbol):
-    rsi = latest_rsi.get(symbol)
+    state = market_state.get(symbol)
+    rsi = state.rsi if state else None
     if rsi is None:
         return 0
     print(symbol, f"RSI: {rsi}") # REMOVE LATER
     return rsi
 
+def get_last_closed_bar(symbol, minutes=5):
+    # (start_ns, open, high, low, close, volume, vwap) of the last closed 5m/15m bar, None before the first close
+    state = market_state.get(symbol)
+    if state is None:
+        return None
+    ring = state.bars_5m if minutes == 5 else state.bars_15m
+    return ring.get(-1) if len(ring) else None
+
 def get_bar_data(symbol):
-    vwap_list = vwaps.get(symbol)
-    if vwap_list is None:
-        vwap = None
-    else:
-        vwap = vwap_list[-1]
+    state = market_state.get(symbol)
+    if state is None:
+        return None, None, None
 
     #stdev = vwap_stdevs.get(symbol)
     #close_5m = latest_5m_closes.get(symbol)
-    high = latest_highs.get(symbol)
-    timestamp = latest_timestamps.get(symbol)
-
-    return vwap, high, timestamp
+    return state.vwap, state.high_1m, state.bar_timestamp
 
 
 # ===== TRADING CLIENT UTILS ===== #
 def is_intraday():
-    eastern = pytz.timezone("US/Eastern")
-    now = datetime.datetime.now(eastern).time()
-    return (datetime.time(9,30) <= now < datetime.time(16,0))
-
-def place_order(symbol, qty):
-    intraday = is_intraday()
-    tick = get_current_price(symbol)
-
-    if intraday:
-        order_data = MarketOrderRequest(
-            symbol = symbol,
-            qty = qty,
-            side = OrderSide.BUY,
-            type = OrderType.MARKET,
-            time_in_force = TimeInForce.DAY,
-            extended_hours = False
-        )
+    now = clock.now()
+    return clock.session(now).is_intraday(now)
+
+def order_limit_price(symbol, side):
+    state = market_state.get(symbol)
+    if state is None or not state.last_price:
+        return None
+    if LIMIT_PRICING == "quote":
+        quote = state.quotes.latest()
+        if quote is not None and timestamp_ns(clock.now()) - quote[0] <= LIMIT_QUOTE_MAX_AGE_NS:
+            price = pricing.quote_limit_price(quote[1], quote[2], side, LIMIT_THROUGH_TICKS)
+            if price is not None:
+                return price
+    return pricing.limit_price(state.last_price, side, LIMIT_OFFSET)
+
+def reprice_limit(order):
+    # OrderManager deadline: same rule off the latest price/quote, None (cancel) if the symbol has no price
+    return order_limit_price(order.symbol, order.side)
+
+order_manager = OrderManager(gateway, stream=trade_stream, reprice=reprice_limit) # working orders, fills from trade_updates
+
+async def place_order(symbol, qty):
+    # returns order_manager.TrackedOrder, await order_manager.wait_final(order) for fills
+    if is_intraday():
+        order_data = {
+            "symbol": symbol,
+            "qty": str(qty),
+            "side": BUY,
+            "type": MARKET,
+            "time_in_force": DAY,
+            "extended_hours": False
+        }
     else:
-        order_data = LimitOrderRequest(
-            symbol = symbol,
-            qty = qty,
-            side = OrderSide.BUY,
-            type = OrderType.LIMIT,
-            time_in_force = TimeInForce.DAY,
-            limit_price = float(Decimal(tick * 1.01).quantize(Decimal("0.01"), rounding=ROUND_UP)) if tick >= 1.00 else float(Decimal(tick * 1.01).quantize(Decimal("0.0001"), rounding=ROUND_UP)),
-            extended_hours = True
-        )
-    order = trading_client.submit_order(order_data)
-    return order
-
-
-def close_position(symbol, qty):
-    intraday = is_intraday()
-    tick = get_current_price(symbol)
-
-    if not intraday:
-        order_data = LimitOrderRequest(
-            symbol = symbol,
-            qty = qty,
-            side = OrderSide.SELL,
-            type = OrderType.LIMIT,
-            time_in_force = TimeInForce.DAY,
-            limit_price = float(Decimal(tick * 0.99).quantize(Decimal("0.01"), rounding=ROUND_DOWN)) if tick >= 1.00 else float(Decimal(tick * 0.99).quantize(Decimal("0.0001"), rounding=ROUND_DOWN)),
-            extended_hours = True
-        )
-        order = trading_client.submit_order(order_data)
-        return order
+        order_data = {
+            "symbol": symbol,
+            "qty": str(qty),
+            "side": BUY,
+            "type": LIMIT,
+            "time_in_force": DAY,
+            "limit_price": order_limit_price(symbol, BUY),
+            "extended_hours": True
+        }
+    return await order_manager.submit(order_data)
+
+
+async def close_position(symbol, qty):
+    if not is_intraday():
+        order_data = {
+            "symbol": symbol,
+            "qty": str(qty),
+            "side": SELL,
+            "type": LIMIT,
+            "time_in_force": DAY,
+            "limit_price": order_limit_price(symbol, SELL),
+            "extended_hours": True
+        }
+        return await order_manager.submit(order_data)
     else:
-        return trading_client.close_position(symbol, qty)
+        return await order_manager.close_position(symbol, qty)
 
-def close_all_positions():
+async def close_all_positions(journal=None):
+    # journal: journal.Journal to record the closes in (main.journal)
     try:
-        results = trading_client.close_all_positions()    
-        eastern = pytz.timezone("US/Eastern")
-        now = datetime.datetime.now(eastern)
+        results = await gateway.close_all_positions()
         for r in results:
-            print(f"Closed: {r.symbol} - Qty: {r.qty}")
-            with open("trade-log/trade_log.txt", "a") as file:
-                file.write(f"{now}, {r.get('symbol')}, {r.get('qty')}, EOD Exit; break even" + "\n")
+            order = r.get("body") or {}
+            print(f"Closed: {r.get('symbol')} - Qty: {order.get('qty')}")
+            if journal is not None:
+                journal.record(CLOSE_ALL_EXIT, r.get("symbol"), order.get("qty") or 0, None)
     except Exception as e:
         print(f"Failed to close positions: {e}")
@@ -0,0 +1,317 @@
+import argparse
+import datetime
+import glob
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from clock import Session
+from day_trades import DAILY_LIMIT, WINDOW_LIMIT, window_start
+
+
+# parameter grid defaults = the live # TWEAK values
+DEFAULT_GRID = {
+    "gap_up": [1.015],          # alpaca_utils.GAP_UP_THRESHOLD
+    "gap_ticks": [100],         # alpaca_utils.GAP_UP_CONSOLIDATION_TICKS
+    "entry_ticks": [50],        # alpaca_utils.ENTRY_CONSOLIDATION_TICKS
+    "pwap_ratio": [1.5],        # main.step take-profit pwap_ratio
+    "band": [0.015],            # main.step 1m high band (0.985/1.015)
+}
+
+DAY_NS = 86_400_000_000_000
+DAY_SHIFT_NS = 5 * 3_600_000_000_000 # 04:00-20:00 ET always lands on one (ts - 5h) // day bucket
+
+# replay.py binary capture, read straight into columns
+CAPTURE_DTYPE = np.dtype([("ts", "<i8"), ("kind", "u1"), ("symbol", "S8"), ("f", "<f8", (6,))])
+
+
+# ===== DATA ===== #
+def load_capture(path):
+    records = np.fromfile(path, dtype=CAPTURE_DTYPE)
+    data = {}
+    for symbol in np.unique(records["symbol"]):
+        rows = records[records["symbol"] == symbol]
+        trades = rows[rows["kind"] == 0]
+        bars = rows[rows["kind"] == 1]
+        data[symbol.decode()] = {
+            "tick_ts": trades["ts"],
+            "tick_price": trades["f"][:, 0].copy(),
+            "tick_size": trades["f"][:, 1].copy(),
+            "bar_ts": bars["ts"],   # bar start, delivered at +1m
+            "bar_high": bars["f"][:, 1].copy(),
+            "bar_vwap": bars["f"][:, 5].copy(),
+        }
+    return data
+
+def merge_data(datasets):
+    merged = {}
+    for data in datasets:
+        for symbol, arrays in data.items():
+            if symbol not in merged:
+                merged[symbol] = arrays
+            else:
+                merged[symbol] = {k: np.concatenate([merged[symbol][k], v]) for k, v in arrays.items()}
+    for arrays in merged.values():
+        tick_order = np.argsort(arrays["tick_ts"], kind="stable")
+        bar_order = np.argsort(arrays["bar_ts"], kind="stable")
+        for k in ("tick_ts", "tick_price", "tick_size"):
+            arrays[k] = arrays[k][tick_order]
+        for k in ("bar_ts", "bar_high", "bar_vwap"):
+            arrays[k] = arrays[k][bar_order]
+    return merged
+
+def load_configs(path):
+    # either a configs.json list used for every day, or {"YYYY-MM-DD": [setups...]} for per-day watchlists
+    with open(path, "r") as f:
+        raw = json.load(f)
+    if isinstance(raw, list):
+        return {None: {s["symbol"]: s for s in raw}}
+    return {datetime.date.fromisoformat(d): {s["symbol"]: s for s in setups} for d, setups in raw.items()}
+
+
+# ===== SIMULATION ===== #
+# one symbol-day, every parameter set at once...
+    # state lives in length-G arrays (G = grid size), each message updates all sets with a few numpy ops
+    # mirrors DataHandler.handle_trade (odd lot / gap up / >ENTRY filters) and main.step exits
+    # NOTE: ticks strictly between stop and entry change nothing in handle_trade and are skipped
+    # NOTE: fills assumed at the decision tick's price
+def simulate_day(setup, day, arrays, grid):
+    entry = float(setup["entry_price"])
+    stop = float(setup["stop_loss"])
+    gap_up, gap_ticks, entry_ticks, pwap_ratio, band = (grid[k] for k in ("gap_up", "gap_ticks", "entry_ticks", "pwap_ratio", "band"))
+    G = len(gap_up)
+
+    gap_first = np.full(G, np.nan)
+    gap_counter = np.zeros(G, dtype=np.int64)
+    last_tick = np.full(G, np.nan)
+    tick_counter = np.zeros(G, dtype=np.int64)
+    latest = np.full(G, np.nan)
+
+    position = np.zeros(G) # fraction of qty held
+    took_half = np.zeros(G, dtype=bool)
+    done = np.zeros(G, dtype=bool)
+    fill = np.full(G, np.nan)
+    pnl = np.zeros(G) # % of position, additive like eod_report
+    entry_ts = np.full(G, -1, dtype=np.int64)
+    gate_ts = np.full(G, -1, dtype=np.int64)
+    gate_high = np.zeros(G)
+
+    session = Session(day) # same clock.LAST_ENTRY/EOD_EXIT as main.step
+    last_entry_ns = session.last_entry_ns
+    eod_ns = session.eod_exit_ns
+
+    tick_ts, tick_price, tick_size = arrays["tick_ts"], arrays["tick_price"], arrays["tick_size"]
+    bar_ts, bar_high, bar_vwap = arrays["bar_ts"], arrays["bar_high"], arrays["bar_vwap"]
+    bar_arrival = bar_ts + 60_000_000_000
+
+    # relevant ticks only: round lots above entry or at/below stop
+    relevant = (tick_size >= 100) & ((tick_price > entry) | (tick_price <= stop)) & (tick_ts < eod_ns)
+    events = [(int(t), 0, float(p)) for t, p in zip(tick_ts[relevant], tick_price[relevant])]
+    events += [(int(t), 1, i) for i, t in enumerate(bar_arrival) if t < eod_ns]
+    events.sort()
+
+    bar_i = -1
+    for ts, kind, value in events:
+        if kind == 0:
+            price = value
+            if price > entry:
+                first = np.isnan(gap_first)
+                gap_first[first] = price
+                gap_counter[first] = 0
+                second = ~first & np.isnan(last_tick)
+                last_tick[second] = price
+                tick_counter[second] = 0
+
+                in_gap = gap_first > entry
+                confirm_gap = in_gap & ((price > gap_first * gap_up) | (price <= stop))
+                gap_counter += in_gap & ~confirm_gap
+                gap_first[in_gap & (gap_counter >= gap_ticks)] = 0
+
+                not_gap = ~in_gap
+                consolidating = not_gap & (stop < price) & (price < last_tick)
+                tick_counter += consolidating
+                confirm_tick = not_gap & ~consolidating
+                last_tick[not_gap & (tick_counter >= entry_ticks)] = np.nan
+
+                woken = confirm_gap | confirm_tick
+            else:
+                woken = np.ones(G, dtype=bool)
+            if not woken.any():
+                continue
+            latest[woken] = price
+        else:
+            bar_i = value
+            woken = ~np.isnan(latest)
+
+        price = latest
+        active = woken & ~done
+
+        # entry
+        enter = active & (position == 0) & ~took_half & (price > entry) & (ts < last_entry_ns)
+        position[enter] = 1.0
+        fill[enter] = price[enter]
+        entry_ts[enter] = ts
+
+        # stop-loss on whatever is still held
+        holding = active & (position > 0)
+        stopped = holding & (price < stop)
+        pnl[stopped] += (price[stopped] / fill[stopped] - 1) * 100 * position[stopped]
+        position[stopped] = 0
+        done[stopped] = True
+
+        # vwap take-profit, gated on a new 1m bar breaking out of the last checked high's band
+        holding &= ~stopped
+        if bar_i < 0 or not holding.any():
+            continue
+        high_1m, vwap, bar_start = bar_high[bar_i], bar_vwap[bar_i], bar_ts[bar_i]
+        gated = (gate_ts >= 0) & ((gate_ts == bar_start) | ((gate_high * (1 - band) < high_1m) & (high_1m < gate_high * (1 + band))))
+        check = holding & ~gated
+        gate_ts[check] = -1
+        if high_1m == vwap or not check.any():
+            continue
+        ratio = (high_1m / entry - 1) / (high_1m / vwap - 1)
+        take = check & (ratio > pwap_ratio)
+        # NOTE: main.step re-checks the same bar straight after the first half, so both halves go on one tick
+        pnl[take] += (price[take] / fill[take] - 1) * 100 * position[take]
+        position[take] = 0
+        took_half[take] = True
+        done[take] = True
+        miss = check & ~take
+        gate_ts[miss] = bar_start
+        gate_high[miss] = high_1m
+
+    # EOD exit at last confirmed price
+    held = position > 0
+    pnl[held] += (latest[held] / fill[held] - 1) * 100 * position[held]
+    return pnl, entry_ts
+
+
+def simulate_symbol(job):
+    symbol, arrays, configs_by_day, grid = job
+    day_keys = (arrays["tick_ts"] - DAY_SHIFT_NS) // DAY_NS
+    bar_keys = (arrays["bar_ts"] - DAY_SHIFT_NS) // DAY_NS
+    results = []
+    for key in np.unique(day_keys):
+        day = datetime.date(1970, 1, 1) + datetime.timedelta(days=int(key))
+        setups = configs_by_day.get(day, configs_by_day.get(None))
+        if not setups or symbol not in setups:
+            continue
+        t, b = day_keys == key, bar_keys == key
+        day_arrays = {
+            "tick_ts": arrays["tick_ts"][t], "tick_price": arrays["tick_price"][t], "tick_size": arrays["tick_size"][t],
+            "bar_ts": arrays["bar_ts"][b], "bar_high": arrays["bar_high"][b], "bar_vwap": arrays["bar_vwap"][b],
+        }
+        pnl, entry_ts = simulate_day(setups[symbol], day, day_arrays, grid)
+        results.append((symbol, day, pnl, entry_ts))
+    return results
+
+
+def build_grid(values):
+    keys = list(DEFAULT_GRID)
+    combos = list(itertools.product(*(values.get(k) or DEFAULT_GRID[k] for k in keys)))
+    return {k: np.array([c[i] for c in combos], dtype=float) for i, k in enumerate(keys)}
+
+
+def pdt_limited(results, G, daily_limit=DAILY_LIMIT, window_limit=WINDOW_LIMIT):
+    # P/L per grid column counting only the entries DayTradeBudget would have allowed: earliest first each day,
+        # at most daily_limit per day and window_limit per rolling window (day_trades.window_start, same business days as live)
+    by_day = {}
+    for symbol, day, pnl, entry_ts in results:
+        by_day.setdefault(day, []).append((entry_ts, pnl))
+    never = np.iinfo(np.int64).max
+    taken = {} # day -> (G,) day trades taken
+    pdt_total = np.zeros(G)
+    for day in sorted(by_day):
+        entry_ts = np.stack([np.where(ts >= 0, ts, never) for ts, _ in by_day[day]])
+        pnl = np.stack([p for _, p in by_day[day]])
+        order = np.argsort(entry_ts, axis=0, kind="stable")
+        entry_ts = np.take_along_axis(entry_ts, order, axis=0)
+        pnl = np.take_along_axis(pnl, order, axis=0)
+        start = window_start(day)
+        window = sum((n for d, n in taken.items() if start <= d < day), np.zeros(G, dtype=np.int64))
+        today = np.zeros(G, dtype=np.int64)
+        for ts, p in zip(entry_ts, pnl):
+            allowed = (ts != never) & (today < daily_limit) & (window + today < window_limit)
+            today += allowed
+            pdt_total += np.where(allowed, p, 0)
+        taken[day] = today
+    return pdt_total
+
+def run_backtest(data, configs_by_day, grid, workers=None, daily_limit=DAILY_LIMIT, window_limit=WINDOW_LIMIT):
+    jobs = [(symbol, arrays, configs_by_day, grid) for symbol, arrays in data.items()]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = [r for symbol_results in pool.map(simulate_symbol, jobs) for r in symbol_results]
+
+    G = len(grid["gap_up"])
+    trades = np.zeros(G, dtype=np.int64)
+    wins = np.zeros(G, dtype=np.int64)
+    total = np.zeros(G)
+    for symbol, day, pnl, entry_ts in results:
+        traded = entry_ts >= 0
+        trades += traded
+        wins += traded & (pnl > 0)
+        total += np.where(traded, pnl, 0)
+    pdt_total = pdt_limited(results, G, daily_limit, window_limit) # PDT-limited view, the live day-trade budget's limits
+
+    table = []
+    for i in range(G):
+        row = {k: grid[k][i] for k in grid}
+        row.update({
+            "trades": int(trades[i]),
+            "wins": int(wins[i]),
+            "total_pl": round(float(total[i]), 2),
+            "avg_pl": round(float(total[i] / trades[i]), 2) if trades[i] else 0.0,
+            "pdt_pl": round(float(pdt_total[i]), 2),
+        })
+        table.append(row)
+    table.sort(key=lambda r: r["pdt_pl"], reverse=True)
+    return table
+
+
+def print_table(table, limit=None):
+    columns = list(table[0]) if table else []
+    print(" | ".join(f"{c:>11}" for c in columns))
+    for row in table[:limit]:
+        print(" | ".join(f"{row[c]:>11g}" for c in columns))
+
+
+def _floats(text):
+    return [float(v) for v in text.split(",")] if text else None
+
+
+# python3 backtest.py captures/*.bin --configs configs.json --gap-up 1.01,1.015,1.02 --pwap 1.25,1.5,2
+    # captures come from replay.py --convert
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*", default=sorted(glob.glob("captures/*.bin")))
+    parser.add_argument("--configs", default="configs.json")
+    parser.add_argument("--gap-up", default=None)
+    parser.add_argument("--gap-ticks", default=None)
+    parser.add_argument("--entry-ticks", default=None)
+    parser.add_argument("--pwap", default=None)
+    parser.add_argument("--band", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--csv", default=None)
+    args = parser.parse_args()
+
+    grid = build_grid({
+        "gap_up": _floats(args.gap_up),
+        "gap_ticks": _floats(args.gap_ticks),
+        "entry_ticks": _floats(args.entry_ticks),
+        "pwap_ratio": _floats(args.pwap),
+        "band": _floats(args.band),
+    })
+    data = merge_data(load_capture(path) for path in args.paths)
+    table = run_backtest(data, load_configs(args.configs), grid, args.workers)
+    print_table(table, args.top)
+
+    if args.csv and table:
+        with open(args.csv, "w") as f:
+            f.write(",".join(table[0]) + "\n")
+            for row in table:
+                f.write(",".join(str(v) for v in row.values()) + "\n")
+        print(f"[BACKTEST] {len(table)} parameter sets written to {os.path.abspath(args.csv)}")
@@ -0,0 +1,204 @@
+from collections import defaultdict
+
+
+MINUTE_NS = 60_000_000_000
+
+
+class AggregateBar:
+    __slots__ = ("symbol", "minutes", "start_ns", "open", "high", "low", "close", "volume", "vwap", "minutes_from_trades")
+
+    def __init__(self, symbol, minutes, start_ns, open):
+        self.symbol = symbol
+        self.minutes = minutes
+        self.start_ns = start_ns # bar START, like alpaca: 10:00 5m = 10:00-10:04:59
+        self.open = open
+        self.high = open
+        self.low = open
+        self.close = open
+        self.volume = 0.0
+        self.vwap = None
+        self.minutes_from_trades = 0 # 1m slots built from trades because their stream bar was late/missing
+
+    def __repr__(self):
+        return f"AggregateBar({self.symbol} {self.minutes}m @{self.start_ns} o={self.open} h={self.high} l={self.low} c={self.close} v={self.volume:.0f} vwap={self.vwap})"
+
+class _SymbolBars:
+    __slots__ = ("folded_until", "pending", "building", "pv")
+
+    def __init__(self, n_timeframes):
+        self.folded_until = -1 # start of the last 1m slot folded into the higher timeframes
+        self.pending = {} # minute start -> [open, high, low, close, volume, price*volume] built from trades, waiting for the stream bar
+        self.building = [None] * n_timeframes # open AggregateBar per timeframe
+        self.pv = [0.0] * n_timeframes # price*volume of each open bar, for its vwap
+
+
+# 1m stream bars -> aligned 5m/15m (any whole-minute multiple) OHLCV+VWAP bars, emitted the moment they close...
+    # each 1m slot is folded in exactly once, from the stream bar if it shows up within `grace_ns` of the minute's end,
+    # otherwise from the trades seen in that minute (alpaca's 1m bars can lag several seconds, and never come for a minute with no trades)
+        # a stream bar for a slot that was already built from trades is dropped and counted in late_bars
+        # trade-built slots take every trade passed to on_trade(), so volume/vwap are approximate for those minutes
+    # a bar closes on its last minute's slot, on a later slot, or in flush() once its end + grace has passed with nothing left to wait for
+    # subscribers are plain callables(bar) per timeframe, called in close order; keep them cheap, they run on the stream handler
+class BarAggregator:
+    def __init__(self, timeframes=(5, 15), grace_seconds=10):
+        self.timeframes = tuple(timeframes)
+        self.widths = tuple(minutes * MINUTE_NS for minutes in self.timeframes)
+        self.grace_ns = int(grace_seconds * 1_000_000_000)
+        self.symbols = {}
+        self.subscribers = defaultdict(list) # minutes -> [callback(bar)]
+        self.late_bars = 0
+
+    def subscribe(self, minutes, callback):
+        if minutes not in self.timeframes:
+            raise ValueError(f"{minutes}m bars aren't aggregated (timeframes: {self.timeframes})")
+        self.subscribers[minutes].append(callback)
+
+    def unsubscribe(self, minutes, callback):
+        if callback in self.subscribers[minutes]:
+            self.subscribers[minutes].remove(callback)
+
+    def _symbol(self, symbol):
+        bars = self.symbols.get(symbol)
+        if bars is None:
+            bars = self.symbols[symbol] = _SymbolBars(len(self.timeframes))
+        return bars
+
+    def on_bar(self, symbol, ts_ns, open, high, low, close, volume, vwap=None):
+        # 1m stream bar, ts_ns = minute start
+        bars = self._symbol(symbol)
+        bars.pending.pop(ts_ns, None)
+        if ts_ns <= bars.folded_until:
+            self.late_bars += 1
+            return
+        self._flush_symbol(symbol, bars, ts_ns) # trade-built slots before this one can't get a stream bar any more
+        self._fold(symbol, bars, ts_ns, open, high, low, close, volume, (vwap if vwap is not None else close) * volume, False)
+
+    def on_trade(self, symbol, ts_ns, price, size):
+        bars = self._symbol(symbol)
+        minute = ts_ns - ts_ns % MINUTE_NS
+        if minute <= bars.folded_until:
+            return
+        slot = bars.pending.get(minute)
+        if slot is None:
+            if bars.pending:
+                self._flush_symbol(symbol, bars, ts_ns - self.grace_ns)
+            bars.pending[minute] = [price, price, price, price, size, price * size]
+            return
+        if price > slot[1]:
+            slot[1] = price
+        elif price < slot[2]:
+            slot[2] = price
+        slot[3] = price
+        slot[4] += size
+        slot[5] += price * size
+
+    def flush(self, now_ns):
+        # folds trade-built slots and closes bars whose grace period is over; the periodic timer calls this
+        for symbol, bars in self.symbols.items():
+            self._flush_symbol(symbol, bars, now_ns - self.grace_ns)
+
+    def _flush_symbol(self, symbol, bars, cutoff_ns):
+        # everything that ended at or before cutoff_ns is final
+        if bars.pending:
+            for minute in sorted(bars.pending):
+                if minute + MINUTE_NS > cutoff_ns:
+                    break
+                open, high, low, close, volume, pv = bars.pending.pop(minute)
+                self._fold(symbol, bars, minute, open, high, low, close, volume, pv, True)
+        for i, width in enumerate(self.widths):
+            bar = bars.building[i]
+            if bar is not None and bar.start_ns + width <= cutoff_ns:
+                self._close(bars, i)
+
+    def _fold(self, symbol, bars, minute, open, high, low, close, volume, pv, from_trades):
+        bars.folded_until = minute
+        for i, width in enumerate(self.widths):
+            start = minute - minute % width
+            bar = bars.building[i]
+            if bar is not None and bar.start_ns != start:
+                self._close(bars, i)
+                bar = None
+            if bar is None:
+                bar = bars.building[i] = AggregateBar(symbol, self.timeframes[i], start, open)
+            if high > bar.high:
+                bar.high = high
+            if low < bar.low:
+                bar.low = low
+            bar.close = close
+            bar.volume += volume
+            bars.pv[i] += pv
+            if from_trades:
+                bar.minutes_from_trades += 1
+            if minute + MINUTE_NS == start + width:
+                self._close(bars, i)
+
+    def _close(self, bars, i):
+        bar = bars.building[i]
+        bars.building[i] = None
+        bar.vwap = bars.pv[i] / bar.volume if bar.volume else bar.close
+        bars.pv[i] = 0.0
+        for callback in self.subscribers[bar.minutes]:
+            callback(bar)
+
+    def reset(self, symbol):
+        # drops open bars and pending slots, e.g. when a symbol is unsubscribed
+        self.symbols.pop(symbol, None)
+
+
+def check_against_resample(minutes=600, seed=3):
+    # streamed 1m bars (some minutes missing, some stream bars late) vs bar_seeder.resample() on the same 1m bars
+    import random
+    import numpy as np
+    from bar_seeder import BAR_DTYPE, resample
+
+    rng = random.Random(seed)
+    start = 1_748_937_600 * 1_000_000_000 # 2025-06-03 08:00 UTC, 5m/15m aligned
+    aggregator = BarAggregator()
+    closed = {5: [], 15: []}
+    for timeframe in closed:
+        aggregator.subscribe(timeframe, closed[timeframe].append)
+
+    rows = []
+    price = 10.0
+    late = 0
+    for i in range(minutes):
+        minute = start + i * MINUTE_NS
+        if rng.random() < 0.1: # no trades this minute, alpaca sends no bar
+            continue
+        trades = []
+        for j in range(rng.randint(1, 5)):
+            price = max(0.5, price + rng.uniform(-0.05, 0.05))
+            trades.append((minute + j * 10_000_000_000, price, rng.randint(1, 10) * 100))
+        for ts, p, size in trades:
+            aggregator.on_trade("SYM", ts, p, size)
+        prices = [p for _, p, _ in trades]
+        volume = sum(size for _, _, size in trades)
+        row = (minute, prices[0], max(prices), min(prices), prices[-1], volume)
+        rows.append(row)
+        if rng.random() < 0.05:
+            late += 1 # stream bar after the grace period: the trade-built slot has to stand in
+            aggregator.flush(minute + MINUTE_NS + aggregator.grace_ns)
+        vwap = sum(p * size for _, p, size in trades) / volume
+        aggregator.on_bar("SYM", *row, vwap)
+    aggregator.flush(start + (minutes + 1) * MINUTE_NS + aggregator.grace_ns)
+
+    bars = np.array(rows, BAR_DTYPE)
+    failures = []
+    for timeframe, streamed in closed.items():
+        expected = resample(bars, timeframe)
+        got = np.array([(b.start_ns, b.open, b.high, b.low, b.close, b.volume) for b in streamed], BAR_DTYPE)
+        if len(got) != len(expected) or (got["ts"] != expected["ts"]).any():
+            failures.append(f"{timeframe}m: {len(got)} bars, expected {len(expected)}")
+            continue
+        for name in BAR_DTYPE.names[1:]:
+            if not np.allclose(got[name], expected[name]):
+                failures.append(f"{timeframe}m {name} differs")
+
+    for failure in failures:
+        print(f"[BARS] MISMATCH {failure}")
+    print(f"[BARS] aggregator check {'passed' if not failures else 'FAILED'} ({len(rows)} 1m bars, {late} late, {aggregator.late_bars} dropped as late)")
+    return not failures
+
+
+if __name__ == "__main__":
+    check_against_resample()
@@ -0,0 +1,293 @@
+import asyncio
+import datetime
+import json
+import os
+import time
+from collections import defaultdict
+
+import numpy as np
+import pytz
+
+from market_state import timestamp_ns
+
+
+eastern = pytz.timezone("US/Eastern")
+
+BAR_DTYPE = np.dtype([("ts", "i8"), ("open", "f8"), ("high", "f8"), ("low", "f8"), ("close", "f8"), ("volume", "f8")])
+NS = 1_000_000_000
+MINUTE_NS = 60 * NS
+
+
+def resample(bars, minutes):
+    # epoch-aligned OHLCV buckets, same bins as pandas .resample(f"{minutes}min") on a UTC index, no pandas
+    if not len(bars):
+        return np.empty(0, BAR_DTYPE)
+    width = minutes * MINUTE_NS
+    buckets = bars["ts"] // width
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(bars)] - 1
+
+    out = np.empty(len(starts), BAR_DTYPE)
+    out["ts"] = buckets[starts] * width
+    out["open"] = bars["open"][starts]
+    out["high"] = np.maximum.reduceat(bars["high"], starts)
+    out["low"] = np.minimum.reduceat(bars["low"], starts)
+    out["close"] = bars["close"][ends]
+    out["volume"] = np.add.reduceat(bars["volume"], starts)
+    return out
+
+
+def _day_bounds(date):
+    # [midnight, next midnight) ET in ns
+    start = eastern.localize(datetime.datetime.combine(date, datetime.time()))
+    end = eastern.localize(datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time()))
+    return timestamp_ns(start), timestamp_ns(end)
+
+def _dates(start_ns, end_ns):
+    first = datetime.datetime.fromtimestamp(start_ns / NS, eastern).date()
+    last = datetime.datetime.fromtimestamp((end_ns - 1) / NS, eastern).date()
+    return [first + datetime.timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+# on-disk bar cache, one .npy of BAR_DTYPE rows per symbol per ET date: bar-cache/2025-06-02/AAPL.npy...
+    # loaded memory-mapped, so re-reading a day is a page-cache hit rather than a parse
+    # index.json per date holds the [from_ns, until_ns) range already fetched per symbol, so empty stretches
+    # (halts, no premarket prints) aren't refetched on every restart just because there are no bars in them
+    # writes go to a temp file + os.replace, a crash mid-write leaves the previous file intact
+class BarCache:
+    def __init__(self, directory="bar-cache"):
+        self.directory = directory
+        self._coverage = {} # date -> {symbol: [from_ns, until_ns]}
+        self._dirty = set()
+
+    def _path(self, date, name):
+        return os.path.join(self.directory, date.isoformat(), name)
+
+    def coverage(self, date):
+        coverage = self._coverage.get(date)
+        if coverage is None:
+            try:
+                with open(self._path(date, "index.json")) as file:
+                    coverage = json.load(file)
+            except (OSError, ValueError):
+                coverage = {}
+            self._coverage[date] = coverage
+        return coverage
+
+    def load(self, symbol, date):
+        try:
+            return np.load(self._path(date, f"{symbol}.npy"), mmap_mode="r")
+        except (OSError, ValueError):
+            return np.empty(0, BAR_DTYPE)
+
+    def store(self, symbol, date, bars, from_ns, until_ns):
+        existing = self.load(symbol, date)
+        if len(existing):
+            # newer fetch wins on duplicate timestamps
+            merged = np.concatenate([bars[::-1], existing[::-1]])
+            _, first = np.unique(merged["ts"], return_index=True)
+            bars = merged[first]
+
+        path = self._path(date, f"{symbol}.npy")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as file:
+            np.save(file, np.ascontiguousarray(bars, BAR_DTYPE))
+        os.replace(path + ".tmp", path)
+
+        coverage = self.coverage(date)
+        covered = coverage.get(symbol)
+        coverage[symbol] = [min(from_ns, covered[0]), max(until_ns, covered[1])] if covered else [from_ns, until_ns]
+        self._dirty.add(date)
+
+    def flush(self):
+        for date in self._dirty:
+            path = self._path(date, "index.json")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "w") as file:
+                json.dump(self._coverage[date], file)
+            os.replace(path + ".tmp", path)
+        self._dirty.clear()
+
+
+# batched, concurrent historical bars with the cache in front...
+    # symbols needing the same delta share multi-symbol StockBarsRequests of up to batch_size symbols
+        # (alpaca pages through multi-symbol responses itself)
+    # the blocking get_stock_bars calls run in worker threads, at most `concurrency` at once, the loop keeps streaming
+    # only complete bars are cached: a bar counts once it closed settle_seconds ago (the REST api publishes with a lag)
+    # client is anything with get_stock_bars(StockBarsRequest) -> .data {symbol: [bar]}, e.g. fake_historical.FakeHistoricalClient
+class BarSeeder:
+    def __init__(self, client, cache=None, batch_size=50, concurrency=4, timeframe_minutes=5, settle_seconds=15):
+        self.client = client
+        self.cache = cache if cache is not None else BarCache()
+        self.batch_size = batch_size
+        self.concurrency = asyncio.Semaphore(concurrency)
+        self.timeframe_minutes = timeframe_minutes
+        self.settle_seconds = settle_seconds
+
+    def complete_until(self, now):
+        # ns cutoff: bars starting before it are final
+        step = self.timeframe_minutes * MINUTE_NS
+        return (timestamp_ns(now) - self.settle_seconds * NS) // step * step
+
+    def _request(self, symbols, start, end):
+        from alpaca.data.requests import StockBarsRequest
+        from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+        return StockBarsRequest(
+            symbol_or_symbols=symbols,
+            timeframe=TimeFrame(self.timeframe_minutes, TimeFrameUnit.Minute),
+            start=start,
+            end=end,
+            adjustment="raw",
+            feed="sip",
+        )
+
+    def _fetch(self, symbols, from_ns, until_ns):
+        # worker thread: one REST call (plus alpaca's own paging), bars -> per-symbol arrays
+        start = datetime.datetime.fromtimestamp(from_ns / NS, pytz.utc)
+        end = datetime.datetime.fromtimestamp(until_ns / NS, pytz.utc)
+        data = self.client.get_stock_bars(self._request(symbols, start, end)).data
+
+        fetched = {}
+        for symbol in symbols:
+            rows = [
+                (timestamp_ns(bar.timestamp), bar.open, bar.high, bar.low, bar.close, bar.volume)
+                for bar in data.get(symbol) or ()
+            ]
+            bars = np.array(rows, BAR_DTYPE)
+            bars = bars[(bars["ts"] >= from_ns) & (bars["ts"] < until_ns)]
+            fetched[symbol] = np.sort(bars, order="ts")
+        return fetched
+
+    async def _fetch_batch(self, symbols, from_ns, until_ns):
+        async with self.concurrency:
+            return await asyncio.to_thread(self._fetch, symbols, from_ns, until_ns)
+
+    def _plan(self, symbols, start_ns, until_ns):
+        # fetch start -> symbols: from the end of what's cached, or from start_ns if the cache doesn't reach back that far
+        plans = defaultdict(list)
+        for symbol in symbols:
+            fetch_from = None
+            for date in _dates(start_ns, until_ns):
+                day_start, day_end = _day_bounds(date)
+                lo, hi = max(start_ns, day_start), min(until_ns, day_end)
+                covered = self.cache.coverage(date).get(symbol)
+                if covered is None or lo < covered[0]:
+                    need = lo
+                elif hi > covered[1]:
+                    need = covered[1]
+                else:
+                    continue
+                fetch_from = need if fetch_from is None else min(fetch_from, need)
+            if fetch_from is not None:
+                plans[fetch_from].append(symbol)
+        return plans
+
+    async def bars(self, symbols, start, end):
+        # symbol -> BAR_DTYPE array of complete bars in [start, end), cache + one batched delta fetch
+        start_ns = timestamp_ns(start)
+        until_ns = self.complete_until(end)
+        symbols = list(dict.fromkeys(symbols))
+        if until_ns <= start_ns:
+            return {symbol: np.empty(0, BAR_DTYPE) for symbol in symbols}
+
+        batches = [
+            (planned[i:i + self.batch_size], from_ns)
+            for from_ns, planned in self._plan(symbols, start_ns, until_ns).items()
+            for i in range(0, len(planned), self.batch_size)
+        ]
+        if batches:
+            began = time.perf_counter()
+            results = await asyncio.gather(
+                *(self._fetch_batch(batch, from_ns, until_ns) for batch, from_ns in batches),
+                return_exceptions=True,
+            )
+            fetched = 0
+            for (batch, from_ns), result in zip(batches, results):
+                if isinstance(result, BaseException):
+                    print(f"[SEED] Fetch of {len(batch)} symbols failed: {result!r}") # cached bars are still returned
+                    continue
+                for symbol, bars in result.items():
+                    self._store(symbol, bars, from_ns, until_ns)
+                    fetched += len(bars)
+            self.cache.flush()
+            print(f"[SEED] {fetched} bars for {sum(len(b) for b, _ in batches)} symbols in {len(batches)} requests ({time.perf_counter() - began:.2f}s)")
+
+        return {symbol: self._load(symbol, start_ns, until_ns) for symbol in symbols}
+
+    def _store(self, symbol, bars, from_ns, until_ns):
+        for date in _dates(from_ns, until_ns):
+            day_start, day_end = _day_bounds(date)
+            lo, hi = max(from_ns, day_start), min(until_ns, day_end)
+            day = bars[(bars["ts"] >= lo) & (bars["ts"] < hi)]
+            self.cache.store(symbol, date, day, lo, hi)
+
+    def _load(self, symbol, start_ns, until_ns):
+        days = [self.cache.load(symbol, date) for date in _dates(start_ns, until_ns)]
+        bars = np.concatenate(days) if days else np.empty(0, BAR_DTYPE)
+        return bars[(bars["ts"] >= start_ns) & (bars["ts"] < until_ns)]
+
+
+def check_with_fake_client(n_symbols=40, latency=0.2):
+    # cold start, warm restart and a 15 minute delta against fake_historical, plus resample() vs pandas
+    import tempfile
+    from fake_historical import FakeHistoricalClient
+
+    symbols = [f"SYM{i:02d}" for i in range(n_symbols)]
+    now = eastern.localize(datetime.datetime(2025, 6, 3, 10, 0, 20))
+    lookback = datetime.timedelta(minutes=20 * 15)
+    failures = []
+
+    async def run(client, directory, when):
+        seeder = BarSeeder(client, BarCache(directory), batch_size=10)
+        began = time.perf_counter()
+        bars = await seeder.bars(symbols, when - lookback, when)
+        return bars, time.perf_counter() - began
+
+    with tempfile.TemporaryDirectory() as directory:
+        cold_client = FakeHistoricalClient(latency)
+        cold, elapsed = asyncio.run(run(cold_client, directory, now))
+        print(f"[SEED] cold: {len(cold_client.calls)} requests in {elapsed:.2f}s (one blocking request per symbol would be ~{n_symbols * latency:.1f}s)")
+        if len(cold_client.calls) != -(-n_symbols // 10):
+            failures.append(f"cold start made {len(cold_client.calls)} requests")
+
+        warm_client = FakeHistoricalClient(latency)
+        warm, elapsed = asyncio.run(run(warm_client, directory, now))
+        print(f"[SEED] warm restart: {len(warm_client.calls)} requests in {elapsed * 1000:.1f}ms")
+        if warm_client.calls:
+            failures.append(f"warm restart made {len(warm_client.calls)} requests")
+        if any(not np.array_equal(cold[s], warm[s]) for s in symbols):
+            failures.append("warm bars differ from cold bars")
+
+        delta_client = FakeHistoricalClient(latency)
+        later = now + datetime.timedelta(minutes=15)
+        delta, _ = asyncio.run(run(delta_client, directory, later))
+        print(f"[SEED] +15min: {len(delta_client.calls)} requests for the last 15 minutes only")
+        if any(start != now.replace(second=0) for _, start, _ in delta_client.calls):
+            failures.append("delta fetch didn't start at the cached watermark")
+
+        expected = FakeHistoricalClient()._bars(symbols[0], later - lookback, later, datetime.timedelta(minutes=5))
+        expected = [bar for bar in expected if timestamp_ns(bar.timestamp) + 5 * MINUTE_NS <= timestamp_ns(later)]
+        if [timestamp_ns(bar.timestamp) for bar in expected] != delta[symbols[0]]["ts"].tolist():
+            failures.append("delta bars don't match a fresh fetch")
+
+    try:
+        import pandas as pd
+    except ImportError:
+        pd = None
+    if pd is not None:
+        bars = delta[symbols[0]]
+        frame = pd.DataFrame({name: bars[name] for name in BAR_DTYPE.names[1:]}, index=pd.to_datetime(bars["ts"], utc=True))
+        expected = frame.resample("15min").agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}).dropna()
+        got = resample(bars, 15)
+        if not (np.allclose(expected.to_numpy(), np.column_stack([got[name] for name in BAR_DTYPE.names[1:]]))
+                and (expected.index.asi8 == got["ts"]).all()):
+            failures.append("resample() differs from pandas")
+
+    for failure in failures:
+        print(f"[SEED] FAILED {failure}")
+    print(f"[SEED] fake client check {'passed' if not failures else 'FAILED'}")
+    return not failures
+
+
+if __name__ == "__main__":
+    check_with_fake_client()
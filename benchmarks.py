@@ -0,0 +1,835 @@
+import argparse
+import asyncio
+import contextlib
+import datetime
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from dataclasses import dataclass
+
+import msgpack
+import numpy as np
+
+# benchmarks never touch live services: dummy alpaca keys if none are set, no pushbullet
+os.environ.setdefault("API_KEY", "bench")
+os.environ.setdefault("SECRET_KEY", "bench")
+os.environ["PUSHBULLET_API_KEY"] = ""
+
+import clock
+from clock import eastern, SimClock
+from config_store import store as config_store, SymbolConfig
+from day_trades import DayTradeBudget
+from journal import Journal
+from log_sink import LogSink
+from market_state import QuoteRing, timestamp_ns
+from metrics import registry as metrics, format_report
+from replay import ReplayTrade, ReplayBar, TRADE
+from strategy_engine import CLOSED
+
+
+def _rss_mb():
+    with open("/proc/self/statm") as file:
+        pages = int(file.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+# ===== SYNTHETIC SESSION ===== #
+# lazily generated, so the benchmark itself holds nothing but the current minute
+    # prices random-walk around each setup's entry so every handle_trade branch (gap up, >entry, around exit, odd lot) gets hit
+    # yields (minute_index, msg) with one 1m bar per symbol at the end of each minute, like the live bar stream
+def synthetic_configs(n_symbols=40):
+    return {
+        f"SYM{i:02d}": SymbolConfig({"symbol": f"SYM{i:02d}", "entry_price": 5.0 + i, "stop_loss": 4.5 + i, "dollar_value": 1000})
+        for i in range(n_symbols)
+    }
+
+def synthetic_session(configs, minutes=840, trades_per_minute=30, seed=1):
+    rng = random.Random(seed)
+    start = eastern.localize(datetime.datetime(2025, 7, 1, 4, 0))
+    prices = {symbol: (setup.entry_price + setup.stop_loss) / 2 for symbol, setup in configs.items()}
+    for minute in range(minutes):
+        bar_start = start + datetime.timedelta(minutes=minute)
+        for symbol, setup in configs.items():
+            price = prices[symbol]
+            open_, high, low, volume, notional = price, price, price, 0, 0.0
+            for k in range(trades_per_minute):
+                price = min(max(price * (1 + rng.gauss(0, 0.004)), setup.stop_loss * 0.9), setup.entry_price * 1.1)
+                size = rng.choice((50, 100, 200, 500, 1000))
+                high, low = max(high, price), min(low, price)
+                volume += size
+                notional += price * size
+                timestamp = bar_start + datetime.timedelta(seconds=k * 60 / trades_per_minute)
+                yield minute, ReplayTrade(symbol, round(price, 4), size, timestamp, (" ",))
+            prices[symbol] = price
+        for symbol in configs:
+            # bar values don't matter for memory, only that one arrives per symbol per minute
+            yield minute, ReplayBar(symbol, open_, high, low, price, volume, notional / volume, bar_start)
+
+
+# ===== MEMORY ===== #
+# feeds a full extended session (04:00-18:00, 40 symbols) through DataHandler and samples RSS along the way
+    # per-symbol state is fixed-size (market_state.py), so RSS should level off after the first minutes
+    # a SimClock follows the synthetic timestamps: feed lag stays ~0, so no symbol degrades and every tick takes the normal path
+async def bench_memory(n_symbols=40, minutes=840, trades_per_minute=30, sample_every=60):
+    import alpaca_utils
+
+    configs = synthetic_configs(n_symbols)
+    config_store.publish(configs)
+    handler = alpaca_utils.handler
+    sim = SimClock(eastern.localize(datetime.datetime(2025, 7, 1, 4, 0)))
+    clock.set_clock(sim)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        alpaca_utils.log_sink = LogSink(directory=tmp)
+        alpaca_utils.log_sink.start()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        print(f"[BENCH] memory: {n_symbols} symbols, {minutes} minutes, {trades_per_minute} trades/symbol/minute")
+        print(f"{'minute':>8} {'messages':>12} {'rss MB':>10} {'traced MB':>10}")
+        samples = []
+        messages = 0
+        last_minute = -1
+        wall_start = time.perf_counter()
+        for minute, msg in synthetic_session(configs, minutes, trades_per_minute):
+            if minute != last_minute:
+                if minute % sample_every == 0:
+                    await alpaca_utils.log_sink.flush()
+                    rss, traced = _rss_mb(), tracemalloc.get_traced_memory()[0] / 1e6
+                    samples.append((minute, rss))
+                    print(f"{minute:>8} {messages:>12,} {rss:>10.1f} {traced:>10.2f}")
+                last_minute = minute
+            if isinstance(msg, ReplayTrade):
+                sim.current = msg.timestamp
+                await handler.handle_trade(msg)
+            else:
+                sim.current = msg.timestamp + datetime.timedelta(minutes=1) # bars arrive at minute end
+                await handler.handle_bar(msg)
+            messages += 1
+            if messages % 5_000 == 0:
+                await asyncio.sleep(0) # let the log writer drain like it would between live messages
+
+        await alpaca_utils.log_sink.close()
+        elapsed = time.perf_counter() - wall_start
+    clock.set_clock(clock.RealClock())
+
+    # growth after warm-up (first sample past the first hour) is what a leak would show up in
+    warm = [rss for minute, rss in samples if minute >= sample_every]
+    growth = warm[-1] - warm[0] if len(warm) > 1 else 0.0
+    print(f"[BENCH] {messages:,} messages in {elapsed:.1f}s, RSS growth after warm-up: {growth:+.1f} MB, "
+          f"{len(alpaca_utils.feed_monitor.degraded)} symbols degraded, {alpaca_utils.log_sink.written:,} log records")
+    return samples
+
+
+# ===== QUOTE LOOKUP ===== #
+# ghost filter nearest-quote lookup: deque of QuoteEntry + min() scan (old handle_trade) vs QuoteRing.nearest
+    # quotes every ~50ms with jitter, trades at random times inside the window, both lookups must pick the same quote
+@dataclass
+class QuoteEntry:
+    bid: float
+    ask: float
+    timestamp: datetime.datetime
+
+def bench_quotes(window=500, lookups=20_000, seed=1):
+    rng = random.Random(seed)
+    start = eastern.localize(datetime.datetime(2025, 7, 1, 9, 30))
+    old = deque(maxlen=window)
+    ring = QuoteRing(window)
+    t = start
+    for i in range(window * 3): # wrapped ring, like mid-session
+        t += datetime.timedelta(microseconds=rng.randint(1_000, 100_000))
+        bid = round(10 + rng.uniform(-0.5, 0.5), 2)
+        old.append(QuoteEntry(bid=bid, ask=bid + 0.01, timestamp=t))
+        ring.append(timestamp_ns(t), bid, bid + 0.01)
+
+    first, last = old[0].timestamp, old[-1].timestamp
+    span_us = int((last - first).total_seconds() * 1_000_000)
+    trade_times = [first + datetime.timedelta(microseconds=rng.randint(-500_000, span_us + 500_000)) for _ in range(lookups)]
+
+    for trade_time in trade_times[:1_000]:
+        closest = min(old, key=lambda q: abs((q.timestamp - trade_time).total_seconds()))
+        gap_ns, bid, _ = ring.nearest(timestamp_ns(trade_time))
+        assert abs(gap_ns / 1e9 - abs((closest.timestamp - trade_time).total_seconds())) < 1e-6 and bid == closest.bid
+
+    wall_start = time.perf_counter()
+    for trade_time in trade_times:
+        closest = min(old, key=lambda q: abs((q.timestamp - trade_time).total_seconds()))
+    old_us = (time.perf_counter() - wall_start) / lookups * 1e6
+
+    wall_start = time.perf_counter()
+    for trade_time in trade_times:
+        ring.nearest(timestamp_ns(trade_time))
+    new_us = (time.perf_counter() - wall_start) / lookups * 1e6
+
+    print(f"[BENCH] nearest quote, {window} quote window, {lookups:,} lookups")
+    print(f"{'deque + min()':>16} {old_us:>10.2f} us/trade")
+    print(f"{'QuoteRing':>16} {new_us:>10.2f} us/trade ({old_us / new_us:,.0f}x)")
+    print(f"{'40 symbols':>16} {old_us * 40:>10.0f} vs {new_us * 40:.1f} us per round of one trade each")
+    return old_us, new_us
+
+
+# ===== LIMIT PRICING ===== #
+# order path price math: pytz.timezone + datetime.now + Decimal quantize per order (old) vs clock.session + pricing.limit_price
+def bench_pricing(calls=200_000, seed=1):
+    import pricing
+    import pytz
+    from decimal import Decimal, ROUND_UP
+
+    def old_limit(tick):
+        now = datetime.datetime.now(pytz.timezone("US/Eastern")).time()
+        intraday = datetime.time(9, 30) <= now < datetime.time(16, 0)
+        price = float(Decimal(tick * 1.01).quantize(Decimal("0.01"), rounding=ROUND_UP)) if tick >= 1.00 else float(Decimal(tick * 1.01).quantize(Decimal("0.0001"), rounding=ROUND_UP))
+        return intraday, price
+
+    def new_limit(tick):
+        now = clock.now()
+        return clock.session(now).is_intraday(now), pricing.limit_price(tick, "buy")
+
+    rng = random.Random(seed)
+    ticks = [round(rng.uniform(0.2, 20), 4) for _ in range(calls)]
+    results = {}
+    for name, fn in (("old", old_limit), ("new", new_limit)):
+        wall_start = time.perf_counter()
+        for tick in ticks:
+            fn(tick)
+        results[name] = (time.perf_counter() - wall_start) / calls * 1e9
+
+    wall_start = time.perf_counter()
+    for tick in ticks:
+        pricing.limit_price(tick, "buy")
+    pure_ns = (time.perf_counter() - wall_start) / calls * 1e9
+
+    print(f"[BENCH] limit price + session check, {calls:,} calls")
+    print(f"{'Decimal + pytz':>22} {results['old']:>8.0f} ns/order")
+    print(f"{'session + pricing':>22} {results['new']:>8.0f} ns/order ({results['old'] / results['new']:.1f}x)")
+    print(f"{'pricing.limit_price':>22} {pure_ns:>8.0f} ns/call")
+    return results
+
+
+# ===== END TO END LATENCY ===== #
+# fake_stream.py -> MarketDataStream -> start_price_quote_bar_stream -> DataHandler -> StrategyEngine step -> OrderGateway -> fake_broker.py
+    # everything on one loop over real localhost sockets; only the market data and the broker are fake
+    # each symbol repeats a scripted cycle: gap-up confirm (BUY decision), filler ticks, stop-loss tick (close order), filler ticks
+        # fillers sit between stop and entry, so most messages take handle_trade's cheap no-update path like a live feed
+    # the harness restarts a symbol's strategy record after it closes and lifts the PDT limit, so every cycle trades
+    # session time is pinned to premarket (08:00 ET, extended-hours limit orders) so the run doesn't depend on the time of day
+class SessionClock(clock.RealClock):
+    def __init__(self, at):
+        self.at = at
+        self.start = time.perf_counter()
+
+    def now(self):
+        return self.at + datetime.timedelta(seconds=time.perf_counter() - self.start)
+
+class TimedGateway:
+    def __init__(self, gateway, tick_sent, samples):
+        self.gateway = gateway
+        self.tick_sent = tick_sent
+        self.samples = samples
+
+    async def _timed(self, symbol, request):
+        sent = self.tick_sent.get(symbol)
+        result = await request
+        if sent is not None:
+            self.samples.append(time.perf_counter_ns() - sent)
+        return result
+
+    async def submit_order(self, order_data):
+        return await self._timed(order_data["symbol"], self.gateway.submit_order(order_data))
+
+    async def close_position(self, symbol, qty=None):
+        return await self._timed(symbol, self.gateway.close_position(symbol, qty))
+
+    def __getattr__(self, name):
+        return getattr(self.gateway, name)
+
+def scripted_session(configs, messages, filler=50, rate=1_000_000):
+    start = eastern.localize(datetime.datetime(2025, 7, 1, 8, 0))
+    cycles = {}
+    for symbol, setup in configs.items():
+        between = round((setup.entry_price + setup.stop_loss) / 2, 4)
+        cycle = [setup.entry_price * 1.001, setup.entry_price * 1.03] + [between] * (filler // 2)
+        cycle += [setup.stop_loss * 0.99] + [between] * (filler - filler // 2)
+        cycles[symbol] = [round(price, 4) for price in cycle]
+
+    # symbols are phase-shifted through the cycle so their orders don't all land in the same few milliseconds
+    # stamped at the send rate, so SessionClock - trade.timestamp (metrics' feed_lag_us) is how far the bot trails the feed
+    events = []
+    symbols = list(configs)
+    for i in range(messages):
+        k = i % len(symbols)
+        cycle = cycles[symbols[k]]
+        timestamp = start + datetime.timedelta(microseconds=i * 1_000_000 // rate)
+        price = cycle[(i // len(symbols) + k * len(cycle) // len(symbols)) % len(cycle)]
+        events.append((timestamp, TRADE, ReplayTrade(symbols[k], price, 100, timestamp, (" ",))))
+    return events
+
+def percentiles_us(samples):
+    if not samples:
+        return (0, 0.0, 0.0, 0.0, 0.0)
+    values = np.asarray(samples, dtype=float) / 1000
+    p50, p99, p999 = np.percentile(values, (50, 99, 99.9))
+    return (len(values), p50, p99, p999, values.max())
+
+async def bench_e2e(n_symbols=40, rate=20_000, seconds=10, filler=50, batch_size=100, broker_delay_ms=0, stream_port=8765, broker_port=8081):
+    import alpaca_utils
+    import main
+    from fake_broker import start_fake_broker
+    from fake_stream import start_fake_stream
+    from market_stream import MarketDataStream
+    from order_gateway import OrderGateway
+
+    configs = synthetic_configs(n_symbols)
+    config_store.publish(configs)
+    events = scripted_session(configs, int(rate * seconds), filler, rate)
+
+    tick_sent = {}
+    handler_samples, decision_samples, order_samples = [], [], []
+
+    stream, stream_runner = await start_fake_stream(events, port=stream_port, rate=rate, batch_size=batch_size)
+    broker, broker_runner = await start_fake_broker(port=broker_port, delay_ms=broker_delay_ms)
+
+    clock.set_clock(SessionClock(eastern.localize(datetime.datetime(2025, 7, 1, 8, 0))))
+    alpaca_utils.stock_stream = MarketDataStream(api_key="bench", secret_key="bench", url=f"ws://127.0.0.1:{stream_port}/v2/sip")
+    order_gateway = OrderGateway(api_key="bench", secret_key="bench", base_url=f"http://127.0.0.1:{broker_port}")
+    alpaca_utils.gateway = alpaca_utils.order_manager.gateway = TimedGateway(order_gateway, tick_sent, order_samples)
+
+    handler = alpaca_utils.handler
+    handle_trade_batch = handler.handle_trade_batch
+    engine = main.engine
+    step = engine.step
+
+    async def timed_handle_trade_batch(msgs, received_ns):
+        handled_ns = time.perf_counter_ns()
+        for msg in msgs:
+            symbol = msg["S"]
+            sent = stream.sent_ns[msg["i"]]
+            tick_sent[symbol] = sent
+            handler_samples.append(handled_ns - sent)
+
+            record = engine.records.get(symbol)
+            if record is not None and record.phase == CLOSED:
+                alpaca_utils.market_state.pop(symbol, None)
+                main.start_monitor(config_store.get(symbol))
+        await handle_trade_batch(msgs, received_ns)
+
+    def timed_step(record):
+        if record.symbol in tick_sent:
+            decision_samples.append(time.perf_counter_ns() - tick_sent[record.symbol])
+        step(record)
+
+    handler.handle_trade_batch = timed_handle_trade_batch
+    engine.step = timed_step
+    main.day_trades = DayTradeBudget(":memory:", daily_limit=len(events), window_limit=len(events)) # PDT limit off for the run
+    metrics.reset()
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        alpaca_utils.log_sink = LogSink(directory=tmp)
+        alpaca_utils.log_sink.start()
+        main.journal = Journal(os.path.join(tmp, "journal"))
+
+        print(f"[BENCH] e2e: {n_symbols} symbols, {len(events):,} messages @ {rate:,} msg/s, batch {batch_size}, broker delay {broker_delay_ms}ms")
+        if msgpack.Packer.__module__ == "msgpack.fallback":
+            print("[BENCH] NOTE: msgpack is running without its C extension, (un)packing will dominate these numbers")
+        # strategy/pushbullet prints go to devnull; they're still formatted and written like a live run
+        with contextlib.redirect_stdout(devnull):
+            await order_gateway.warm_up()
+            engine.start()
+            for setup in configs.values():
+                main.start_monitor(setup)
+            stream_task = asyncio.create_task(alpaca_utils.start_price_quote_bar_stream(list(configs)))
+            await stream.done.wait()
+            await asyncio.sleep(0.5) # let the last orders come back
+
+            await alpaca_utils.stock_stream.stop_ws()
+            tasks = [stream_task, *engine.tasks]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await order_gateway.close()
+            await alpaca_utils.log_sink.close()
+            await stream.stop()
+            await stream_runner.cleanup()
+            await broker_runner.cleanup()
+
+    clock.set_clock(clock.RealClock())
+    engine.step = step
+    del handler.handle_trade_batch
+
+    print(f"{'stage':<18} {'samples':>9} {'p50 us':>9} {'p99 us':>9} {'p999 us':>9} {'max us':>9}")
+    round_trips = [ms * 1_000_000 for _, action, _, ms in order_gateway.latencies if action != "warm_up"]
+    results = {}
+    stages = (
+        ("tick->handler", handler_samples),
+        ("tick->decision", decision_samples),
+        ("tick->order ack", order_samples),
+        ("order round trip", round_trips),
+    )
+    for stage, samples in stages:
+        results[stage] = percentiles_us(samples)
+        count, p50, p99, p999, worst = results[stage]
+        print(f"{stage:<18} {count:>9,} {p50:>9.0f} {p99:>9.0f} {p999:>9.0f} {worst:>9.0f}")
+    print(f"[BENCH] {len(broker.orders):,} orders reached the fake broker")
+    print("[BENCH] the bot's own metrics (metrics.py, what /metrics serves):")
+    print(format_report(metrics.snapshot()))
+    return results
+
+
+# ===== FEED LAG UNDER BURSTS ===== #
+# fake_stream.py -> MarketDataStream -> DataHandler, the path alpaca_utils.feed_monitor watches (no strategy, no broker)
+    # quiet background trades on every symbol, plus hot-ticker bursts well past what handle_trade can take one message at a time
+        # hot ticks sit in the gap-up/>entry consolidation bands, so each one takes the filter + log path like a premarket spike
+    # the fake stream runs in its own process and sends on the scripted timestamps (speed=1), so any backlog is the bot's
+    # run twice: degradation off (thresholds out of reach), then on with FEED_LAG_DEGRADE_MS/FEED_LAG_RECOVER_MS
+    # feed lag = SessionClock - trade timestamp, with SessionClock zeroed on the first trade received
+def bursty_session(configs, seconds=10, base_rate=2_000, burst_rate=80_000, burst_seconds=1.0, period=3.0, hot=1, seed=1):
+    rng = random.Random(seed)
+    start = eastern.localize(datetime.datetime(2025, 7, 1, 8, 0))
+    symbols = list(configs)
+    timed = []
+    for i in range(int(seconds * base_rate)):
+        setup = configs[symbols[i % len(symbols)]]
+        timed.append((i / base_rate, symbols[i % len(symbols)], round((setup.entry_price + setup.stop_loss) / 2, 4)))
+    burst_start = 1.0
+    while burst_start + burst_seconds <= seconds:
+        for j in range(int(burst_seconds * burst_rate)):
+            symbol = symbols[j % hot]
+            price = configs[symbol].entry_price * (1.005 + rng.uniform(-0.002, 0.002))
+            timed.append((burst_start + j / burst_rate, symbol, round(price, 4)))
+        burst_start += period
+    timed.sort(key=lambda event: event[0])
+
+    events = []
+    for offset, symbol, price in timed:
+        timestamp = start + datetime.timedelta(seconds=offset)
+        events.append((timestamp, TRADE, ReplayTrade(symbol, price, 100, timestamp, (" ",))))
+    return events
+
+def _play_stream(events, port, batch_size):
+    # child process: serve the scripted feed once, then idle until terminated
+    from fake_stream import start_fake_stream
+
+    async def run():
+        stream, runner = await start_fake_stream(events, port=port, speed=1.0, batch_size=batch_size)
+        await stream.done.wait()
+        await asyncio.Event().wait()
+    asyncio.run(run())
+
+async def _feed_run(events, configs, port, batch_size, degrade):
+    import alpaca_utils
+    from bar_aggregator import BarAggregator
+    from feed_monitor import FeedMonitor
+    from market_stream import MarketDataStream
+
+    child = multiprocessing.get_context("spawn").Process(target=_play_stream, args=(events, port, batch_size), daemon=True)
+    child.start()
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            break
+        except OSError:
+            await asyncio.sleep(0.05)
+
+    first = events[0][0]
+    session_clock = SessionClock(first)
+    clock.set_clock(session_clock)
+    alpaca_utils.market_state.clear()
+    alpaca_utils.bar_aggregator = BarAggregator(timeframes=(5, 15))
+    alpaca_utils.stock_stream = MarketDataStream(api_key="bench", secret_key="bench", url=f"ws://127.0.0.1:{port}/v2/sip")
+    if degrade:
+        alpaca_utils.feed_monitor = FeedMonitor(alpaca_utils.FEED_LAG_DEGRADE_MS, alpaca_utils.FEED_LAG_RECOVER_MS, on_change=alpaca_utils.on_feed_lag_change)
+    else:
+        alpaca_utils.feed_monitor = FeedMonitor(float("inf"), 0)
+    metrics.reset()
+
+    handler = alpaca_utils.handler
+    handle_trade_batch = handler.handle_trade_batch
+    first_ns = timestamp_ns(first)
+    base_ns = None # perf_counter_ns at session time first_ns
+    worst = defaultdict(int) # second of the session -> max lag us of the trades handled
+    received = 0
+    done = asyncio.Event()
+
+    async def timed_handle_trade_batch(msgs, received_ns):
+        nonlocal received, base_ns
+        handled_ns = time.perf_counter_ns()
+        for msg in msgs:
+            trade_ns = msg["t"].to_unix_nano() - first_ns
+            if base_ns is None:
+                base_ns = handled_ns - trade_ns
+                session_clock.start = base_ns / 1e9
+            lag_us = (handled_ns - base_ns - trade_ns) // 1000
+            second = trade_ns // 1_000_000_000
+            if lag_us > worst[second]:
+                worst[second] = lag_us
+        await handle_trade_batch(msgs, received_ns)
+        received += len(msgs)
+        if received + alpaca_utils.stock_stream.conflated == len(events):
+            done.set()
+
+    handler.handle_trade_batch = timed_handle_trade_batch
+    with tempfile.TemporaryDirectory() as tmp:
+        alpaca_utils.log_sink = LogSink(directory=tmp)
+        alpaca_utils.log_sink.start()
+        stream_task = asyncio.create_task(alpaca_utils.start_price_quote_bar_stream(list(configs)))
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(done.wait(), (events[-1][0] - first).total_seconds() + 60)
+        except asyncio.TimeoutError:
+            print(f"[BENCH] timed out, {received:,}/{len(events):,} trades handled")
+        elapsed = time.perf_counter() - start
+        await alpaca_utils.stock_stream.stop_ws()
+        stream_task.cancel()
+        await asyncio.gather(stream_task, return_exceptions=True)
+        await alpaca_utils.log_sink.close()
+        logged = alpaca_utils.log_sink.written
+
+    child.terminate()
+    child.join()
+    del handler.handle_trade_batch
+    clock.set_clock(clock.RealClock())
+
+    snapshot = metrics.snapshot()
+    switches = sum(sum(labels.values()) for labels in snapshot["counters"].get("feed_degraded", {}).values())
+    return {
+        "lag": snapshot["stages"]["feed_lag_us"]["all"],
+        "worst": worst,
+        "elapsed": elapsed,
+        "logged": logged,
+        "conflated": alpaca_utils.stock_stream.conflated,
+        "switches": switches,
+    }
+
+def bench_feed(n_symbols=40, seconds=10, base_rate=2_000, burst_rate=80_000, burst_seconds=1.0, batch_size=100, port=8766):
+    import alpaca_utils
+
+    configs = synthetic_configs(n_symbols)
+    config_store.publish(configs)
+    events = bursty_session(configs, seconds, base_rate, burst_rate, burst_seconds)
+    print(f"[BENCH] feed: {n_symbols} symbols, {len(events):,} trades over {seconds}s, {base_rate:,} msg/s background, "
+          f"{burst_rate:,} msg/s bursts on 1 hot ticker for {burst_seconds:g}s every 3s, batch {batch_size}")
+    print(f"[BENCH] degrade past {alpaca_utils.FEED_LAG_DEGRADE_MS:g}ms, recover under {alpaca_utils.FEED_LAG_RECOVER_MS:g}ms")
+    if msgpack.Packer.__module__ == "msgpack.fallback":
+        print("[BENCH] NOTE: msgpack is running without its C extension, (un)packing will dominate these numbers")
+
+    results = {}
+    for name, degrade in (("off", False), ("on", True)):
+        results[name] = asyncio.run(_feed_run(events, configs, port, batch_size, degrade))
+
+    print(f"{'degradation':<12} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'done in s':>10} {'conflated':>10} {'log lines':>10} {'switches':>9}")
+    for name, result in results.items():
+        lag = result["lag"]
+        print(f"{name:<12} {lag['p50'] / 1000:>8.1f} {lag['p99'] / 1000:>8.1f} {lag['max'] / 1000:>8.1f} {result['elapsed']:>10.2f} "
+              f"{result['conflated']:>10,} {result['logged']:>10,} {result['switches']:>9}")
+    if not results["on"]["switches"]:
+        print(f"[BENCH] WARNING no symbol degraded, the bursts never put the feed {alpaca_utils.FEED_LAG_DEGRADE_MS:g}ms behind: raise --burst-rate")
+    print("worst feed lag (ms) by second of the session:")
+    print(f"{'second':<8}" + "".join(f"{name:>10}" for name in results))
+    for second in range(int(seconds)):
+        print(f"{second:<8}" + "".join(f"{result['worst'].get(second, 0) / 1000:>10.0f}" for result in results.values()))
+    return results
+
+
+# ===== MARKET DATA BUS ===== #
+# how many trades/s one core folds into market_state, websocket frame bytes in, bus notifications out (no sockets, no strategy)
+    # per message: unpackb + a Trade object + handle_trade per trade (one bus flush each), the stream without a batch handler
+    # batched:     unpackb + handle_trade_batch per frame (raw dicts, one flush per frame), what start_price_quote_bar_stream runs
+    # a consumer subscribed to the bus reads a snapshot of every symbol it's notified about, like the strategy would
+    # input is a replay capture (--capture, replay.py's .bin) or a synthetic SIP burst: every symbol interleaved, half odd lots,
+        # prices across the gap-up/>entry/stop bands so every filter branch runs; feed lag degradation is off for both runs
+def sip_burst_session(configs, messages=400_000, rate=50_000, seed=1):
+    rng = random.Random(seed)
+    start = eastern.localize(datetime.datetime(2025, 7, 1, 8, 0))
+    symbols = list(configs)
+    weights = [1 / (k + 1) for k in range(len(symbols))] # a few hot tickers, a long quiet tail
+    events = []
+    for i, symbol in enumerate(rng.choices(symbols, weights, k=messages)):
+        setup = configs[symbol]
+        price = rng.uniform(setup.stop_loss * 0.98, setup.entry_price * 1.04)
+        size = rng.choice((1, 10, 50, 99, 100, 100, 200, 500))
+        timestamp = start + datetime.timedelta(microseconds=i * 1_000_000 // rate)
+        events.append((timestamp, TRADE, ReplayTrade(symbol, round(price, 4), size, timestamp, ("@",))))
+    return events
+
+async def _bus_run(frames, batched):
+    import alpaca_utils
+    from bar_aggregator import BarAggregator
+    from feed_monitor import FeedMonitor
+    from market_stream import Trade
+
+    alpaca_utils.market_state.clear()
+    alpaca_utils.bar_aggregator = BarAggregator(timeframes=(5, 15))
+    alpaca_utils.feed_monitor = FeedMonitor(float("inf"), 0)
+    metrics.reset()
+    bus = alpaca_utils.market_bus
+    handler = alpaca_utils.handler
+    notified = 0
+
+    def consumer(symbol, received_ns):
+        nonlocal notified
+        notified += 1
+        bus.snapshot(symbol)
+
+    bus.subscribe(consumer)
+    with tempfile.TemporaryDirectory() as tmp:
+        alpaca_utils.log_sink = LogSink(directory=tmp)
+        alpaca_utils.log_sink.start()
+        messages = 0
+        wall_start = time.perf_counter()
+        for data in frames:
+            received_ns = time.perf_counter_ns()
+            msgs = msgpack.unpackb(data)
+            if batched:
+                await handler.handle_trade_batch(msgs, received_ns)
+            else:
+                for msg in msgs:
+                    await handler.handle_trade(Trade(msg))
+            messages += len(msgs)
+            await asyncio.sleep(0) # the log writer gets its turn between frames, like between websocket reads
+        elapsed = time.perf_counter() - wall_start
+        await alpaca_utils.log_sink.close()
+    bus.unsubscribe(consumer)
+    return {
+        "rate": messages / elapsed,
+        "notified": notified,
+        "trades": sum(state.trade_count for state in alpaca_utils.market_state.values()),
+        "dropped": alpaca_utils.log_sink.dropped,
+        "frame": metrics.snapshot()["stages"].get("frame_us", {}).get("all"),
+    }
+
+def bench_bus(n_symbols=40, messages=400_000, rate=50_000, batch_size=100, capture=None, configs_path="configs.json"):
+    from config_store import parse_configs
+    from fake_stream import encode_event
+    from replay import read_capture
+
+    clock.set_clock(SessionClock(eastern.localize(datetime.datetime(2025, 7, 1, 8, 0))))
+    if capture:
+        config_store.publish(parse_configs(configs_path)) # the capture's setups, trades for other symbols return early
+        events = [event for event in read_capture(capture) if event[1] == TRADE]
+        source = f"{capture}, {len(events):,} trades on {len({msg.symbol for _, _, msg in events})} symbols"
+    else:
+        configs = synthetic_configs(n_symbols)
+        config_store.publish(configs)
+        events = sip_burst_session(configs, messages, rate)
+        source = f"synthetic SIP burst, {len(events):,} trades on {n_symbols} symbols"
+    frames = [
+        msgpack.packb([encode_event(i + k, kind, msg) for k, (_, kind, msg) in enumerate(events[i:i + batch_size])])
+        for i in range(0, len(events), batch_size)
+    ]
+    print(f"[BENCH] bus: {source}, {len(frames):,} frames of {batch_size}")
+    if msgpack.Packer.__module__ == "msgpack.fallback":
+        print("[BENCH] NOTE: msgpack is running without its C extension, (un)packing will dominate these numbers")
+
+    results = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name, batched in (("per message", False), ("batched", True)):
+            results[name] = asyncio.run(_bus_run(frames, batched))
+    clock.set_clock(clock.RealClock())
+
+    print(f"{'path':<12} {'msg/s':>10} {'us/msg':>7} {'vs ' + f'{rate:,}/s':>12} {'notified':>9} {'folded':>9} {'log drops':>9}")
+    for name, result in results.items():
+        print(f"{name:<12} {result['rate']:>10,.0f} {1e6 / result['rate']:>7.2f} {result['rate'] / rate:>11.1f}x "
+              f"{result['notified']:>9,} {result['trades']:>9,} {result['dropped']:>9,}")
+    frame = results["batched"]["frame"]
+    if frame:
+        print(f"[BENCH] batched frame decode->published: p50 {frame['p50']:,}us, p99 {frame['p99']:,}us, max {frame['max']:,}us")
+    return results
+
+
+# ===== SHARDED RUNTIME ===== #
+# fake_stream.py (own process) -> feed (this process) -> strategy steps, inline (main.py's one loop) vs shards.py workers
+    # every tick is at/below its stop, so each one is a confirmed update that steps the symbol (FLAT, no orders, no broker)
+    # each step burns --step-cost-us of CPU on top of main.step, a stand-in for heavier strategy logic on a hot day
+    # tick -> step is the engine's tick_to_step_us (websocket frame received -> step start), merged across workers
+    # scaling needs spare cores: on one core the workers only add a process hop
+def stepping_session(configs, messages, rate):
+    start = eastern.localize(datetime.datetime(2025, 7, 1, 8, 0))
+    symbols = list(configs)
+    events = []
+    for i in range(messages):
+        symbol = symbols[i % len(symbols)]
+        timestamp = start + datetime.timedelta(microseconds=i * 1_000_000 // rate)
+        price = round(configs[symbol].stop_loss * (0.99 - (i // len(symbols)) % 10 * 0.001), 4)
+        events.append((timestamp, TRADE, ReplayTrade(symbol, price, 100, timestamp, (" ",))))
+    return events
+
+def _burning_step(step, cost_ns):
+    def burning_step(record):
+        end = time.perf_counter_ns() + cost_ns
+        step(record)
+        while time.perf_counter_ns() < end:
+            pass
+    return burning_step
+
+def _shard_bench_worker(at, start, n_symbols, step_cost_us, out_dir, shard, shards, conn, table_name):
+    # shards.run_worker with the bench's session clock and configs, tick_to_step_us histograms pickled to out_dir at the end
+    import pickle
+    import signal
+    import main
+    import shards as sharding
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    session_clock = SessionClock(at)
+    session_clock.start = start
+    clock.set_clock(session_clock)
+    config_store.publish(synthetic_configs(n_symbols))
+    main.engine.step = _burning_step(main.engine.step, step_cost_us * 1000)
+    main.day_trades = DayTradeBudget(os.path.join(out_dir, "day_trades.db")) # shared by the bench's workers, not the live file
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        asyncio.run(sharding.worker_main(shard, shards, conn, table_name))
+    conn.close()
+    with open(os.path.join(out_dir, f"shard-{shard}.pickle"), "wb") as file:
+        pickle.dump({key: h for key, h in metrics.histograms.items() if key[0] == "tick_to_step_us"}, file)
+
+async def _shards_run(events, configs, port, batch_size, shards, step_cost_us):
+    import functools
+    import pickle
+    import alpaca_utils
+    import main
+    import shards as sharding
+    from bar_aggregator import BarAggregator
+    from feed_monitor import FeedMonitor
+    from market_stream import MarketDataStream
+    from metrics import Histogram
+    from notifier import Notifier, StdoutSink
+
+    at = eastern.localize(datetime.datetime(2025, 7, 1, 8, 0))
+    session_clock = SessionClock(at)
+    clock.set_clock(session_clock)
+    alpaca_utils.market_state.clear()
+    alpaca_utils.bar_aggregator = BarAggregator(timeframes=(5, 15))
+    alpaca_utils.feed_monitor = FeedMonitor(float("inf"), 0)
+    alpaca_utils.stock_stream = MarketDataStream(api_key="bench", secret_key="bench", url=f"ws://127.0.0.1:{port}/v2/sip")
+    metrics.reset()
+
+    tmp = tempfile.TemporaryDirectory()
+    feed = None
+    if shards:
+        worker = functools.partial(_shard_bench_worker, at, session_clock.start, len(configs), step_cost_us, tmp.name)
+        feed = sharding.ShardedFeed(shards, worker=worker)
+        feed.start(Journal(os.path.join(tmp.name, "journal")), Notifier([StdoutSink()]))
+    else:
+        step = main.engine.step
+        main.engine.step = _burning_step(step, step_cost_us * 1000)
+        main.engine.start()
+        for setup in configs.values():
+            main.start_monitor(setup)
+
+    child = multiprocessing.get_context("spawn").Process(target=_play_stream, args=(events, port, batch_size), daemon=True)
+    child.start()
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            break
+        except OSError:
+            await asyncio.sleep(0.05)
+
+    handler = alpaca_utils.handler
+    handle_trade_batch = handler.handle_trade_batch
+    received = 0
+    done = asyncio.Event()
+
+    async def counting_handle_trade_batch(msgs, received_ns):
+        nonlocal received
+        await handle_trade_batch(msgs, received_ns)
+        received += len(msgs)
+        if received == len(events):
+            done.set()
+
+    handler.handle_trade_batch = counting_handle_trade_batch
+    alpaca_utils.log_sink = LogSink(directory=tmp.name)
+    alpaca_utils.log_sink.start()
+    stream_task = asyncio.create_task(alpaca_utils.start_price_quote_bar_stream(list(configs)))
+    try:
+        await asyncio.wait_for(done.wait(), (events[-1][0] - events[0][0]).total_seconds() + 60)
+    except asyncio.TimeoutError:
+        print(f"[BENCH] timed out, {received:,}/{len(events):,} trades handled")
+    await asyncio.sleep(0.5) # last steps
+    await alpaca_utils.stock_stream.stop_ws()
+    stream_task.cancel()
+    await asyncio.gather(stream_task, return_exceptions=True)
+    await alpaca_utils.log_sink.close()
+    child.terminate()
+    child.join()
+    del handler.handle_trade_batch
+
+    merged = Histogram()
+    if feed is not None:
+        await feed.stop()
+        for shard in range(shards):
+            path = os.path.join(tmp.name, f"shard-{shard}.pickle")
+            if os.path.exists(path):
+                with open(path, "rb") as file:
+                    for histogram in pickle.load(file).values():
+                        merged.merge(histogram)
+    else:
+        pending = list(main.engine.tasks)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        main.engine.step = step
+        main.engine.records.clear()
+        for (stage, symbol), histogram in metrics.histograms.items():
+            if stage == "tick_to_step_us":
+                merged.merge(histogram)
+    tmp.cleanup()
+    clock.set_clock(clock.RealClock())
+    return merged.stats()
+
+def bench_shards(n_symbols=40, rate=10_000, seconds=5, step_cost_us=200, batch_size=100, shard_counts=(1, 2, 4), port=8767):
+    configs = synthetic_configs(n_symbols)
+    config_store.publish(configs)
+    events = stepping_session(configs, int(rate * seconds), rate)
+    print(f"[BENCH] shards: {n_symbols} symbols, {len(events):,} confirmed ticks @ {rate:,} msg/s, batch {batch_size}, "
+          f"{step_cost_us}us per step, {os.cpu_count()} cores")
+
+    results = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for shards in (0, *shard_counts):
+            results["inline" if not shards else f"{shards} shards"] = asyncio.run(_shards_run(events, configs, port, batch_size, shards, step_cost_us))
+
+    print(f"{'runtime':<10} {'steps':>8} {'tick->step p50 us':>18} {'p99 us':>9} {'p99.9 us':>9} {'max us':>9}")
+    for name, steps in results.items():
+        print(f"{name:<10} {steps['count']:>8,} {steps['p50']:>18,} {steps['p99']:>9,} {steps['p99.9']:>9,} {steps['max']:>9,}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("bench", choices=["memory", "quotes", "pricing", "e2e", "feed", "bus", "shards"])
+    parser.add_argument("--symbols", type=int, default=40)
+    parser.add_argument("--minutes", type=int, default=840)
+    parser.add_argument("--trades-per-minute", type=int, default=30)
+    parser.add_argument("--rate", type=int, default=None, help="e2e: messages per second (default 20,000); bus: burst rate to keep up with (default 50,000)")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--batch", type=int, default=100, help="e2e: max messages per websocket frame")
+    parser.add_argument("--broker-delay-ms", type=int, default=0)
+    parser.add_argument("--base-rate", type=int, default=2_000, help="feed: background messages per second")
+    parser.add_argument("--burst-rate", type=int, default=80_000, help="feed: hot ticker messages per second during a burst, past what the batched path keeps up with")
+    parser.add_argument("--messages", type=int, default=400_000, help="bus: synthetic trades")
+    parser.add_argument("--capture", default=None, help="bus: replay.py capture (.bin) to fold instead of the synthetic burst")
+    parser.add_argument("--configs", default="configs.json", help="bus: setups for --capture")
+    parser.add_argument("--step-cost-us", type=int, default=200, help="shards: extra CPU per strategy step")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4], help="shards: worker counts to compare with inline")
+    args = parser.parse_args()
+
+    if args.bench == "memory":
+        asyncio.run(bench_memory(args.symbols, args.minutes, args.trades_per_minute))
+    elif args.bench == "quotes":
+        bench_quotes()
+    elif args.bench == "pricing":
+        bench_pricing()
+    elif args.bench == "e2e":
+        asyncio.run(bench_e2e(args.symbols, args.rate or 20_000, args.seconds, batch_size=args.batch, broker_delay_ms=args.broker_delay_ms))
+    elif args.bench == "feed":
+        bench_feed(args.symbols, args.seconds, args.base_rate, args.burst_rate, batch_size=args.batch)
+    elif args.bench == "bus":
+        bench_bus(args.symbols, args.messages, args.rate or 50_000, args.batch, args.capture, args.configs)
+    elif args.bench == "shards":
+        bench_shards(args.symbols, args.rate or 10_000, args.seconds, args.step_cost_us, args.batch, args.shards)
@@ -3,11 +3,10 @@ from alpaca.data.enums import DataFeed
 
 from dotenv import load_dotenv
 import os
-import json
-
 import asyncio
 
 from alpaca_utils import stop_price_quote_bar_stream
+from config_store import store as config_store
 
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
@@ -16,11 +15,7 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 stock_stream = StockDataStream(api_key=API_KEY, secret_key=SECRET_KEY, feed=DataFeed.SIP)
 
 
-CONFIG_PATH = "configs.json"
-with open("configs.json", "r") as f:
-    configs_json = json.load(f)
-
-symbols = [setup["symbol"] for setup in configs_json]
+symbols = config_store.symbols()
 
 
 async def main():
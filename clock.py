@@ -0,0 +1,238 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import time
+import pytz
+
+from market_state import timestamp_ns
+
+
+eastern = pytz.timezone("US/Eastern")
+
+# trading day, US/Eastern wall clock
+PREMARKET_OPEN = datetime.time(4, 0)
+RTH_OPEN = datetime.time(9, 30)
+RTH_CLOSE = datetime.time(16, 0)
+AFTER_HOURS_CLOSE = datetime.time(20, 0)
+LAST_ENTRY = datetime.time(17, 30) # no new entries after this, ~30min before end, tweak
+EOD_EXIT = datetime.time(17, 55)
+
+# Session.session_of() results
+OVERNIGHT = "overnight"
+PREMARKET = "premarket"
+RTH = "rth"
+AFTER_HOURS = "after_hours"
+
+HOUR_S = 3600
+
+_fixed_offsets = {} # utcoffset -> one shared datetime.timezone, same tzinfo object = plain compare, no utcoffset() calls
+
+def fixed_offset(offset):
+    tz = _fixed_offsets.get(offset)
+    if tz is None:
+        tz = _fixed_offsets[offset] = datetime.timezone(offset)
+    return tz
+
+
+# wall clock in US/Eastern...
+    # datetime.now(pytz tz) resolves the offset through pytz on every call (~7us), so the offset is looked up once
+    # per hour (DST only ever switches on the hour) and now() is a plain fromtimestamp with a fixed-offset tzinfo
+    # compares, subtracts and prints the same as the pytz-aware datetime (2025-07-01 04:05:29.792310-04:00)
+class RealClock:
+    def __init__(self):
+        self._tz = None
+        self._tz_until = 0
+
+    def now(self):
+        t = time.time()
+        if t >= self._tz_until:
+            self._tz = fixed_offset(datetime.datetime.fromtimestamp(t, eastern).utcoffset())
+            self._tz_until = (int(t) // HOUR_S + 1) * HOUR_S
+        return datetime.datetime.fromtimestamp(t, self._tz)
+
+    async def wait(self, event, timeout=None):
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+
+# simulated time for replay/backtests...
+    # time only moves when the replay engine calls advance_to(), timeouts and sleeps fire in simulated time
+    # parked tracks how many tasks are blocked on the clock, so the engine can wait for every monitor to go idle
+    # before feeding the next message (makes replays deterministic regardless of thread/file I/O timing)
+class SimClock:
+    def __init__(self, start):
+        self.current = start
+        self._parked = []
+        self._timers = []
+        self._cancelled_timers = 0
+        self._seq = itertools.count()
+
+    def now(self):
+        return self.current
+
+    def _timer(self, seconds):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._timers, (self.current + datetime.timedelta(seconds=seconds), next(self._seq), future))
+        return future
+
+    async def wait(self, event, timeout=None):
+        if event.is_set():
+            return True
+        event_waiter = asyncio.ensure_future(event.wait())
+        pending = {event_waiter}
+        timer = None
+        if timeout is not None:
+            timer = self._timer(timeout)
+            pending.add(timer)
+        entry = (event, timer)
+        self._parked.append(entry)
+        try:
+            await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._parked.remove(entry)
+            event_waiter.cancel()
+            if timer is not None and not timer.done():
+                timer.cancel()
+                self._drop_cancelled_timers()
+        return event.is_set()
+
+    def _drop_cancelled_timers(self):
+        # timeouts beaten by their event stay in the heap until popped; compact before they pile up over a session
+        self._cancelled_timers += 1
+        if self._cancelled_timers > 1024 and self._cancelled_timers * 2 > len(self._timers):
+            self._timers = [t for t in self._timers if not t[2].done()]
+            heapq.heapify(self._timers)
+            self._cancelled_timers = 0
+
+    async def sleep(self, seconds):
+        timer = self._timer(seconds)
+        entry = (None, timer)
+        self._parked.append(entry)
+        try:
+            await timer
+        finally:
+            self._parked.remove(entry)
+
+    @property
+    def parked(self):
+        # blocked on the clock with no wakeup delivered yet
+        return sum(
+            1 for event, timer in self._parked
+            if not (event is not None and event.is_set()) and not (timer is not None and timer.done())
+        )
+
+    async def settle(self, tasks):
+        # yields until every live task is blocked on the clock and none has a pending wakeup
+        while self.parked < sum(1 for task in tasks if not task.done()):
+            await asyncio.sleep(0)
+
+    async def advance_to(self, when, tasks=()):
+        # fires due timers in order, letting tasks react at each timer's own time
+        while self._timers and self._timers[0][0] <= when:
+            deadline, _, future = heapq.heappop(self._timers)
+            if future.done():
+                continue
+            if deadline > self.current:
+                self.current = deadline
+            future.set_result(None)
+            await self.settle(tasks)
+        if when > self.current:
+            self.current = when
+
+
+def _local(date, t):
+    # same tzinfo object as RealClock.now(), comparisons against a different tzinfo go through utcoffset() on both sides
+    at = eastern.localize(datetime.datetime.combine(date, t))
+    return at.replace(tzinfo=fixed_offset(at.utcoffset()))
+
+
+# one trading date's boundaries, built once per date by session()/session_ns() instead of per call...
+    # as tz-aware datetimes for comparing against clock.now() (strategy/order path)
+    # and as epoch ns for classifying an exchange timestamp (trade.timestamp, bar ts) with int compares, no clock read
+class Session:
+    __slots__ = (
+        "date", "start", "end", "premarket_open", "rth_open", "rth_close", "after_hours_close", "last_entry", "eod_exit",
+        "start_ns", "end_ns", "premarket_open_ns", "rth_open_ns", "rth_close_ns", "after_hours_close_ns", "last_entry_ns", "eod_exit_ns",
+    )
+
+    def __init__(self, date):
+        self.date = date
+        self.start = _local(date, datetime.time())
+        self.end = _local(date + datetime.timedelta(days=1), datetime.time())
+        self.premarket_open = _local(date, PREMARKET_OPEN)
+        self.rth_open = _local(date, RTH_OPEN)
+        self.rth_close = _local(date, RTH_CLOSE)
+        self.after_hours_close = _local(date, AFTER_HOURS_CLOSE)
+        self.last_entry = _local(date, LAST_ENTRY)
+        self.eod_exit = _local(date, EOD_EXIT)
+
+        self.start_ns = timestamp_ns(self.start)
+        self.end_ns = timestamp_ns(self.end)
+        self.premarket_open_ns = timestamp_ns(self.premarket_open)
+        self.rth_open_ns = timestamp_ns(self.rth_open)
+        self.rth_close_ns = timestamp_ns(self.rth_close)
+        self.after_hours_close_ns = timestamp_ns(self.after_hours_close)
+        self.last_entry_ns = timestamp_ns(self.last_entry)
+        self.eod_exit_ns = timestamp_ns(self.eod_exit)
+
+    def is_intraday(self, now):
+        return self.rth_open <= now < self.rth_close
+
+    def session_of(self, ts_ns):
+        # which part of the day an epoch ns timestamp on this date falls in
+        if ts_ns < self.premarket_open_ns or ts_ns >= self.after_hours_close_ns:
+            return OVERNIGHT
+        if ts_ns < self.rth_open_ns:
+            return PREMARKET
+        if ts_ns < self.rth_close_ns:
+            return RTH
+        return AFTER_HOURS
+
+    def __repr__(self):
+        return f"Session({self.date} premarket {PREMARKET_OPEN}, rth {RTH_OPEN}-{RTH_CLOSE}, after hours to {AFTER_HOURS_CLOSE}, last entry {LAST_ENTRY}, eod exit {EOD_EXIT})"
+
+
+_clock = RealClock()
+_session = None
+
+def set_clock(clock):
+    global _clock
+    _clock = clock
+
+def get_clock():
+    return _clock
+
+def now():
+    return _clock.now()
+
+def session(at=None):
+    # Session for at's date (default now), rebuilt only when the date changes
+    global _session
+    at = at or _clock.now()
+    if _session is None or not (_session.start <= at < _session.end):
+        _session = Session(at.astimezone(eastern).date())
+    return _session
+
+def session_ns(ts_ns):
+    # Session for an epoch ns timestamp's date, same cache as session()
+    global _session
+    if _session is None or not (_session.start_ns <= ts_ns < _session.end_ns):
+        _session = Session(datetime.datetime.fromtimestamp(ts_ns // 1_000_000_000, eastern).date())
+    return _session
+
+def session_of(ts_ns):
+    # OVERNIGHT/PREMARKET/RTH/AFTER_HOURS for an exchange timestamp, e.g. session_of(timestamp_ns(trade.timestamp))
+    return session_ns(ts_ns).session_of(ts_ns)
+
+async def wait(event, timeout=None):
+    return await _clock.wait(event, timeout)
+
+async def sleep(seconds):
+    await _clock.sleep(seconds)
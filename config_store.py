@@ -0,0 +1,215 @@
+import asyncio
+import ctypes
+import ctypes.util
+import json
+import os
+import struct
+import sys
+from collections import namedtuple
+from types import MappingProxyType
+
+
+CONFIG_PATH = "configs.json"
+
+
+# compact per-symbol record, qty and position halves precomputed once per config load instead of per tick
+class SymbolConfig:
+    __slots__ = ("symbol", "entry_price", "stop_loss", "dollar_value", "qty", "half_qty", "other_half")
+
+    def __init__(self, setup):
+        self.symbol = setup["symbol"]
+        self.entry_price = float(setup["entry_price"])
+        self.stop_loss = float(setup["stop_loss"])
+        self.dollar_value = float(setup["dollar_value"])
+        self.qty = round(self.dollar_value / self.entry_price)
+        self.half_qty = round(self.qty / 2)
+        self.other_half = self.qty - self.half_qty
+
+    def __eq__(self, other):
+        if not isinstance(other, SymbolConfig):
+            return NotImplemented
+        return (self.symbol, self.entry_price, self.stop_loss, self.dollar_value) == (other.symbol, other.entry_price, other.stop_loss, other.dollar_value)
+
+    def __repr__(self):
+        return f"SymbolConfig({self.symbol}, entry={self.entry_price}, stop={self.stop_loss}, qty={self.qty})"
+
+
+ConfigDiff = namedtuple("ConfigDiff", ["added", "removed", "changed"])
+
+
+def parse_configs(path):
+    # runs off the event loop; raises ValueError on anything that isn't a complete, sane config file
+    with open(path, "r") as f:
+        setups = json.load(f)
+    if not isinstance(setups, list):
+        raise ValueError("configs.json must be a list of setups")
+
+    configs = {}
+    for setup in setups:
+        try:
+            config = SymbolConfig(setup)
+        except (KeyError, TypeError, ValueError, ZeroDivisionError) as e:
+            raise ValueError(f"invalid setup {setup}: {e!r}")
+        if config.symbol in configs:
+            raise ValueError(f"duplicate symbol {config.symbol}")
+        if config.entry_price <= 0 or config.dollar_value <= 0 or config.qty < 1:
+            raise ValueError(f"{config.symbol}: entry_price, dollar_value and qty must be positive")
+        if not 0 < config.stop_loss < config.entry_price:
+            raise ValueError(f"{config.symbol}: stop_loss must be between 0 and entry_price")
+        configs[config.symbol] = config
+    return configs
+
+
+# configs.json keyed by symbol, shared by alpaca_utils (handle_trade) and main (strategy step)
+    # lookups are a dict get instead of a next(...) scan over the list on every trade/loop
+    # each reload publishes a new read-only snapshot in one assignment, so readers never see a half-built dict
+class ConfigStore:
+    def __init__(self, path=CONFIG_PATH):
+        self.path = path
+        self.configs = MappingProxyType({})
+        self.version = 0
+        self.load()
+
+    def load(self):
+        self.publish(parse_configs(self.path))
+        return self.configs
+
+    def publish(self, configs):
+        old = self.configs
+        added = [symbol for symbol in configs if symbol not in old]
+        removed = [symbol for symbol in old if symbol not in configs]
+        changed = [symbol for symbol in configs if symbol in old and configs[symbol] != old[symbol]]
+
+        self.configs = MappingProxyType(configs)
+        self.version += 1
+        return ConfigDiff(added, removed, changed)
+
+    def get(self, symbol):
+        return self.configs.get(symbol)
+
+    def symbols(self):
+        return list(self.configs)
+
+
+# ===== HOT RELOAD ===== #
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+# single reload service for the whole bot...
+    # replaces every monitor_trade stat-ing configs.json each loop iteration
+    # inotify on the config directory where available (catches editors that write-and-rename), else one shared mtime poll
+    # parse + validate run in a thread, a bad/partial file keeps the current snapshot
+    # listeners get a ConfigDiff after each publish (e.g. main subscribes/unsubscribes symbols)
+class ConfigWatcher:
+    def __init__(self, store, poll_interval=1.0, debounce=0.05):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.listeners = []
+
+        self._task = None
+        self._changed = asyncio.Event()
+        self._inotify_fd = None
+        self._last_mtime = self._mtime()
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def _mtime(self):
+        try:
+            return os.stat(self.store.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _start_inotify(self):
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return False
+            directory = os.path.dirname(os.path.abspath(self.store.path))
+            if libc.inotify_add_watch(fd, directory.encode(), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                os.close(fd)
+                return False
+        except (OSError, AttributeError):
+            return False
+
+        self._inotify_fd = fd
+        asyncio.get_running_loop().add_reader(fd, self._on_inotify)
+        return True
+
+    def _on_inotify(self):
+        target = os.path.basename(self.store.path)
+        try:
+            data = os.read(self._inotify_fd, 4096)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            _, _, _, name_len = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + name_len].rstrip(b"\0").decode(errors="replace")
+            offset += name_len
+            if name == target:
+                self._changed.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        if self._start_inotify():
+            print(f"[MOD] Watching {self.store.path} (inotify)")
+            while True:
+                await self._changed.wait()
+                await asyncio.sleep(self.debounce) # coalesce the write/close bursts from a single save
+                self._changed.clear()
+                await self.reload()
+        else:
+            print(f"[MOD] Watching {self.store.path} (polling every {self.poll_interval}s)")
+            while True:
+                await asyncio.sleep(self.poll_interval)
+                mtime = self._mtime()
+                if mtime is not None and mtime != self._last_mtime:
+                    self._last_mtime = mtime
+                    await self.reload()
+
+    async def reload(self):
+        try:
+            configs = await asyncio.to_thread(parse_configs, self.store.path)
+        except Exception as e:
+            print(f"[MOD] Configs invalid or mid-modification, keeping current: {e}")
+            return None
+
+        diff = self.store.publish(configs)
+        if not any(diff):
+            return diff
+        print(f"[MOD] Configs updated: +{diff.added} -{diff.removed} ~{diff.changed}")
+
+        for callback in self.listeners:
+            try:
+                result = callback(diff)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print(f"[MOD] Config listener failed: {e}")
+        return diff
+
+    async def stop(self):
+        if self._inotify_fd is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify_fd)
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+store = ConfigStore()
@@ -0,0 +1,238 @@
+import datetime
+import os
+import sqlite3
+import time
+
+import clock
+
+
+DB_PATH = os.getenv("DAY_TRADE_DB", "trade-log/day_trades.db") # shared by every bot on the account (hybrid, crypto, shards)
+DAILY_LIMIT = int(os.getenv("DAY_TRADE_DAILY_LIMIT", "1")) # spreads the window's trades over the week, tweak
+WINDOW_LIMIT = int(os.getenv("DAY_TRADE_WINDOW_LIMIT", "3")) # PDT: a 4th day trade in 5 business days flags the account
+WINDOW_DAYS = 5
+
+RESERVED = "reserved" # entry decided, order not filled yet; counts against the budget
+CONFIRMED = "confirmed" # entry filled
+RELEASED = "released" # entry never filled, gives the day trade back
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS day_trades (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    state TEXT NOT NULL,
+    reserved_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS day_trades_date ON day_trades (date);
+"""
+
+
+def window_start(date, days=WINDOW_DAYS):
+    # first of the `days` business days ending on date; weekends skipped, market holidays aren't modelled
+        # (a holiday inside the window makes it one business day short, i.e. slightly less strict than the broker's count)
+    n = 1
+    while n < days:
+        date -= datetime.timedelta(days=1)
+        if date.weekday() < 5:
+            n += 1
+    return date
+
+
+# day-trade budget shared across processes and restarts, one sqlite file (DB_PATH)...
+    # reserve() is the atomic check-and-take: a BEGIN IMMEDIATE transaction (sqlite's write lock, across processes)
+        # counts the live rows of today and of the rolling window and inserts a RESERVED row if both limits allow it
+    # confirm()/release() settle a reservation once its entry order filled / didn't; a reservation that is never settled
+        # (crash mid-entry) keeps counting, the safe side. python3 day_trades.py release <id> gives it back by hand
+    # left() is on the step's hot path: cached counts, re-read only when another connection committed (PRAGMA data_version)
+        # or the date changed, so a tick costs one pragma, not a query
+    # WAL + synchronous=NORMAL: commits don't fsync, the WAL is synced at checkpoints (batched); a process crash or restart
+        # loses nothing, only a power cut can drop the last commits
+    # ":memory:" for replay/benchmarks, nothing touches the live file
+class DayTradeBudget:
+    def __init__(self, path=DB_PATH, daily_limit=DAILY_LIMIT, window_limit=WINDOW_LIMIT, owner="hybrid"):
+        self.path = path
+        self.daily_limit = daily_limit
+        self.window_limit = window_limit
+        self.owner = owner
+        self.db = None # opened on first use, in the process that uses it (shard workers open their own)
+
+        self._date = None
+        self._version = None
+        self.last_left = 0 # what the last left() saw, for readers off the loop (metrics dump thread)
+
+    def _connect(self):
+        if self.db is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=1.0, isolation_level=None) # autocommit, transactions are explicit
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self.db = db
+        return self.db
+
+    def _counts(self, date):
+        # (today, window) live rows
+        today = window = 0
+        for day, n in self.db.execute(
+            "SELECT date, COUNT(*) FROM day_trades WHERE date >= ? AND date <= ? AND state != ? GROUP BY date",
+            (window_start(date).isoformat(), date.isoformat(), RELEASED),
+        ):
+            window += n
+            if day == date.isoformat():
+                today = n
+        return today, window
+
+    def _refresh(self, date):
+        today, window = self._counts(date)
+        self.last_left = max(0, min(self.daily_limit - today, self.window_limit - window))
+        self._date = date
+        self._version = self.db.execute("PRAGMA data_version").fetchone()[0]
+
+    def left(self, at=None):
+        # day trades still allowed on at's ET date (default now), 0 if the budget can't be read (fail closed)
+        date = clock.session(at).date
+        try:
+            db = self._connect()
+            if date != self._date or db.execute("PRAGMA data_version").fetchone()[0] != self._version:
+                self._refresh(date)
+        except sqlite3.Error as e:
+            print(f"[DAY TRADES] Budget unreadable, no entries: {e}")
+            self._date = None
+            return 0
+        return self.last_left
+
+    def reserve(self, symbol, at=None):
+        # reservation id, or None when today's or the window's limit is used up (or another process just took the last one)
+        at = at or clock.now()
+        date = clock.session(at).date
+        now = time.time()
+        try:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                today, window = self._counts(date)
+                reservation = None
+                if today < self.daily_limit and window < self.window_limit:
+                    reservation = db.execute(
+                        "INSERT INTO day_trades (date, symbol, owner, state, reserved_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (date.isoformat(), symbol, self.owner, RESERVED, now, now),
+                    ).lastrowid
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"[DAY TRADES] [{symbol}] Reserve failed, no entry: {e}")
+            return None
+        self._date = None # own commits don't move data_version, recount on the next left()
+        return reservation
+
+    def _settle(self, reservation, state):
+        try:
+            self._connect().execute(
+                "UPDATE day_trades SET state = ?, updated_at = ? WHERE id = ? AND state = ?",
+                (state, time.time(), reservation, RESERVED),
+            )
+        except sqlite3.Error as e:
+            print(f"[DAY TRADES] Couldn't mark reservation {reservation} {state}: {e}")
+        self._date = None
+
+    def confirm(self, reservation):
+        self._settle(reservation, CONFIRMED)
+
+    def release(self, reservation):
+        self._settle(reservation, RELEASED)
+
+    def rows(self, at=None):
+        # the window's rows, oldest first: (id, date, symbol, owner, state)
+        date = clock.session(at).date
+        return self._connect().execute(
+            "SELECT id, date, symbol, owner, state FROM day_trades WHERE date >= ? AND date <= ? ORDER BY id",
+            (window_start(date).isoformat(), date.isoformat()),
+        ).fetchall()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+            self._date = None
+
+
+# ===== CHECK ===== #
+# several processes race reserve() on one file: exactly the limit's worth of reservations may win
+def _race(path, rounds, results):
+    budget = DayTradeBudget(path, daily_limit=3, window_limit=3, owner=f"pid-{os.getpid()}")
+    at = clock.session().rth_open
+    won = [r for r in (budget.reserve("RACE", at) for _ in range(rounds)) if r is not None]
+    results.put(won)
+    budget.close()
+
+def check_budget(processes=4, rounds=50):
+    import multiprocessing
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "day_trades.db")
+        DayTradeBudget(path)._connect().close() # schema + WAL before the race
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        racers = [context.Process(target=_race, args=(path, rounds, results)) for _ in range(processes)]
+        for racer in racers:
+            racer.start()
+        won = sum((results.get() for _ in racers), [])
+        for racer in racers:
+            racer.join()
+        assert len(won) == 3 == len(set(won)), won
+
+        # window: 3 on friday blocks monday, released ones don't count, restarts see it all
+        friday = clock.Session(datetime.date(2025, 7, 11)).rth_open
+        monday = clock.Session(datetime.date(2025, 7, 14)).rth_open
+        next_friday = clock.Session(datetime.date(2025, 7, 18)).rth_open
+        budget = DayTradeBudget(os.path.join(tmp, "window.db"), daily_limit=5, window_limit=3)
+        ids = [budget.reserve("A", friday) for _ in range(3)]
+        assert budget.reserve("A", friday) is None and budget.left(monday) == 0
+        budget.release(ids[0])
+        assert budget.left(monday) == 1
+        budget.confirm(ids[1])
+        budget.close()
+        budget = DayTradeBudget(os.path.join(tmp, "window.db"), daily_limit=5, window_limit=3)
+        assert budget.left(monday) == 1 and budget.left(next_friday) == 3
+
+        # left() sees another connection's reservation through data_version
+        other = DayTradeBudget(os.path.join(tmp, "window.db"), daily_limit=5, window_limit=3)
+        assert other.reserve("B", monday) is not None and budget.left(monday) == 0
+
+        n = 100_000
+        started = time.perf_counter_ns()
+        for _ in range(n):
+            budget.left(monday)
+        left_ns = (time.perf_counter_ns() - started) // n
+        started = time.perf_counter_ns()
+        for _ in range(200):
+            budget.release(other.reserve("B", next_friday))
+        reserve_us = (time.perf_counter_ns() - started) // 200 // 1000
+        budget.close()
+        other.close()
+    print(f"[DAY TRADES] budget check passed ({processes} processes raced {rounds} reserves each, 3 won; left() {left_ns}ns, reserve+release {reserve_us}us)")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["show", "release", "check"])
+    parser.add_argument("reservation", nargs="?", type=int, help="release: reservation id (from show)")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    if args.command == "check":
+        check_budget()
+    else:
+        budget = DayTradeBudget(args.db)
+        if args.command == "release":
+            budget.release(args.reservation)
+        for row in budget.rows():
+            print(*row)
+        print(f"[DAY TRADES] {budget.left()} left today (limits {budget.daily_limit}/day, {budget.window_limit}/{WINDOW_DAYS} business days)")
+        budget.close()
@@ -1,9 +1,10 @@
-import time
-import requests
-import pytz
+import asyncio
 import datetime
 
-from pushbullet import Pushbullet
+from clock import eastern
+from journal import Journal, ENTRY, EXITS
+from metrics import load_dump, format_report
+from notifier import Notifier, default_sinks
 
 from dotenv import load_dotenv
 import os
@@ -12,59 +13,74 @@ load_dotenv()
 
 PB_API_KEY = os.getenv("PUSHBULLET_API_KEY")
 
-class DummyPB:
-    def push_note(self, title, body):
-        print(f"(PB Failed) Unsent notification: {title}, {body}")
 
-pb = DummyPB()
-
-pb_reconnect_tries = 0
-while pb_reconnect_tries < 5:
-    try:
-        pb = Pushbullet(PB_API_KEY)
-        break
-    except requests.exceptions.ConnectionError as e:
-        pb_reconnect_tries += 1
-        print(f"PB connection failed({pb_reconnect_tries}/5), retrying in 10s...", e)
-        time.sleep(10)
-
-
-# intput format:
-    # "{now}, {symbol}, ENTRY/EXIT/skip/EOD EXIT, {qty}, {price}"
-    # ...
-
-def daily_pl_calc():
-    entry_exit = {}
-    percs = []
-
-    eastern = pytz.timezone("US/Eastern")
-    now = datetime.datetime.now(eastern)
-    today = now.date()
-
-    with open("trade-log/trade_log.txt", "a") as file:
-        lines = file.readlines()
-
-    for l in lines:
-        split_line = l.split(", ")
-        split_line[0] = datetime.datetime.strptime(split_line[0].strip(), "%Y-%m-%d %H:%M:%S")
-        
-        if split_line[0].date() == today:
-            if "ENTRY" in split_line[2]:
-                entry_exit[split_line[1]] = [float(split_line[4])]
-            if "EXIT" in split_line[2]:
-                entry_exit[split_line[1]].append(float(split_line[4]))
-
-    for coin in entry_exit:
-        pl = round( ( coin[1] / coin[0] - 1 ) * 100, 1 )
-        percs.append(pl)
-        entry_exit[coin].append(pl)
-
-    total_trades = len(percs)
-    total_pl = sum(percs)
-    
-
-    pb.push_note("Stock P/L", f"{total_pl}% ({total_trades}): {", ".join(f"{key}: {item[2]}" for key, item in entry_exit.items())}")
-    print(f"{total_pl}% ({total_trades}): {", ".join(f"{key}: {item[2]}" for key, item in entry_exit.items())}")
+async def push(title, body):
+    # one-shot: queue, then close() sends it (retries included) before the script exits
+    notifier = Notifier(default_sinks(PB_API_KEY))
+    notifier.notify(title, body)
+    await notifier.close()
+
+
+# input: journal.Journal rows for the day, one file read per date (no re-parsing the whole history)
+    # P/L per symbol = qty-weighted exit price vs qty-weighted entry price, exits without an entry that day are ignored
+
+def symbol_pl(rows):
+    # {symbol: pl %} for one date's journal rows
+    import numpy as np
+    results = {}
+    for symbol in np.unique(rows["symbol"]):
+        mine = rows[rows["symbol"] == symbol]
+        entries = mine[mine["kind"] == ENTRY]
+        exits = mine[np.isin(mine["kind"], EXITS) & ~np.isnan(mine["price"])]
+        if not len(entries) or not len(exits) or not entries["qty"].sum() or not exits["qty"].sum():
+            continue
+        entry_price = (entries["qty"] * entries["price"]).sum() / entries["qty"].sum()
+        exit_price = (exits["qty"] * exits["price"]).sum() / exits["qty"].sum()
+        results[symbol.decode()] = round((exit_price / entry_price - 1) * 100, 1)
+    return results
+
+def latency_headline(data):
+    # one line for the push: how far behind the feed the bot got, and order round trips
+    stages = data["stages"]
+    parts = []
+    for stage, label in (("feed_lag_us", "feed lag"), ("order_ack_us", "order ack")):
+        stats = stages.get(stage, {}).get("all")
+        if stats:
+            parts.append(f"{label} p99 {stats['p99'] / 1000:.0f}ms max {stats['max'] / 1000:.0f}ms")
+    return ", ".join(parts)
+
+def daily_pl_calc(date=None, journal=None, push_report=True, metrics_dir="trade-log/metrics"):
+    journal = journal or Journal()
+    date = date or datetime.datetime.now(eastern).date()
+    pls = symbol_pl(journal.rows(date))
+
+    total_trades = len(pls)
+    total_pl = round(sum(pls.values()), 1)
+
+    report = f"{total_pl}% ({total_trades}): {", ".join(f"{key}: {pl}" for key, pl in pls.items())}"
+    metrics = load_dump(date, metrics_dir) # main.py's latency/counter dump for the day, if the bot ran
+    if metrics and latency_headline(metrics):
+        report += f"\n{latency_headline(metrics)}"
+    if push_report:
+        asyncio.run(push("Stock P/L", report))
+    print(report)
+    if metrics:
+        print(format_report(metrics))
+    return pls
+
+def multi_day_pl(start=None, end=None, journal=None):
+    # one line per journal date in [start, end], reads only those dates' files
+    journal = journal or Journal()
+    total = 0.0
+    for date in journal.dates(start, end):
+        pls = symbol_pl(journal.rows(date))
+        if not pls:
+            continue
+        day_pl = round(sum(pls.values()), 1)
+        total += day_pl
+        print(f"{date} {day_pl:+.1f}% ({len(pls)}): {", ".join(f"{key}: {pl}" for key, pl in pls.items())}")
+    print(f"total (additive): {total:+.1f}%")
+    return total
 
 
 # output format:
@@ -73,5 +89,17 @@ def daily_pl_calc():
 
 
 if __name__ == "__main__":
-    daily_pl_calc()
-
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--date", type=datetime.date.fromisoformat, default=None, help="default today")
+    parser.add_argument("--since", type=datetime.date.fromisoformat, default=None, help="multi-day report from this date to --date")
+    parser.add_argument("--journal", default="trade-log/journal")
+    parser.add_argument("--metrics", default="trade-log/metrics")
+    parser.add_argument("--no-push", action="store_true")
+    args = parser.parse_args()
+
+    journal = Journal(args.journal)
+    if args.since:
+        multi_day_pl(args.since, args.date, journal)
+    else:
+        daily_pl_calc(args.date, journal, push_report=not args.no_push, metrics_dir=args.metrics)
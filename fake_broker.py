@@ -0,0 +1,203 @@
+from aiohttp import web, WSMsgType
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import uuid
+
+
+# local stand-in for the alpaca trading REST api + trade_updates websocket (/stream), enough for OrderGateway/OrderManager...
+    # fill="instant": filled before the REST response returns (limit price, or 0 for market orders)
+    # fill="partial": half fills straight away, the rest fill_delay_ms later
+    # fill="stuck": extended-hours limit orders sit unfilled until replaced (PATCH), to exercise reprice/cancel
+    # every status change is pushed to /stream clients as a trade_updates event, JSON in binary frames like alpaca
+    # optional delay to mimic round trips
+class FakeBroker:
+    def __init__(self, delay_ms=0, fill="instant", fill_delay_ms=200):
+        self.delay_ms = delay_ms
+        self.fill = fill
+        self.fill_delay_ms = fill_delay_ms
+        self.orders = []
+        self.by_id = {}
+        self.positions = {}
+        self.clients = set()
+        self._ids = itertools.count(1)
+
+    def _order(self, symbol, qty, side, order_type, limit_price=None, extended_hours=False, client_order_id=None, replaces=None):
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        order = {
+            "id": str(uuid.uuid4()),
+            "client_order_id": client_order_id or f"fake-{next(self._ids)}",
+            "symbol": symbol,
+            "qty": str(qty),
+            "filled_qty": "0",
+            "filled_avg_price": None,
+            "side": side,
+            "type": order_type,
+            "limit_price": limit_price,
+            "extended_hours": extended_hours,
+            "status": "new",
+            "replaces": replaces,
+            "replaced_by": None,
+            "submitted_at": now,
+            "created_at": now,
+        }
+        self.orders.append(order)
+        self.by_id[order["id"]] = order
+        self._publish("new", order)
+
+        stuck = self.fill == "stuck" and order_type == "limit" and extended_hours and replaces is None
+        if self.fill == "partial":
+            self._execute(order, float(qty) // 2 or float(qty))
+            if float(order["filled_qty"]) < float(qty):
+                asyncio.get_running_loop().call_later(self.fill_delay_ms / 1000, self._execute, order, float(qty))
+        elif not stuck:
+            self._execute(order, float(qty))
+        return order
+
+    def _execute(self, order, filled_qty):
+        # fills order up to filled_qty (cumulative), positions move by the difference
+        if order["status"] in ("filled", "canceled", "replaced"):
+            return
+        price = float(order["limit_price"] or 0)
+        delta = filled_qty - float(order["filled_qty"])
+        order["filled_qty"] = str(filled_qty)
+        order["filled_avg_price"] = str(price)
+        order["status"] = "filled" if filled_qty >= float(order["qty"]) else "partially_filled"
+
+        symbol = order["symbol"]
+        held = self.positions.get(symbol, 0)
+        self.positions[symbol] = held + delta if order["side"] == "buy" else held - delta
+        if self.positions[symbol] <= 0:
+            self.positions.pop(symbol)
+        self._publish("fill" if order["status"] == "filled" else "partial_fill", order, price=price, qty=delta)
+
+    def _publish(self, event, order, **extra):
+        if not self.clients:
+            return
+        message = {"stream": "trade_updates", "data": {"event": event, "order": dict(order), "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(), **extra}}
+        payload = json.dumps(message).encode()
+        for ws in list(self.clients):
+            asyncio.ensure_future(ws.send_bytes(payload))
+
+    async def _delay(self):
+        if self.delay_ms:
+            await asyncio.sleep(self.delay_ms / 1000)
+
+    async def get_account(self, request):
+        await self._delay()
+        return web.json_response({"id": "fake-account", "status": "ACTIVE", "pattern_day_trader": False})
+
+    async def post_order(self, request):
+        await self._delay()
+        data = await request.json()
+        if not data.get("symbol") or not data.get("qty"):
+            return web.json_response({"code": 42210000, "message": "symbol and qty required"}, status=422)
+        order = self._order(
+            data["symbol"], data["qty"], data["side"], data["type"],
+            limit_price=data.get("limit_price"), extended_hours=data.get("extended_hours", False),
+            client_order_id=data.get("client_order_id"),
+        )
+        return web.json_response(order)
+
+    async def get_order(self, request):
+        await self._delay()
+        order = self.by_id.get(request.match_info["order_id"])
+        if order is None:
+            return web.json_response({"code": 40410000, "message": "order not found"}, status=404)
+        return web.json_response(order)
+
+    async def patch_order(self, request):
+        # replace = cancel the remainder + new order for it at the new price, like alpaca
+        await self._delay()
+        order = self.by_id.get(request.match_info["order_id"])
+        if order is None or order["status"] not in ("new", "partially_filled"):
+            return web.json_response({"code": 42210000, "message": "order is not open"}, status=422)
+        changes = await request.json()
+        remaining = float(order["qty"]) - float(order["filled_qty"])
+        replacement = self._order(
+            order["symbol"], remaining, order["side"], order["type"],
+            limit_price=changes.get("limit_price", order["limit_price"]), extended_hours=order["extended_hours"],
+            replaces=order["id"],
+        )
+        order["status"] = "replaced"
+        order["replaced_by"] = replacement["id"]
+        self._publish("replaced", order)
+        return web.json_response(replacement)
+
+    async def delete_order(self, request):
+        await self._delay()
+        order = self.by_id.get(request.match_info["order_id"])
+        if order is None or order["status"] not in ("new", "partially_filled"):
+            return web.json_response({"code": 42210000, "message": "order is not open"}, status=422)
+        order["status"] = "canceled"
+        self._publish("canceled", order)
+        return web.Response(status=204)
+
+    async def stream(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        try:
+            async for frame in ws:
+                if frame.type not in (WSMsgType.TEXT, WSMsgType.BINARY):
+                    continue
+                data = json.loads(frame.data)
+                if data.get("action") == "auth":
+                    await ws.send_bytes(json.dumps({"stream": "authorization", "data": {"status": "authorized", "action": "authenticate"}}).encode())
+                elif data.get("action") == "listen":
+                    self.clients.add(ws)
+                    await ws.send_bytes(json.dumps({"stream": "listening", "data": {"streams": ["trade_updates"]}}).encode())
+        finally:
+            self.clients.discard(ws)
+        return ws
+
+    async def delete_position(self, request):
+        await self._delay()
+        symbol = request.match_info["symbol"]
+        if symbol not in self.positions:
+            return web.json_response({"code": 40410000, "message": "position does not exist"}, status=404)
+        qty = request.query.get("qty", self.positions[symbol])
+        return web.json_response(self._order(symbol, qty, "sell", "market"))
+
+    async def delete_positions(self, request):
+        await self._delay()
+        results = []
+        for symbol, qty in list(self.positions.items()):
+            results.append({"symbol": symbol, "status": 200, "body": self._order(symbol, qty, "sell", "market")})
+        return web.json_response(results)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/v2/account", self.get_account)
+        app.router.add_post("/v2/orders", self.post_order)
+        app.router.add_get("/v2/orders/{order_id}", self.get_order)
+        app.router.add_patch("/v2/orders/{order_id}", self.patch_order)
+        app.router.add_delete("/v2/orders/{order_id}", self.delete_order)
+        app.router.add_get("/stream", self.stream)
+        app.router.add_delete("/v2/positions/{symbol}", self.delete_position)
+        app.router.add_delete("/v2/positions", self.delete_positions)
+        return app
+
+
+async def start_fake_broker(host="127.0.0.1", port=8081, delay_ms=0, fill="instant", fill_delay_ms=200):
+    broker = FakeBroker(delay_ms=delay_ms, fill=fill, fill_delay_ms=fill_delay_ms)
+    runner = web.AppRunner(broker.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"[FAKE BROKER] Listening on http://{host}:{port} ({delay_ms}ms delay, {fill} fills)")
+    return broker, runner
+
+
+# point the bot at it with TRADING_URL_OVERRIDE=http://127.0.0.1:8081 in .env
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay-ms", type=int, default=50)
+    parser.add_argument("--fill", choices=["instant", "partial", "stuck"], default="instant")
+    parser.add_argument("--fill-delay-ms", type=int, default=200, help="partial fills: delay before the rest fills")
+    args = parser.parse_args()
+
+    broker = FakeBroker(delay_ms=args.delay_ms, fill=args.fill, fill_delay_ms=args.fill_delay_ms)
+    web.run_app(broker.app(), host="127.0.0.1", port=args.port)
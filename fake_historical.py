@@ -0,0 +1,76 @@
+import datetime
+import math
+import time
+import zlib
+
+import pytz
+
+
+eastern = pytz.timezone("US/Eastern")
+
+
+class FakeBar:
+    __slots__ = ("symbol", "timestamp", "open", "high", "low", "close", "volume", "trade_count", "vwap")
+
+    def __init__(self, symbol, timestamp, open, high, low, close, volume):
+        self.symbol = symbol
+        self.timestamp = timestamp
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.trade_count = 0
+        self.vwap = (high + low + close) / 3
+
+class FakeBarSet:
+    def __init__(self, data):
+        self.data = data # symbol -> [FakeBar], like alpaca's BarSet.data
+
+
+# local stand-in for alpaca's StockHistoricalDataClient.get_stock_bars, enough for bar_seeder.BarSeeder...
+    # deterministic bars: the same symbol + bar start always gives the same OHLCV, whatever range was asked for
+        # (so cached and refetched bars agree, like the real thing)
+    # weekday extended hours only (04:00-20:00 ET), minute timeframes, no network
+    # latency=s sleeps per call to mimic a REST round trip, calls records (symbols, start, end) of every request
+class FakeHistoricalClient:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+
+    def get_stock_bars(self, request):
+        symbols = request.symbol_or_symbols
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        start, end = self._utc(request.start), self._utc(request.end)
+        self.calls.append((tuple(symbols), start, end))
+        if self.latency:
+            time.sleep(self.latency)
+
+        step = datetime.timedelta(minutes=request.timeframe.amount)
+        return FakeBarSet({symbol: self._bars(symbol, start, end, step) for symbol in symbols})
+
+    @staticmethod
+    def _utc(ts):
+        # StockBarsRequest strips tz-aware inputs down to naive UTC
+        if ts.tzinfo is None:
+            return pytz.utc.localize(ts)
+        return ts.astimezone(pytz.utc)
+
+    def _bars(self, symbol, start, end, step):
+        base = 5 + zlib.crc32(symbol.encode()) % 5000 / 100
+        seconds = int(step.total_seconds())
+        first = math.ceil(start.timestamp() / seconds) * seconds
+
+        bars = []
+        for epoch in range(first, int(end.timestamp()) + 1, seconds):
+            when = datetime.datetime.fromtimestamp(epoch, pytz.utc)
+            local = when.astimezone(eastern)
+            if local.weekday() >= 5 or not 4 <= local.hour < 20:
+                continue
+            phase = epoch / 3600
+            open = base * (1 + 0.02 * math.sin(phase))
+            close = base * (1 + 0.02 * math.sin(phase + seconds / 3600))
+            wiggle = base * 0.002 * (1 + math.sin(epoch / 7 + len(symbol)))
+            bars.append(FakeBar(symbol, when, open, max(open, close) + wiggle, min(open, close) - wiggle, close, 1000 + epoch // seconds % 97 * 100))
+        return bars
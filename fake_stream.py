@@ -0,0 +1,196 @@
+from aiohttp import web, WSMsgType
+
+import argparse
+import asyncio
+import bisect
+import datetime
+import glob
+import json
+import time
+
+import msgpack
+
+from market_state import timestamp_ns
+from replay import TRADE, BAR, QUOTE, load_events
+
+
+# local stand-in for the alpaca market data websocket (wss://stream.data.alpaca.markets/v2/sip), enough for market_stream.MarketDataStream and alpaca's StockDataStream...
+    # same handshake as alpaca: "connected" on open, "authenticated" after the auth action, "subscription" echo after (un)subscribe
+    # msgpack for clients connecting with Content-Type: application/msgpack (both clients), JSON otherwise, like alpaca
+    # plays back replay.py events (captures or price-stream-logs) once the first subscription arrives:
+        # rate=N sends N msg/s, speed=k replays at k x the recorded timing, neither = as fast as the socket takes them
+    # trade "i" (trade id) is the event index, sent_ns[i] is perf_counter_ns() when its frame went out (for latency benchmarks)
+CHANNELS = {TRADE: "trades", QUOTE: "quotes", BAR: "bars"}
+
+
+def _rfc3339(ts):
+    return ts.astimezone(datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+
+def encode_event(index, kind, msg, as_json=False):
+    ts = _rfc3339(msg.timestamp) if as_json else msgpack.Timestamp.from_unix_nano(timestamp_ns(msg.timestamp))
+    if kind == TRADE:
+        return {"T": "t", "S": msg.symbol, "i": index, "x": "V", "p": msg.price, "s": msg.size, "c": list(msg.conditions) or [" "], "z": "C", "t": ts}
+    if kind == QUOTE:
+        return {
+            "T": "q", "S": msg.symbol,
+            "bx": "V", "bp": msg.bid_price, "bs": msg.bid_size,
+            "ax": "V", "ap": msg.ask_price, "as": msg.ask_size,
+            "c": ["R"], "z": "C", "t": ts,
+        }
+    return {"T": "b", "S": msg.symbol, "o": msg.open, "h": msg.high, "l": msg.low, "c": msg.close, "v": msg.volume, "vw": msg.vwap, "n": 0, "t": ts}
+
+
+class FakeStream:
+    def __init__(self, events, rate=None, speed=None, batch_size=100):
+        self.events = events
+        self.batch_size = batch_size
+        self.sent_ns = [0] * len(events)
+        self.sent = 0
+        self.clients = {} # ws -> [subscriptions by channel, as_json]
+        self.done = asyncio.Event()
+        self._task = None
+
+        # seconds after playback start each event is due
+        if rate:
+            self.offsets = [i / rate for i in range(len(events))]
+        elif speed and events:
+            first = events[0][0]
+            self.offsets = [(when - first).total_seconds() / speed for when, _, _ in events]
+        else:
+            self.offsets = None
+
+    async def _send(self, ws, as_json, payload):
+        if as_json:
+            await ws.send_str(json.dumps(payload))
+        else:
+            await ws.send_bytes(msgpack.packb(payload))
+
+    async def websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        as_json = request.headers.get("Content-Type") != "application/msgpack"
+        await self._send(ws, as_json, [{"T": "success", "msg": "connected"}])
+
+        authenticated = False
+        client = None
+        try:
+            async for frame in ws:
+                if frame.type == WSMsgType.BINARY:
+                    data = msgpack.unpackb(frame.data)
+                elif frame.type == WSMsgType.TEXT:
+                    data = json.loads(frame.data)
+                else:
+                    continue
+
+                action = data.get("action")
+                if action == "auth":
+                    authenticated = True
+                    await self._send(ws, as_json, [{"T": "success", "msg": "authenticated"}])
+                elif not authenticated:
+                    await self._send(ws, as_json, [{"T": "error", "code": 401, "msg": "not authenticated"}])
+                elif action in ("subscribe", "unsubscribe"):
+                    if client is None:
+                        client = self.clients[ws] = [{channel: set() for channel in CHANNELS.values()}, as_json]
+                    for channel, subscribed in client[0].items():
+                        symbols = data.get(channel) or []
+                        if action == "subscribe":
+                            subscribed.update(symbols)
+                        else:
+                            subscribed.difference_update(symbols)
+                    reply = {"T": "subscription"}
+                    reply.update({channel: sorted(subscribed) for channel, subscribed in client[0].items()})
+                    await self._send(ws, as_json, [reply])
+                    if self._task is None:
+                        self._task = asyncio.create_task(self._play())
+        finally:
+            self.clients.pop(ws, None)
+        return ws
+
+    async def _play(self):
+        events, offsets = self.events, self.offsets
+        count = len(events)
+        print(f"[FAKE STREAM] Playing {count} messages")
+        start = time.perf_counter()
+        i = 0
+        while i < count:
+            if offsets is not None:
+                elapsed = time.perf_counter() - start
+                due = bisect.bisect_right(offsets, elapsed, i)
+                if due <= i:
+                    await asyncio.sleep(offsets[i] - elapsed)
+                    continue
+            else:
+                due = count
+            end = min(due, i + self.batch_size)
+            await self._send_batch(i, end)
+            i = end
+            await asyncio.sleep(0) # the bot under test usually shares this loop
+
+        elapsed = time.perf_counter() - start
+        print(f"[FAKE STREAM] {self.sent} messages sent in {elapsed:.2f}s ({self.sent / max(elapsed, 1e-9):,.0f} msg/s)")
+        self.done.set()
+
+    async def _send_batch(self, start, end):
+        events, sent_ns = self.events, self.sent_ns
+        for ws, (subscriptions, as_json) in list(self.clients.items()):
+            batch = []
+            indexes = []
+            for i in range(start, end):
+                _, kind, msg = events[i]
+                subscribed = subscriptions[CHANNELS[kind]]
+                if msg.symbol in subscribed or "*" in subscribed:
+                    batch.append(encode_event(i, kind, msg, as_json))
+                    indexes.append(i)
+            if not batch:
+                continue
+            payload = json.dumps(batch) if as_json else msgpack.packb(batch)
+            stamp = time.perf_counter_ns()
+            for i in indexes:
+                sent_ns[i] = stamp
+            try:
+                if as_json:
+                    await ws.send_str(payload)
+                else:
+                    await ws.send_bytes(payload)
+            except ConnectionResetError:
+                self.clients.pop(ws, None)
+                continue
+            self.sent += len(batch)
+
+    def app(self):
+        app = web.Application()
+        for path in ("/v2/sip", "/v2/iex", "/"):
+            app.router.add_get(path, self.websocket)
+        return app
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        for ws in list(self.clients):
+            await ws.close()
+
+
+async def start_fake_stream(events, host="127.0.0.1", port=8765, rate=None, speed=None, batch_size=100):
+    stream = FakeStream(events, rate=rate, speed=speed, batch_size=batch_size)
+    runner = web.AppRunner(stream.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"[FAKE STREAM] Listening on ws://{host}:{port}/v2/sip ({len(events)} messages)")
+    return stream, runner
+
+
+# point the bot at it with STREAM_URL_OVERRIDE=ws://127.0.0.1:8765/v2/sip in .env
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*", default=sorted(glob.glob("price-stream-logs/price_stream_log_*.txt")))
+    parser.add_argument("--date", default=None, help="YYYY-MM-DD, default first date in the data")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate", type=float, default=None, help="messages per second")
+    parser.add_argument("--speed", type=float, default=None, help="real-time multiplier of the recorded timing")
+    parser.add_argument("--batch", type=int, default=100, help="max messages per frame")
+    args = parser.parse_args()
+
+    date = datetime.date.fromisoformat(args.date) if args.date else None
+    stream = FakeStream(load_events(args.paths, date), rate=args.rate, speed=args.speed, batch_size=args.batch)
+    web.run_app(stream.app(), host="127.0.0.1", port=args.port)
@@ -0,0 +1,58 @@
+class SymbolLag:
+    __slots__ = ("degraded", "window_min", "window_ticks", "window_start", "last_min")
+
+    def __init__(self, received_ns):
+        self.degraded = False
+        self.window_min = None
+        self.window_ticks = 0
+        self.window_start = received_ns
+        self.last_min = None # us, smallest lag of the last full window
+
+
+# per-symbol feed lag: exchange trade timestamp vs local time when handle_trade got to the trade...
+    # judged on the smallest lag in a window (window_ticks trades or window_ms of local time, whichever ends first)
+        # a late-reported print (out of sequence, stamped minutes ago) can't trip it on its own,
+        # only a backlog where even the freshest trade in the window is old
+    # window min > degrade_ms -> degraded, < recover_ms -> normal again; the gap between the two stops it flapping
+    # on_change(symbol, degraded, lag_ms) on every switch, e.g. print + push
+class FeedMonitor:
+    def __init__(self, degrade_ms=500, recover_ms=100, window_ticks=20, window_ms=250, on_change=None):
+        self.degrade_us = degrade_ms * 1000
+        self.recover_us = recover_ms * 1000
+        self.window_ticks = window_ticks
+        self.window_ns = int(window_ms * 1_000_000)
+        self.on_change = on_change
+        self.symbols = {} # symbol -> SymbolLag
+        self.degraded = set()
+
+    def observe(self, symbol, lag_us, received_ns):
+        # called for every trade, returns whether the symbol is (still) degraded
+        lag = self.symbols.get(symbol)
+        if lag is None:
+            lag = self.symbols[symbol] = SymbolLag(received_ns)
+        if lag.window_min is None or lag_us < lag.window_min:
+            lag.window_min = lag_us
+        lag.window_ticks += 1
+        if lag.window_ticks >= self.window_ticks or received_ns - lag.window_start >= self.window_ns:
+            self._close_window(symbol, lag, received_ns)
+        return lag.degraded
+
+    def _close_window(self, symbol, lag, received_ns):
+        lag_us = lag.last_min = lag.window_min
+        lag.window_min = None
+        lag.window_ticks = 0
+        lag.window_start = received_ns
+        if not lag.degraded and lag_us > self.degrade_us:
+            lag.degraded = True
+            self.degraded.add(symbol)
+        elif lag.degraded and lag_us < self.recover_us:
+            lag.degraded = False
+            self.degraded.discard(symbol)
+        else:
+            return
+        if self.on_change is not None:
+            self.on_change(symbol, lag.degraded, lag_us / 1000)
+
+    def is_degraded(self, symbol):
+        lag = self.symbols.get(symbol)
+        return lag is not None and lag.degraded
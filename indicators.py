@@ -0,0 +1,312 @@
+import math
+from collections import deque
+
+import numpy as np
+
+
+# streaming replacements for the pandas-ta calls in DataHandler...
+    # each indicator keeps O(1) state and updates in O(1) per bar, no DataFrame rebuilds
+    # seed() consumes a historical batch in one vectorized pass and leaves the same state update() would have
+    # conventions follow pandas-ta (no talib): EMA seeded with the SMA of the first `length` values,
+    # RSI/ATR smoothed with RMA (alpha = 1/length), MACD signal = EMA of the MACD line once it is valid
+
+_CHUNK = 256 # keeps (1 - alpha) ** -n well inside float range
+
+
+def ema_series(values, alpha, initial):
+    # y[i] = y[i-1] + alpha * (x[i] - y[i-1]), y[-1] = initial, in closed form per chunk
+    values = np.asarray(values, dtype=float)
+    out = np.empty_like(values)
+    decay = 1.0 - alpha
+    prev = initial
+    for start in range(0, len(values), _CHUNK):
+        chunk = values[start:start + _CHUNK]
+        n = np.arange(1, len(chunk) + 1)
+        powers = decay ** n
+        out[start:start + len(chunk)] = powers * (prev + np.cumsum(alpha * chunk / powers))
+        prev = out[start + len(chunk) - 1]
+    return out
+
+
+class EMA:
+    __slots__ = ("length", "alpha", "value", "_count", "_sum")
+
+    def __init__(self, length, alpha=None):
+        self.length = length
+        self.alpha = alpha if alpha is not None else 2 / (length + 1)
+        self.value = None
+        self._count = 0
+        self._sum = 0.0
+
+    def update(self, x):
+        if self.value is None:
+            self._count += 1
+            self._sum += x
+            if self._count == self.length:
+                self.value = self._sum / self.length
+            return self.value
+        self.value += self.alpha * (x - self.value)
+        return self.value
+
+    def seed(self, values):
+        values = np.asarray(values, dtype=float)
+        if self.value is None:
+            needed = self.length - self._count
+            head, values = values[:needed], values[needed:]
+            self._count += len(head)
+            self._sum += float(head.sum())
+            if self._count < self.length:
+                return None
+            self.value = self._sum / self.length
+        if len(values):
+            self.value = float(ema_series(values, self.alpha, self.value)[-1])
+        return self.value
+
+    def series(self, values):
+        # full output for a batch (used by MACD seeding), state is left as after seed(values)
+        values = np.asarray(values, dtype=float)
+        out = np.full(len(values), np.nan)
+        if self.value is None:
+            needed = self.length - self._count
+            for i, x in enumerate(values[:needed]):
+                out[i] = np.nan if self.update(float(x)) is None else self.value
+            values_left, offset = values[needed:], min(needed, len(values))
+        else:
+            values_left, offset = values, 0
+        if len(values_left) and self.value is not None:
+            out[offset:] = ema_series(values_left, self.alpha, self.value)
+            self.value = float(out[-1])
+        return out
+
+
+class RSI:
+    # Wilder RSI; RMA averages start from the first change, like pandas-ta's rma (ewm adjust=False)
+    __slots__ = ("length", "value", "_prev", "_gain", "_loss", "_count")
+
+    def __init__(self, length=14):
+        self.length = length
+        self.value = None
+        self._prev = None
+        self._gain = None
+        self._loss = None
+        self._count = 0
+
+    def _value(self):
+        if self._count < self.length:
+            return None
+        total = self._gain + self._loss
+        self.value = 100 * self._gain / total if total else 50.0
+        return self.value
+
+    def update(self, close):
+        if self._prev is not None:
+            change = close - self._prev
+            gain, loss = (change, 0.0) if change > 0 else (0.0, -change)
+            if self._gain is None:
+                self._gain, self._loss = gain, loss
+            else:
+                self._gain += (gain - self._gain) / self.length
+                self._loss += (loss - self._loss) / self.length
+            self._count += 1
+        self._prev = close
+        return self._value()
+
+    def seed(self, closes):
+        closes = np.asarray(closes, dtype=float)
+        if self._prev is not None:
+            closes = np.concatenate([[self._prev], closes])
+        if len(closes) < 2:
+            if len(closes):
+                self._prev = float(closes[-1])
+            return self.value
+        changes = np.diff(closes)
+        gains = np.where(changes > 0, changes, 0.0)
+        losses = np.where(changes < 0, -changes, 0.0)
+        alpha = 1 / self.length
+        if self._gain is None:
+            self._gain, self._loss = float(gains[0]), float(losses[0])
+            gains, losses = gains[1:], losses[1:]
+        if len(gains):
+            self._gain = float(ema_series(gains, alpha, self._gain)[-1])
+            self._loss = float(ema_series(losses, alpha, self._loss)[-1])
+        self._count += len(changes)
+        self._prev = float(closes[-1])
+        return self._value()
+
+
+class MACD:
+    __slots__ = ("fast", "slow", "signal", "macd", "signal_value", "histogram", "_fast_ema", "_slow_ema", "_signal_ema")
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast, self.slow, self.signal = fast, slow, signal
+        self.macd = self.signal_value = self.histogram = None
+        self._fast_ema = EMA(fast)
+        self._slow_ema = EMA(slow)
+        self._signal_ema = EMA(signal)
+
+    def update(self, close):
+        fast = self._fast_ema.update(close)
+        slow = self._slow_ema.update(close)
+        if fast is None or slow is None:
+            return None
+        self.macd = fast - slow
+        self.signal_value = self._signal_ema.update(self.macd)
+        if self.signal_value is not None:
+            self.histogram = self.macd - self.signal_value
+        return self.macd
+
+    def seed(self, closes):
+        fast = self._fast_ema.series(closes)
+        slow = self._slow_ema.series(closes)
+        line = fast - slow
+        line = line[~np.isnan(line)]
+        if not len(line):
+            return None
+        self.macd = float(line[-1])
+        self.signal_value = self._signal_ema.seed(line)
+        if self.signal_value is not None:
+            self.histogram = self.macd - self.signal_value
+        return self.macd
+
+    def as_dict(self):
+        # same keys as the ta.macd DataFrame columns main/not-in-use code reads
+        suffix = f"_{self.fast}_{self.slow}_{self.signal}"
+        return {f"MACD{suffix}": self.macd, f"MACDh{suffix}": self.histogram, f"MACDs{suffix}": self.signal_value}
+
+
+class ATR:
+    # true range (first bar = high - low), SMA of the first `length` ranges, then RMA
+    __slots__ = ("length", "value", "_prev_close", "_ema")
+
+    def __init__(self, length=14):
+        self.length = length
+        self.value = None
+        self._prev_close = None
+        self._ema = EMA(length, alpha=1 / length)
+
+    def update(self, high, low, close):
+        if self._prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+        self._prev_close = close
+        self.value = self._ema.update(true_range)
+        return self.value
+
+    def seed(self, highs, lows, closes):
+        highs, lows, closes = (np.asarray(a, dtype=float) for a in (highs, lows, closes))
+        if not len(closes):
+            return self.value
+        prev = np.concatenate([[self._prev_close if self._prev_close is not None else np.nan], closes[:-1]])
+        ranges = np.nanmax(np.vstack([highs - lows, np.abs(highs - prev), np.abs(lows - prev)]), axis=0)
+        self._prev_close = float(closes[-1])
+        self.value = self._ema.seed(ranges)
+        return self.value
+
+
+class RollingVWAP:
+    # volume-weighted average of the last `length` bars' vwap (or close), running sums over a fixed window
+    __slots__ = ("length", "value", "_window", "_pv", "_volume")
+
+    def __init__(self, length=20):
+        self.length = length
+        self.value = None
+        self._window = deque(maxlen=length)
+        self._pv = 0.0
+        self._volume = 0.0
+
+    def update(self, price, volume):
+        if len(self._window) == self.length:
+            old_price, old_volume = self._window[0]
+            self._pv -= old_price * old_volume
+            self._volume -= old_volume
+        self._window.append((price, volume))
+        self._pv += price * volume
+        self._volume += volume
+        self.value = self._pv / self._volume if self._volume > 0 else price
+        return self.value
+
+    def seed(self, prices, volumes):
+        for price, volume in zip(np.asarray(prices, dtype=float)[-self.length:], np.asarray(volumes, dtype=float)[-self.length:]):
+            self.update(float(price), float(volume))
+        # re-sum once so float drift from a long live session never carries over
+        self._pv = math.fsum(p * v for p, v in self._window)
+        self._volume = math.fsum(v for _, v in self._window)
+        return self.value
+
+
+# per-symbol bundle DataHandler keeps, fed one bar at a time
+class SymbolIndicators:
+    __slots__ = ("rsi", "macd", "ema", "atr", "vwap")
+
+    def __init__(self):
+        self.rsi = RSI(14)
+        self.macd = MACD(12, 26, 9)
+        self.ema = EMA(9)
+        self.atr = ATR(14)
+        self.vwap = RollingVWAP(20)
+
+    def update(self, open, high, low, close, volume, vwap=None):
+        self.rsi.update(close)
+        self.macd.update(close)
+        self.ema.update(close)
+        self.atr.update(high, low, close)
+        self.vwap.update(vwap if vwap is not None else close, volume)
+
+    def seed(self, high, low, close, volume, vwap=None):
+        self.rsi.seed(close)
+        self.macd.seed(close)
+        self.ema.seed(close)
+        self.atr.seed(high, low, close)
+        self.vwap.seed(vwap if vwap is not None else close, volume)
+
+
+def check_against_pandas_ta(n=500, tolerance=1e-6, seed=7):
+    # streaming and seeded results vs pandas-ta on a random walk; pandas-ta is only needed here
+    import importlib.metadata # pandas_ta reads its own version via importlib.metadata without importing it
+    import pandas as pd
+    import pandas_ta as ta
+
+    rng = np.random.default_rng(seed)
+    close = 10 + np.cumsum(rng.normal(0, 0.1, n))
+    high = close + rng.uniform(0, 0.1, n)
+    low = close - rng.uniform(0, 0.1, n)
+    frame = pd.DataFrame({"high": high, "low": low, "close": close})
+
+    expected = {
+        "rsi": float(ta.rsi(frame["close"], length=14).iloc[-1]),
+        "macd": ta.macd(frame["close"], fast=12, slow=26, signal=9).iloc[-1].to_dict(),
+        "ema": float(ta.ema(frame["close"], length=9).iloc[-1]),
+        "atr": float(ta.atr(frame["high"], frame["low"], frame["close"], length=14).iloc[-1]),
+    }
+
+    streamed, seeded, split = SymbolIndicators(), SymbolIndicators(), SymbolIndicators()
+    for h, l, c in zip(high, low, close):
+        streamed.update(c, h, l, c, 1.0)
+    seeded.seed(high, low, close, np.ones(n))
+    split.seed(high[:n // 2], low[:n // 2], close[:n // 2], np.ones(n // 2))
+    for h, l, c in zip(high[n // 2:], low[n // 2:], close[n // 2:]):
+        split.update(c, h, l, c, 1.0)
+
+    failures = []
+    for name, ind in (("streamed", streamed), ("seeded", seeded), ("seeded+streamed", split)):
+        got = {
+            "rsi": ind.rsi.value,
+            "ema": ind.ema.value,
+            "atr": ind.atr.value,
+        }
+        for key, value in got.items():
+            if not math.isclose(value, expected[key], rel_tol=tolerance, abs_tol=tolerance):
+                failures.append(f"{name} {key}: {value} != {expected[key]}")
+        for key, value in ind.macd.as_dict().items():
+            if not math.isclose(value, expected["macd"][key], rel_tol=tolerance, abs_tol=tolerance):
+                failures.append(f"{name} {key}: {value} != {expected['macd'][key]}")
+
+    for failure in failures:
+        print(f"[INDICATORS] MISMATCH {failure}")
+    print(f"[INDICATORS] pandas-ta check {'passed' if not failures else 'FAILED'} ({n} bars, tol {tolerance})")
+    return not failures
+
+
+if __name__ == "__main__":
+    check_against_pandas_ta()
@@ -0,0 +1,270 @@
+import asyncio
+import datetime
+import glob
+import json
+import os
+import struct
+
+import clock
+from clock import eastern
+from market_state import timestamp_ns
+
+
+# record kinds, stored as one byte
+ENTRY = 0
+SKIP = 1 # PDT limit hit, no order
+STOP_EXIT = 2
+TAKE_PROFIT_EXIT = 3 # first 50%
+TAKE_PROFIT_2_EXIT = 4 # second 50%
+EOD_EXIT = 5
+CLOSE_ALL_EXIT = 6 # close_all_positions
+UNFILLED = 7 # part of an exit order that didn't fill, qty = remainder
+
+KIND_NAMES = ("ENTRY", "SKIP", "STOP_EXIT", "TAKE_PROFIT_EXIT", "TAKE_PROFIT_2_EXIT", "EOD_EXIT", "CLOSE_ALL_EXIT", "UNFILLED")
+EXITS = (STOP_EXIT, TAKE_PROFIT_EXIT, TAKE_PROFIT_2_EXIT, EOD_EXIT, CLOSE_ALL_EXIT)
+
+# ts ns, symbol, kind, qty, price (NaN when unknown): 33 bytes, same layout as journal_dtype()
+RECORD = struct.Struct("<q8sBdd")
+NS = 1_000_000_000
+
+
+def journal_dtype():
+    import numpy as np # readers only, the live writer never loads numpy
+    return np.dtype([("ts", "<i8"), ("symbol", "S8"), ("kind", "u1"), ("qty", "<f8"), ("price", "<f8")])
+
+def _date_of(ts_ns):
+    return datetime.datetime.fromtimestamp(ts_ns // NS, eastern).date().isoformat()
+
+
+# append-only trade journal, replaces the free-text trade_log.txt...
+    # one file of fixed-size RECORD rows per ET date: trade-log/journal/2025-07-01.bin
+    # and a small index next to it, 2025-07-01.json: {"rows": n, "symbols": {symbol: [row, ...]}}, so a report reads one
+        # date's file and a symbol's history reads only its own rows, never the whole journal
+    # record() is sync and never blocks: rows are buffered and written in batches off the loop (like LogSink)
+    # after each batch only the dates it touched get their index rewritten (atomically); a crash between the two is repaired on open
+        # (a date whose file holds more rows than the index says is re-indexed from the file, a torn last row is cut off)
+class Journal:
+    def __init__(self, directory="trade-log/journal", flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.written = 0
+        self.index = self._load_index()
+
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    # ===== WRITING ===== #
+    def record(self, kind, symbol, qty, price, at=None):
+        at = at or clock.now()
+        self.pending.append((timestamp_ns(at), symbol, kind, float(qty), float("nan") if price is None else float(price)))
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, []
+            await asyncio.to_thread(self.write, batch)
+
+    def write(self, batch):
+        # (ts_ns, symbol, kind, qty, price) rows, appended in order; sync, for the importer and the writer thread
+        by_date = {}
+        for row in batch:
+            by_date.setdefault(_date_of(row[0]), []).append(row)
+
+        os.makedirs(self.directory, exist_ok=True)
+        for date, rows in by_date.items():
+            entry = self.index.setdefault(date, {"rows": 0, "symbols": {}})
+            with open(self._path(f"{date}.bin"), "ab") as file:
+                file.write(b"".join(RECORD.pack(ts, symbol.encode(), kind, qty, price) for ts, symbol, kind, qty, price in rows))
+            for ts, symbol, kind, qty, price in rows:
+                entry["symbols"].setdefault(symbol, []).append(entry["rows"])
+                entry["rows"] += 1
+            self._save_index(date)
+        self.written += len(batch)
+
+    async def close(self):
+        if self._task is not None:
+            async with self._flush_lock:
+                self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    # ===== INDEX ===== #
+    def _load_index(self):
+        index = {}
+        self.index = index
+        for path in glob.glob(self._path("*.bin")):
+            date = os.path.basename(path)[:-4]
+            size = os.path.getsize(path)
+            rows = size // RECORD.size
+            if size % RECORD.size:
+                os.truncate(path, rows * RECORD.size) # torn last record from a crash mid-append, later rows would be misaligned
+            try:
+                with open(self._path(f"{date}.json")) as file:
+                    index[date] = json.load(file)
+            except (OSError, ValueError):
+                index[date] = None
+            if (index[date] or {}).get("rows") != rows:
+                index[date] = self._index_file(path, rows)
+                self._save_index(date)
+
+        legacy = self._path("index.json") # the old single index of every date, superseded by the per-date files just checked
+        if os.path.exists(legacy):
+            os.remove(legacy)
+        return index
+
+    def _index_file(self, path, rows):
+        symbols = {}
+        with open(path, "rb") as file:
+            data = file.read(rows * RECORD.size)
+        for i, (_, symbol, _, _, _) in enumerate(RECORD.iter_unpack(data)):
+            symbols.setdefault(symbol.rstrip(b"\0").decode(), []).append(i)
+        return {"rows": rows, "symbols": symbols}
+
+    def _save_index(self, date):
+        path = self._path(f"{date}.json")
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path + ".tmp", "w") as file:
+            json.dump(self.index[date], file)
+        os.replace(path + ".tmp", path)
+
+    # ===== READING ===== #
+    def dates(self, start=None, end=None):
+        # journal dates (datetime.date) within [start, end], oldest first
+        dates = sorted(datetime.date.fromisoformat(d) for d in self.index)
+        return [d for d in dates if (start is None or d >= start) and (end is None or d <= end)]
+
+    def rows(self, date, symbol=None):
+        # journal_dtype() array of one date (optionally one symbol), memory-mapped rows copied out
+        import numpy as np
+        dtype = journal_dtype()
+        entry = self.index.get(date.isoformat())
+        if entry is None or not entry["rows"]:
+            return np.empty(0, dtype)
+        data = np.memmap(self._path(f"{date.isoformat()}.bin"), dtype=dtype, mode="r", shape=(entry["rows"],))
+        if symbol is None:
+            return np.array(data)
+        return data[entry["symbols"].get(symbol, [])]
+
+    def symbol_history(self, symbol, start=None, end=None):
+        # every row for one symbol across dates, reading only the dates it appears on
+        import numpy as np
+        parts = [self.rows(d, symbol) for d in self.dates(start, end) if symbol in self.index[d.isoformat()]["symbols"]]
+        return np.concatenate(parts) if parts else np.empty(0, journal_dtype())
+
+
+def format_row(row):
+    when = datetime.datetime.fromtimestamp(int(row["ts"]) / NS, eastern)
+    return f"{when}, {row['symbol'].decode()}, {KIND_NAMES[row['kind']]}, {row['qty']:g}, {row['price']:g}"
+
+
+# ===== MIGRATION ===== #
+# old trade_log.txt lines, all three shapes:
+    # "{now},{symbol},ENTRY|skip|EXIT,{qty},{price}"       (ENTRY lines only had a time, no date)
+    # "{now}, {symbol}, 50% Exit|2nd 50% Exit|EOD 2nd 50% Exit|EOD 100% Exit, {qty}, {price}"
+    # "{now}, {symbol}, {qty}, EOD Exit; break even"        (close_all_positions, no price)
+    # the 2nd 50% exit logged the full qty; imported exits are capped at what's still open for that symbol/day
+_TEXT_KINDS = {
+    "ENTRY": ENTRY, "skip": SKIP, "EXIT": STOP_EXIT, "50% Exit": TAKE_PROFIT_EXIT, "2nd 50% Exit": TAKE_PROFIT_2_EXIT,
+    "EOD 2nd 50% Exit": EOD_EXIT, "EOD 100% Exit": EOD_EXIT, "UNFILLED": UNFILLED,
+}
+
+def _parse_time(text, default_date):
+    try:
+        when = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        if default_date is None:
+            return None
+        when = datetime.datetime.combine(default_date, datetime.time.fromisoformat(text))
+    return when if when.tzinfo else eastern.localize(when)
+
+def parse_text_log(lines, default_date=None):
+    rows, parsed, skipped = [], [], 0
+    for line in lines:
+        fields = [f.strip() for f in line.strip().split(",")]
+        if len(fields) == 4 and fields[3].startswith("EOD Exit"):
+            fields = [fields[0], fields[1], "CLOSE_ALL", fields[2], "nan"]
+        if len(fields) != 5 or (fields[2] not in _TEXT_KINDS and fields[2] != "CLOSE_ALL"):
+            skipped += 1 # header, blank lines, anything unrecognised
+            continue
+        parsed.append(fields)
+
+    # time-only ENTRY lines take the date of the next dated line (their exits), else default_date
+    next_date = default_date
+    dates = [None] * len(parsed)
+    for i in range(len(parsed) - 1, -1, -1):
+        when = _parse_time(parsed[i][0], None)
+        if when is not None:
+            next_date = when.date()
+        dates[i] = next_date
+
+    open_qty = {}
+    for fields, date in zip(parsed, dates):
+        when = _parse_time(fields[0], date)
+        if when is None:
+            skipped += 1
+            continue
+        symbol, label = fields[1], fields[2]
+        kind = CLOSE_ALL_EXIT if label == "CLOSE_ALL" else _TEXT_KINDS[label]
+        try:
+            qty, price = float(fields[3]), float(fields[4])
+        except ValueError:
+            skipped += 1
+            continue
+        key = (when.date(), symbol)
+        if kind == ENTRY:
+            open_qty[key] = open_qty.get(key, 0) + qty
+        elif kind in EXITS and key in open_qty:
+            qty = min(qty, open_qty[key])
+            open_qty[key] -= qty
+        rows.append((timestamp_ns(when), symbol, kind, qty, price))
+    return rows, skipped
+
+def import_text_log(path, journal, default_date=None):
+    with open(path) as file:
+        rows, skipped = parse_text_log(file.readlines(), default_date)
+    rows.sort(key=lambda row: row[0])
+    journal.write(rows)
+    print(f"[JOURNAL] Imported {len(rows)} rows from {path} ({skipped} lines skipped)")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["import", "show"])
+    parser.add_argument("paths", nargs="*", help="import: old trade_log.txt files")
+    parser.add_argument("--journal", default="trade-log/journal")
+    parser.add_argument("--date", type=datetime.date.fromisoformat, default=None, help="import: date for time-only lines; show: date to print")
+    parser.add_argument("--symbol", default=None)
+    args = parser.parse_args()
+
+    journal = Journal(args.journal)
+    if args.command == "import":
+        for path in args.paths:
+            import_text_log(path, journal, args.date)
+    elif args.symbol and args.date is None:
+        for row in journal.symbol_history(args.symbol):
+            print(format_row(row))
+    else:
+        for date in [args.date] if args.date else journal.dates():
+            for row in journal.rows(date, args.symbol):
+                print(format_row(row))
@@ -0,0 +1,102 @@
+import asyncio
+import os
+from collections import defaultdict, deque
+
+from metrics import registry as metrics
+
+
+# buffered writer for the per-symbol price stream logs...
+    # handle_trade used to open/append/close the log file (plus an aiofiles thread hop) on every trade
+    # now it appends a raw record to a bounded ring buffer and returns; formatting and writes happen in batches off the loop
+    # one handle is kept open per symbol for the whole session
+class LogSink:
+    def __init__(self, directory="price-stream-logs", prefix="price_stream_log_", capacity=50_000, batch_size=1_000, flush_interval=0.5, shed=True):
+        self.directory = directory
+        self.prefix = prefix
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.high_water = capacity // 2 if shed else capacity + 1 # shed=False: every line kept, only the ring drops (replay)
+        self.flush_interval = flush_interval
+
+        self.buffer = deque(maxlen=capacity)
+        self.dropped = 0
+        self.written = 0
+
+        self._handles = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self._reported_dropped = 0
+
+    def log(self, tag, now, symbol, price, size, conditions):
+        # never blocks; under overload the ring overwrites the oldest record and counts the drop
+        buffer = self.buffer
+        if len(buffer) == self.capacity:
+            self.dropped += 1
+        buffer.append((symbol, tag, now, price, size, conditions))
+        if len(buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    @property
+    def under_pressure(self):
+        # half full: fold_trade sheds its per-tick lines ([ODD LOT], [GAP UP - n/N], [>ENTRY - n/N]) while the writer catches up,
+            # so the ring's drop-oldest only ever hits the records that matter under a sustained overload
+        return len(self.buffer) >= self.high_water
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self.buffer:
+                return
+            batch = self.buffer
+            self.buffer = deque(maxlen=self.capacity)
+            metrics.observe("log_queue_records", "", len(batch)) # depth the writer found, peaks show it falling behind
+            await asyncio.to_thread(self._write_batch, batch)
+            self.written += len(batch)
+
+            if self.dropped != self._reported_dropped:
+                print(f"[LOG SINK] {self.dropped - self._reported_dropped} records dropped (buffer full), {self.dropped} total")
+                self._reported_dropped = self.dropped
+
+    def _write_batch(self, batch):
+        # records from one websocket frame share their `now`, formatted once per run (str(datetime) is most of a line's cost)
+        lines = defaultdict(list)
+        last_now = stamp = None
+        for symbol, tag, now, price, size, conditions in batch:
+            if now is not last_now:
+                last_now, stamp = now, str(now)
+            lines[symbol].append(f"{tag} {stamp},{symbol},PRICE {price},VOL {size}, COND {conditions}\n")
+
+        for symbol, symbol_lines in lines.items():
+            file = self._handles.get(symbol)
+            if file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                file = open(os.path.join(self.directory, f"{self.prefix}{symbol}.txt"), "a", buffering=1 << 16)
+                self._handles[symbol] = file
+            file.writelines(symbol_lines)
+            file.flush()
+
+    async def close(self):
+        if self._task is not None:
+            # cancel between batches: a cancelled to_thread write keeps running and could reopen handles after close
+            async with self._flush_lock:
+                self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        for file in self._handles.values():
+            file.close()
+        self._handles.clear()
+        print(f"[LOG SINK] Closed, {self.written} records written, {self.dropped} dropped")
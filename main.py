@@ -1,79 +1,71 @@
+import sys
+
+# python3 main.py --startup-profile: time every import, report, exit without connecting
+STARTUP_PROFILE = "--startup-profile" in sys.argv
+if STARTUP_PROFILE:
+    import startup_profile
+    startup_profile.install()
+
 import asyncio
-import json
-import time
-import datetime
-import pytz
-import traceback
 import signal
 import aiofiles
-import requests
 
-from pushbullet import Pushbullet
 from dotenv import load_dotenv
 import os
 
+from notifier import Notifier, default_sinks
+
 load_dotenv()
 
-PB_API_KEY = os.getenv("PUSHBULLET_API_KEY")
+# opt-in diagnostic (allocation tracebacks for e.g. "coroutine was never awaited"); slows every allocation while on
+if os.getenv("TRACEMALLOC") == "1":
+    import tracemalloc
+    tracemalloc.start()
 
-class DummyPB:
-    def push_note(self, title, body):
-        print(f"(PB Failed) Unsent notification: {title}, {body}")
+PB_API_KEY = os.getenv("PUSHBULLET_API_KEY")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464")) # prometheus text on http://127.0.0.1:METRICS_PORT/metrics, 0 = off
 
-pb = DummyPB()
-
-pb_reconnect_tries = 0
-while pb_reconnect_tries < 5: # low due to risk of getting stuck in loop past premarket open...
-    try:
-        pb = Pushbullet(PB_API_KEY)
-        break
-    except requests.exceptions.ConnectionError as e:
-        pb_reconnect_tries += 1
-        print(f"PB connection failed({pb_reconnect_tries}/5), retrying in 10s...", e)
-        time.sleep(10)
+notifier = Notifier(default_sinks(PB_API_KEY)) # pushes go out from notifier's own task, never awaited by the strategy
 
 
 from alpaca_utils import start_price_quote_bar_stream, get_current_price, get_day_high, get_bar_data, stop_price_quote_bar_stream, place_order, close_position, close_all_positions, stock_stream
+from alpaca_utils import subscribe_updates, get_update_latency_us, gateway, log_sink, subscribe_price_quote_bar_stream
+from alpaca_utils import run_bar_close_timer
+from alpaca_utils import order_manager, trade_stream, set_feed_alert
     # NOTE: get_day_high, get_latest_macd, get_latest_rsi, close_all_positions - consider removing, deleting utils
 
-eastern = pytz.timezone("US/Eastern")
-now = datetime.datetime.now(eastern)
-exit_open_positions_at = now.replace(hour=17, minute=55, second=0, microsecond=0)
+import clock
+from metrics import registry as metrics
+from journal import Journal, ENTRY, SKIP, STOP_EXIT, TAKE_PROFIT_EXIT, TAKE_PROFIT_2_EXIT, EOD_EXIT, UNFILLED
+from strategy_engine import StrategyEngine, FLAT, PENDING_ENTRY, LONG, HALF_EXITED, CLOSED
+from day_trades import DayTradeBudget
 
 
-day_trade_counter = 0
-day_trade_lock = asyncio.Lock()
+journal = Journal() # trade-log/journal, replaces trade_log.txt
+CRYPTO_LOG_PATH = "trade-log/crypot_trade_log.txt" # eod_exit appends a separator line per symbol; replay points it at its out dir
+metrics_runner = None
 
+def eod_exit_time():
+    # today's EOD exit (clock.EOD_EXIT), each symbol gets one engine timer for it instead of waking to check the time
+    return clock.session().eod_exit
 
-CONFIG_PATH = "configs.json"
-last_config_mtime = None
-with open("configs.json", "r") as f:
-    cached_configs = json.load(f)
 
-def load_configs_on_modification():
-    global last_config_mtime, cached_configs
-    try:
-        mtime = os.path.getmtime(CONFIG_PATH)
-        if mtime != last_config_mtime:
-            last_config_mtime = mtime
-            with open(CONFIG_PATH, "r") as f:
-                cached_configs = json.load(f)
-            print("[MOD] Configs updated")
-    except Exception as e:
-        print(f"[LOOP] Configs mid-modification: {e}")
-    return cached_configs
+EOD_EXIT_ATTEMPTS = 3 # the EOD exit and re-exits of a short fill's remainder
+
+day_trades = DayTradeBudget() # trade-log/day_trades.db, survives restarts, shared with the shard workers and the crypto bot
 
 
-symbols = [setup["symbol"] for setup in cached_configs]
+from config_store import store as config_store, ConfigWatcher
+
+symbols = config_store.symbols()
+config_watcher = ConfigWatcher(config_store)
 
 
 # PRIORITY ORDER:
     # 1. MONITOR & TWEAK: 1) GHOST TICK, 2) PROFIT TAKING, 3) GAP-UP-FAKEOUT PROTECTION PARAMETERS
         # try to reduce 15-20 ticker watchlist to <10-15 (averages 30-40 when market hot...)
 
-    # WRITE EVENT-DRIVEN VERSION
-        # current version sufficient; low priority
-        # event = asyncio.Event(), then price stream handler calls event.set() when data arrives...
+    # EVENT-DRIVEN VERSION: done - handlers publish to alpaca_utils.market_bus, one StrategyEngine dispatcher steps the symbol
 
 # ghost tick and gap up protections seem to work really well; continue monitoring for a while longer...
     # e.g. successfully stopped 1) different types of entry-trigger-stop-trigger patterns, 2) gap up, sell off, 3) gap up, momentary spike, stop-loss
@@ -85,6 +77,7 @@ symbols = [setup["symbol"] for setup in cached_configs]
 # 1. current vwap take profit may take far too early on big wins
     # maybe have series of if statements for different ratio ranges
     # for very high ratios, switch to 5m candle logic and something similar to trail stop
+        # 5m bars: subscribe_bar_close(5, callback) / get_last_closed_bar(symbol, 5), built from the stream, no REST
         # e.g. if next 5m bar peaks higher, keep holding?
             # for x higher highs, hold?
             # once it sets lower high by x% OR closes red, exit?
@@ -95,164 +88,220 @@ symbols = [setup["symbol"] for setup in cached_configs]
     # NOTE: REFER TO CRYPTO PROFIT TAKE LOGIC
         # potential to combine both - e.g. take profit on first spike, then trailing stop based on day high
 # 2. logic to protect against partial/no fill on entry and especially exit
-    # NOTE: REFER TO CRYPTO PARTIAL FILL LOGIC
+    # DONE: order_manager.OrderManager tracks fills from trade_updates, reprices/cancels stale extended-hours limits
+    # DONE: exits size off record.held (what fills actually left), a short exit fill reopens the record so the next step exits the rest
 
 # 5. rewrite README
 
 
-async def monitor_trade(setup):
-    symbol = setup["symbol"]
-    in_position = False
-    take_50 = False
-
-    print(f"[{symbol}] Monitoring... {setup["entry_price"]}, {setup["stop_loss"]}")
-
-    while True:
-        configs = load_configs_on_modification()
-        updated_setup = next((s for s in configs if s["symbol"] == symbol), None)
-
-        if not updated_setup:
-            print(f"[{symbol}] Removed from configs. Stopping thread.")
+# ===== STRATEGY: one StrategyEngine dispatcher steps every symbol ===== #
+# per-symbol phases: FLAT -> PENDING_ENTRY -> LONG -> HALF_EXITED -> CLOSED
+    # stop-loss, 2nd take-profit and the EOD exit go straight to CLOSED
+    # step() runs on every confirmed tick/bar (alpaca_utils.market_bus) and on the symbol's EOD/PDT-skip timers
+    # orders, trade log lines and push notes run as engine actions, the symbol is stepped again once they're done
+async def enter_position(record, qty, price, now, reservation):
+    # the day trade was reserved when the entry was decided: confirmed once the entry went through, given back if it failed
+        # with the order placed: release when order_manager.wait_final(order) ends with nothing filled
+    symbol = record.symbol
+    try:
+        # await place_order(symbol, qty)
+        print(f"{qty} [{symbol}] BUY @ {price} ({get_update_latency_us(symbol):.0f}us after tick)")
+        journal.record(ENTRY, symbol, qty, price, now)
+    except Exception:
+        day_trades.release(reservation)
+        raise
+    day_trades.confirm(reservation)
+    record.held = qty # paper entry, the order's filled_qty once place_order is back
+    notifier.notify("Hybrid bot", f"{qty} [{symbol}] BUY @ {price}")
+
+async def skip_entry(symbol, qty, price, now):
+    print(f"Skipped [{symbol}] @ {price}, PDT limit hit...")
+    # await stop_price_quote_bar_stream(symbol)
+    journal.record(SKIP, symbol, qty, price, now)
+
+async def submit_exit(record, close_qty, kind, price, now, message, note):
+    order = await close_position(record.symbol, close_qty)
+    record.exiting = order
+    print(message)
+    journal.record(kind, record.symbol, close_qty, price, now)
+    notifier.notify("Hybrid bot", note)
+    return order
+
+async def settle_exit(record, order, close_qty):
+    # final once filled, or canceled after order_manager ran out of reprices; returns what it sold
+        # not final (no trade_updates stream, or past wait_final's timeout) counts as filled, there's nothing better to go on
+    symbol = record.symbol
+    filled = order.filled_qty if await order_manager.wait_final(order) else float(close_qty)
+    record.held -= round(filled)
+    record.exiting = None
+    if filled < float(close_qty):
+        print(f"[{symbol}] WARNING exit only filled {filled:g}/{close_qty} ({order.status}), {record.held} still held")
+        journal.record(UNFILLED, symbol, order.remaining, order.avg_price)
+        notifier.notify("Hybrid bot", f"[{symbol}] exit only filled {filled:g}/{close_qty}, {record.held} still held")
+    return filled
+
+async def exit_position(record, close_qty, kind, price, now, message, note, previous):
+    # the action ends once the order is accepted, so the record takes its next phase and stop-loss keeps running
+        # while an extended-hours limit reprices; the fill is tracked beside it (watch_exit)
+    order = await submit_exit(record, close_qty, kind, price, now, message, note)
+    task = asyncio.create_task(watch_exit(record, order, close_qty, previous))
+    engine.tasks.add(task)
+    task.add_done_callback(engine.tasks.discard)
+
+async def watch_exit(record, order, close_qty, previous):
+    filled = await settle_exit(record, order, close_qty)
+    if engine.records.get(record.symbol) is not record:
+        return
+    if filled < float(close_qty):
+        # shares left: a closing exit (or one that sold nothing) goes back to the phase that decided it,
+            # a partial first take-profit stays HALF_EXITED; either way the next step exits at the real record.held
+        if record.phase == CLOSED or not filled:
+            record.phase = previous
+        engine.notify(record.symbol)
+    elif record.held > 0 and clock.now() >= clock.session().eod_exit:
+        # the EOD step only canceled this exit and waits on it, its timer already fired and after-hours ticks may not come
+        engine.notify(record.symbol)
+
+def cancel_exit(record):
+    # the working exit gives way (stop-loss, EOD): once it's final, watch_exit steps the record again with what's left
+    task = asyncio.create_task(order_manager.cancel(record.exiting))
+    engine.tasks.add(task)
+    task.add_done_callback(engine.tasks.discard)
+
+async def eod_exit(record, price, now):
+    # waits for the fills itself (nothing left to protect at EOD), re-exits a short fill's remainder up to EOD_EXIT_ATTEMPTS times
+    symbol = record.symbol
+    for attempt in range(EOD_EXIT_ATTEMPTS):
+        if record.phase not in (LONG, HALF_EXITED) or record.held <= 0:
+            break
+        if attempt:
+            price, now = get_current_price(symbol), clock.now()
+            message = f"[{symbol}] EOD, re-exiting remaining {record.held} @ {price}"
+            note = message
+        elif record.phase == HALF_EXITED:
+            message = f"[{symbol}] EOD, 2nd 50% Exit @ {price}"
+            note = f"[{symbol}] EOD, 2nd Exiting 50% position @ {price}"
+        else:
+            message = f"[{symbol}] EOD, 100% Exit @ {price}"
+            note = f"[{symbol}] EOD, Exiting 100% position @ {price}"
+        qty = record.held
+        order = await submit_exit(record, qty, EOD_EXIT, price, now, message, note)
+        await settle_exit(record, order, qty)
+    if record.phase in (LONG, HALF_EXITED) and record.held > 0:
+        notifier.notify("Hybrid bot", f"[{symbol}] EOD, {record.held} still held after {EOD_EXIT_ATTEMPTS} exits, close it by hand")
+
+    async with aiofiles.open(CRYPTO_LOG_PATH, "a") as file:
+        await file.write("\n")
+
+    await stop_price_quote_bar_stream(symbol)
+
+async def on_strategy_error(record):
+    # check systemd logs for traceback...
+    await stop_price_quote_bar_stream(record.symbol)
+
+
+def step(record):
+    symbol = record.symbol
+    setup = config_store.get(symbol) # kept current by config_watcher
+    if not setup:
+        print(f"[{symbol}] Removed from configs. Stopping.")
+        engine.remove(symbol)
+        return
+
+    entry = setup.entry_price
+    stop = setup.stop_loss
+    qty = setup.qty
+    price = get_current_price(symbol)
+    now = clock.now()
+    session = clock.session(now) # today's boundaries, computed once per date
+
+    # before the price check, so symbols that never traded still get unsubscribed at EOD
+    if now >= session.eod_exit:
+        if record.exiting is not None:
+            cancel_exit(record) # stepped again once it's final
             return
-        
-        #if updated_setup != setup:
-            #in_position = False
-            #setup = updated_setup
-
-        entry = updated_setup["entry_price"]
-        stop = updated_setup["stop_loss"]
-        qty = round(updated_setup["dollar_value"] / updated_setup["entry_price"])
-
-        price = get_current_price(symbol)
-        if price is None:
-            await asyncio.sleep(2)
-            continue
-        # day_high = get_day_high(symbol)
-        # if day_high is None:
-        #     await asyncio.sleep(2)
-        #     continue
-
-        try:
-            now = datetime.datetime.now(eastern)
-            if now >= exit_open_positions_at:
-                if in_position:
-                    if take_50:
-                        close_position(symbol, other_half)
-                        print(f"[{symbol}] EOD, 2nd 50% Exit @ {price}")
-                        async with aiofiles.open("trade-log/trade_log.txt", "a") as file:
-                            await file.write(f"{now}, {symbol}, EOD 2nd 50% Exit, {qty}, {price}" + "\n")
-                        pb.push_note("Hybrid bot", f"[{symbol}] EOD, 2nd Exiting 50% position @ {price}")
-                    else:
-                        close_position(symbol, qty)
-                        print(f"[{symbol}] EOD, 100% Exit @ {price}")
-                        async with aiofiles.open("trade-log/trade_log.txt", "a") as file:
-                            await file.write(f"{now}, {symbol}, EOD 100% Exit, {qty}, {price}" + "\n")
-                        pb.push_note("Hybrid bot", f"[{symbol}] EOD, Exiting 100% position @ {price}")
-
-                async with aiofiles.open("trade-log/crypot_trade_log.txt", "a") as file:
-                    await file.write("\n")
-
-                await stop_price_quote_bar_stream(symbol)
-                return
-
-
-            if not in_position:
-                global day_trade_counter
-                if day_trade_counter < 1 and price > entry:
-                    async with day_trade_lock:
-                        if day_trade_counter < 1:
-                            now = datetime.datetime.now(eastern).time()
-                            if now < datetime.time(17,30): # ~30min before end, tweak
-                                # place_order(symbol, qty)
-                                print(f"{qty} [{symbol}] BUY @ {price}")
-                                in_position = True
-                                day_trade_counter += 1
-                                async with aiofiles.open("trade-log/trade_log.txt", "a") as file:
-                                    await file.write(f"{now},{symbol},ENTRY,{qty},{price}" + "\n")
-                                pb.push_note("Hybrid bot", f"{qty} [{symbol}] BUY @ {price}")
-                elif not day_trade_counter < 1 and price > entry:
-                    print(f"Skipped [{symbol}] @ {price}, PDT limit hit...")
-                    # await stop_price_quote_bar_stream(symbol)
-                    async with aiofiles.open("trade-log/trade_log.txt", "a") as file:
-                        await file.write(f"{now},{symbol},skip,{qty},{price}" + "\n")
-                    # return
-                    await asyncio.sleep(18000)
-
-                await asyncio.sleep(1)
-
-            if in_position:
-                half_position = round(qty / 2)
-                other_half = qty - half_position
-                vwap, high_1m, timestamp_1m = get_bar_data(symbol)
-
-                if price < stop:
-                    if take_50:
-                        close_position(symbol, other_half)
-                        print(f"[{symbol}] STOP-LOSS hit. Exiting @ {price}")
-                        async with aiofiles.open("trade-log/trade_log.txt", "a") as file:
-                            await file.write(f"{now},{symbol},EXIT,{qty},{price}" + "\n")
-                        pb.push_note("Hybrid bot", f"[{symbol}] STOP-LOSS hit. Exiting @ {price}")
-                        return
-                    else:
-                        close_position(symbol, qty)
-                        print(f"[{symbol}] STOP-LOSS hit. Exiting @ {price}")
-                        async with aiofiles.open("trade-log/trade_log.txt", "a") as file:
-                            await file.write(f"{now},{symbol},EXIT,{qty},{price}" + "\n")
-                        pb.push_note("Hybrid bot", f"[{symbol}] STOP-LOSS hit. Exiting @ {price}")
-                        return
-
-                await asyncio.sleep(1)
-                if any(bd is None for bd in [vwap, high_1m, timestamp_1m]):
-                    continue
-
-                if high_1m != vwap:
-                    pwap_ratio = (high_1m/entry - 1) / (high_1m/vwap - 1)
-                else:
-                    continue
-
-                if pwap_ratio > 1.5: # tweak
-                    if not take_50:
-                        take_50 = True
-                        close_position(symbol, half_position)
-                        print(f"[{symbol}] TAKE-PROFIT hit. Exiting 50% position @ {price}")
-                        async with aiofiles.open("trade-log/trade_log.txt", "a") as file:
-                            await file.write(f"{now}, {symbol}, 50% Exit, {half_position}, {price}" + "\n")
-                        pb.push_note("Hybrid bot", f"[{symbol}] TAKE-PROFIT hit. Exiting 50% position @ {price}")
-                        continue
-                    else:
-                        close_position(symbol, other_half)
-                        print(f"[{symbol}] TAKE-PROFIT hit. 2nd Exiting 50% position @ {price}")
-                        async with aiofiles.open("trade-log/trade_log.txt", "a") as file:
-                            await file.write(f"{now}, {symbol}, 2nd 50% Exit, {qty}, {price}" + "\n")
-                        pb.push_note("Hybrid bot", f"[{symbol}] TAKE-PROFIT hit. 2nd Exiting 50% position @ {price}")
-                        return
-
-                while True:
-                    vwap2, high_1m2, timestamp_1m2 = get_bar_data(symbol)
-                    
-                    if any(bd2 is None for bd2 in [vwap2, high_1m2, timestamp_1m2]):
-                        continue
-
-                    if timestamp_1m2 != timestamp_1m and not high_1m*0.985 < high_1m2 < high_1m*1.015: # 1.5%, tweak
-                        # aside from tweaking the condition...
-                        # consider using a low condition too for this trailing stop
-
-                        # 1. implement 5min bar take profit logic
-                        break
-
-                    await asyncio.sleep(1)
-                    
-                await asyncio.sleep(1)
+        engine.act(record, eod_exit(record, price, now), CLOSED)
+        return
 
+    if price is None:
+        return # stepped again on its first confirmed tick
 
-        except Exception as e:
-            print(f"[{symbol}] Error: {e}", flush=True)
-            # check systemd logs for traceback...
-            traceback.print_exc()
-            await stop_price_quote_bar_stream(symbol)
-        
-
-        await asyncio.sleep(1)
+    if record.phase == FLAT:
+        if price <= entry:
+            return
+        if day_trades.left(now) > 0:
+            if now < session.last_entry: # clock.LAST_ENTRY
+                reservation = day_trades.reserve(symbol, now) # None if another symbol/process took the last one meanwhile
+                if reservation is not None:
+                    engine.act(record, enter_position(record, qty, price, now, reservation), LONG, pending=PENDING_ENTRY)
+        else:
+            engine.act(record, skip_entry(symbol, qty, price, now), FLAT)
+            engine.sleep(record, 18000)
+        return
+
+    # LONG / HALF_EXITED
+    take_50 = record.phase == HALF_EXITED
+    held = record.held
+
+    if record.exiting is not None:
+        # an exit is still working (extended-hours limit repricing): only the stop-loss acts, by canceling it first
+        if price < stop:
+            cancel_exit(record)
+        return
+
+    if price < stop:
+        engine.act(record, exit_position(
+            record, held, STOP_EXIT, price, now,
+            f"[{symbol}] STOP-LOSS hit. Exiting @ {price} ({get_update_latency_us(symbol):.0f}us after tick)",
+            f"[{symbol}] STOP-LOSS hit. Exiting @ {price}",
+            record.phase,
+        ), CLOSED)
+        return
+
+    vwap, high_1m, timestamp_1m = get_bar_data(symbol)
+    if any(bd is None for bd in [vwap, high_1m, timestamp_1m]):
+        return # stepped again on the next tick/bar, nothing to spin on
+
+    # after a failed take-profit check, wait for a new 1m bar that breaks out of the last high's band
+    # stop-loss above keeps running on every tick in the meantime
+    if record.gate_timestamp is not None:
+        gate_high = record.gate_high
+        if timestamp_1m == record.gate_timestamp or gate_high*0.985 < high_1m < gate_high*1.015: # 1.5%, tweak
+            # aside from tweaking the condition...
+            # consider using a low condition too for this trailing stop
+
+            # 1. implement 5min bar take profit logic
+            return
+        record.gate_timestamp = None
+
+    if high_1m == vwap:
+        return
+    pwap_ratio = (high_1m/entry - 1) / (high_1m/vwap - 1)
+
+    if pwap_ratio > 1.5: # tweak
+        if not take_50:
+            engine.act(record, exit_position(
+                record, min(setup.half_qty, held), TAKE_PROFIT_EXIT, price, now,
+                f"[{symbol}] TAKE-PROFIT hit. Exiting 50% position @ {price} ({get_update_latency_us(symbol):.0f}us after tick)",
+                f"[{symbol}] TAKE-PROFIT hit. Exiting 50% position @ {price}",
+                LONG,
+            ), HALF_EXITED)
+        else:
+            engine.act(record, exit_position(
+                record, held, TAKE_PROFIT_2_EXIT, price, now,
+                f"[{symbol}] TAKE-PROFIT hit. 2nd Exiting 50% position @ {price} ({get_update_latency_us(symbol):.0f}us after tick)",
+                f"[{symbol}] TAKE-PROFIT hit. 2nd Exiting 50% position @ {price}",
+                HALF_EXITED,
+            ), CLOSED)
+        return
+
+    record.gate_timestamp = timestamp_1m
+    record.gate_high = high_1m
+
+
+engine = StrategyEngine(step, on_error=on_strategy_error)
+subscribe_updates(engine.notify)
+set_feed_alert(lambda message: notifier.notify("Hybrid bot", message)) # alpaca_utils.FEED_LAG_DEGRADE_MS
 
 
 async def supervisor(coro_func, *args, name="task"):
@@ -263,16 +312,54 @@ async def supervisor(coro_func, *args, name="task"):
             print(f"{name} crashed: {e}")
             # await asyncio.sleep(5)
 
+def start_monitor(setup):
+    # no-op while the symbol is still tracked, restarts it FLAT once CLOSED
+    record = engine.records.get(setup.symbol)
+    if record is not None and record.phase != CLOSED:
+        return
+    print(f"[{setup.symbol}] Monitoring... {setup.entry_price}, {setup.stop_loss}")
+    engine.add(setup.symbol)
+    engine.schedule(setup.symbol, eod_exit_time())
+
+# tickers added/removed in configs.json mid-session get streamed/unstreamed here
+    # removed symbols' records close on their next step once config_store.get() returns None
+async def on_config_change(diff):
+    for symbol in diff.added:
+        if symbol not in symbols:
+            symbols.append(symbol)
+        await subscribe_price_quote_bar_stream(symbol)
+        start_monitor(config_store.get(symbol))
+    for symbol in diff.removed:
+        if symbol in symbols:
+            symbols.remove(symbol)
+        await stop_price_quote_bar_stream(symbol)
+
 async def main():
+    global metrics_runner
     try:
+        log_sink.start()
+        notifier.start()
+        journal.start()
+        metrics.start() # trade-log/metrics/<date>.json every minute, read by eod_report.py
+        metrics.gauge("day_trades_left", lambda: day_trades.last_left)
+        print(f"[DAY TRADES] {day_trades.left()} left today ({day_trades.path})") # persisted, a restart doesn't reset it
+        if METRICS_PORT:
+            try:
+                metrics_runner = await metrics.serve(port=METRICS_PORT)
+            except OSError as e:
+                print(f"[METRICS] Not serving on port {METRICS_PORT}: {e}")
+        config_watcher.add_listener(on_config_change)
+        config_watcher.start()
+        asyncio.create_task(gateway.warm_up())
+        asyncio.create_task(supervisor(run_bar_close_timer, name="bar_close_timer"))
+        asyncio.create_task(supervisor(trade_stream.run_forever, name="trade_stream"))
+        asyncio.create_task(supervisor(order_manager.run, name="order_manager"))
         data_stream_task = asyncio.create_task(supervisor(start_price_quote_bar_stream, symbols, name="data_stream"))
-        monitor_tasks = [
-            asyncio.create_task(
-                supervisor(monitor_trade, setup, name=f"monitor_trade-{setup['symbol']}")
-            ) 
-            for setup in cached_configs
-        ]
-        await asyncio.gather(data_stream_task, *monitor_tasks)
+        engine_task = engine.start()
+        for setup in config_store.configs.values():
+            start_monitor(setup)
+        await data_stream_task
+        await engine_task
     except asyncio.CancelledError:
         print("Error, tasks cancelled")
     finally:
@@ -285,6 +372,16 @@ async def handle_shutdown():
     for symbol in symbols:
         await stop_price_quote_bar_stream(symbol)
     await stock_stream.stop_ws()
+    await trade_stream.stop_ws()
+    await config_watcher.stop()
+    await gateway.close()
+    await log_sink.close() # flush buffered price stream logs before tasks are cancelled
+    await notifier.close() # sends anything still queued
+    await journal.close()
+    await metrics.close() # final dump
+    day_trades.close()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
 
     tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task() and not t.done()]
     for t in tasks:
@@ -309,5 +406,8 @@ def main_start():
 
 
 if __name__ == "__main__":
-    main_start()
+    if STARTUP_PROFILE:
+        startup_profile.report()
+    else:
+        main_start()
 
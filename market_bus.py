@@ -0,0 +1,85 @@
+from collections import defaultdict, namedtuple
+
+
+# immutable copy of one symbol's market_state, what MarketBus.snapshot() hands out
+    # last_price/day_high are the filters' confirmed values (what the strategy trades on), the trade_* fields every trade
+Snapshot = namedtuple("Snapshot", (
+    "symbol", "seq",
+    "last_price", "day_high",
+    "last_trade_price", "last_trade_size", "last_trade_ns",
+    "trade_high", "trade_low", "volume", "trade_vwap", "trade_count", "round_lots",
+    "gap_counter", "tick_counter",
+    "vwap", "high_1m", "bar_timestamp",
+))
+
+
+# conflating market-data bus between the stream handlers and their consumers...
+    # the handlers fold every message into market_state (SymbolState) as it arrives, no per-message fan-out
+    # publish(symbol) marks a confirmed update (filtered tick or 1m bar), traded(symbol) any trade at all
+    # flush() runs once per websocket frame (or per replayed message) and notifies each changed symbol once:
+        # subscribe(callback)              callback(symbol, received_ns), confirmed updates, received_ns of the newest one
+        # subscribe(callback, trades=True) callback(symbol), any trade, only tracked while someone listens
+        # subscribe_flush(callback)        callback() after a flush that had confirmed updates, e.g. to batch them onwards (shards.py)
+    # seq[symbol] counts confirmed updates, so a reader can tell whether a snapshot is newer than the last one it saw
+    # everything runs on the loop between awaits, so a snapshot is never half-updated
+class MarketBus:
+    def __init__(self, market_state):
+        self.market_state = market_state
+        self.seq = defaultdict(int)
+        self.subscribers = []
+        self.trade_subscribers = []
+        self.flush_subscribers = []
+        self._updated = {} # symbol -> received_ns, insertion ordered
+        self._traded = {}
+
+    def subscribe(self, callback, trades=False):
+        (self.trade_subscribers if trades else self.subscribers).append(callback)
+
+    def subscribe_flush(self, callback):
+        self.flush_subscribers.append(callback)
+
+    def unsubscribe(self, callback, trades=False):
+        subscribers = self.trade_subscribers if trades else self.subscribers
+        if callback in subscribers:
+            subscribers.remove(callback)
+
+    def unsubscribe_flush(self, callback):
+        if callback in self.flush_subscribers:
+            self.flush_subscribers.remove(callback)
+
+    def publish(self, symbol, received_ns):
+        self._updated[symbol] = received_ns
+
+    def traded(self, symbol):
+        if self.trade_subscribers:
+            self._traded[symbol] = None
+
+    def flush(self):
+        if self._updated:
+            updated, self._updated = self._updated, {}
+            seq = self.seq
+            for symbol, received_ns in updated.items():
+                seq[symbol] += 1
+                for callback in self.subscribers:
+                    callback(symbol, received_ns)
+            for callback in self.flush_subscribers:
+                callback()
+        if self._traded:
+            traded, self._traded = self._traded, {}
+            for symbol in traded:
+                for callback in self.trade_subscribers:
+                    callback(symbol)
+
+    def snapshot(self, symbol):
+        # None for a symbol with no state yet
+        state = self.market_state.get(symbol)
+        if state is None:
+            return None
+        return Snapshot(
+            symbol, self.seq[symbol],
+            state.last_price, state.day_high,
+            state.last_trade_price, state.last_trade_size, state.last_trade_ns,
+            state.trade_high, state.trade_low, state.volume, state.trade_vwap, state.trade_count, state.round_lots,
+            state.gap_counter, state.tick_counter,
+            state.vwap, state.high_1m, state.bar_timestamp,
+        )
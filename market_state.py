@@ -0,0 +1,197 @@
+from array import array
+from bisect import bisect_left
+
+
+def timestamp_ns(ts):
+    # exact ns for an aware datetime (float ts.timestamp() * 1e9 rounds at microsecond scale)
+    return int(ts.timestamp()) * 1_000_000_000 + ts.microsecond * 1000
+
+
+# fixed-capacity OHLCV+VWAP ring, one preallocated array per column...
+    # replaces deque(maxlen=...) of BarEntry objects: no per-bar object or __dict__, memory fixed at creation
+class BarRing:
+    __slots__ = ("capacity", "count", "head", "ts", "open", "high", "low", "close", "volume", "vwap")
+
+    def __init__(self, capacity=500):
+        self.capacity = capacity
+        self.count = 0
+        self.head = 0 # next write slot
+        self.ts = array("q", bytes(8 * capacity)) # bar start, ns since epoch
+        self.open = array("d", bytes(8 * capacity))
+        self.high = array("d", bytes(8 * capacity))
+        self.low = array("d", bytes(8 * capacity))
+        self.close = array("d", bytes(8 * capacity))
+        self.volume = array("d", bytes(8 * capacity))
+        self.vwap = array("d", bytes(8 * capacity))
+
+    def append(self, ts_ns, open, high, low, close, volume, vwap):
+        i = self.head
+        self.ts[i] = ts_ns
+        self.open[i] = open
+        self.high[i] = high
+        self.low[i] = low
+        self.close[i] = close
+        self.volume[i] = volume
+        self.vwap[i] = vwap
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def _index(self, i):
+        # i = 0 oldest ... count - 1 newest, negative from the end like a list
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("bar ring index out of range")
+        return (self.head - self.count + i) % self.capacity
+
+    def get(self, i):
+        j = self._index(i)
+        return (self.ts[j], self.open[j], self.high[j], self.low[j], self.close[j], self.volume[j], self.vwap[j])
+
+    def column(self, name):
+        # oldest -> newest copy of one column, e.g. closes for indicator seeding
+        data = getattr(self, name)
+        start = (self.head - self.count) % self.capacity
+        if start + self.count <= self.capacity:
+            return data[start:start + self.count]
+        return data[start:] + data[:self.head]
+
+    def clear(self):
+        self.count = 0
+        self.head = 0
+
+
+# last `capacity` quotes per symbol as parallel arrays (ns timestamps, bid, ask)...
+    # replaces deque(maxlen=500) of QuoteEntry + min(..., key=abs(time diff)), a 500-step python scan per trade
+    # quotes arrive in time order, so each physical segment of the ring is sorted and nearest() is a C bisect per segment
+class QuoteRing:
+    __slots__ = ("capacity", "count", "head", "ts", "bid", "ask")
+
+    def __init__(self, capacity=500):
+        self.capacity = capacity
+        self.count = 0
+        self.head = 0
+        self.ts = array("q", bytes(8 * capacity))
+        self.bid = array("d", bytes(8 * capacity))
+        self.ask = array("d", bytes(8 * capacity))
+
+    def append(self, ts_ns, bid, ask):
+        i = self.head
+        self.ts[i] = ts_ns
+        self.bid[i] = bid
+        self.ask[i] = ask
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def nearest(self, ts_ns):
+        # (gap_ns, bid, ask) of the quote closest in time to ts_ns, None if no quotes yet
+        n = self.count
+        if not n:
+            return None
+        capacity, head, ts = self.capacity, self.head, self.ts
+        start = (head - n) % capacity
+
+        # logical insertion point 0..n (0 = oldest); wrapped rings are [start, capacity) then [0, head)
+        if start + n <= capacity:
+            i = bisect_left(ts, ts_ns, start, start + n) - start
+        elif ts_ns < ts[0]:
+            i = bisect_left(ts, ts_ns, start, capacity) - start
+        else:
+            i = bisect_left(ts, ts_ns, 0, head) + capacity - start
+
+        best, best_gap = None, None
+        for j in (i - 1, i):
+            if 0 <= j < n:
+                k = (start + j) % capacity
+                gap = abs(ts[k] - ts_ns)
+                if best_gap is None or gap < best_gap:
+                    best, best_gap = k, gap
+        return best_gap, self.bid[best], self.ask[best]
+
+    def latest(self):
+        # (ts_ns, bid, ask) of the newest quote, None if no quotes yet
+        if not self.count:
+            return None
+        i = self.head - 1
+        return self.ts[i], self.bid[i], self.ask[i]
+
+    def clear(self):
+        self.count = 0
+        self.head = 0
+
+
+# everything the stream handlers know about one symbol, in one slotted record...
+    # replaces the module-level latest_prices / day_high / vwaps / latest_highs / latest_timestamps /
+    # gap_up_first_tick / gap_counter / last_tick / tick_counter dicts (vwaps grew by one float per bar forever)
+    # None = "not tracked yet", same as the old "symbol not in dict" checks
+class SymbolState:
+    __slots__ = (
+        "symbol",
+        "last_price", "day_high",
+        "vwap", "high_1m", "bar_timestamp",
+        "gap_first_tick", "gap_counter", "last_tick", "tick_counter",
+        "trade_count", "round_lots", "volume", "notional", "trade_high", "trade_low",
+        "last_trade_price", "last_trade_size", "last_trade_ns",
+        "rsi", "macd",
+        "bars", "bars_5m", "bars_15m", "quotes",
+    )
+
+    def __init__(self, symbol, bar_capacity=500, quote_capacity=500):
+        self.symbol = symbol
+        self.last_price = None
+        self.day_high = None
+        self.vwap = None
+        self.high_1m = None
+        self.bar_timestamp = None
+        self.gap_first_tick = None
+        self.gap_counter = 0
+        self.last_tick = None
+        self.tick_counter = 0
+        self.trade_count = 0 # every trade past the ghost filter, odd lots included (add_trade)
+        self.round_lots = 0
+        self.volume = 0
+        self.notional = 0.0
+        self.trade_high = None
+        self.trade_low = None
+        self.last_trade_price = None # raw last trade, unlike last_price (the filters' confirmed price)
+        self.last_trade_size = None
+        self.last_trade_ns = None
+        self.rsi = None
+        self.macd = None
+        self.bars = BarRing(bar_capacity)
+        self.bars_5m = BarRing(100) # closed bars from bar_aggregator
+        self.bars_15m = BarRing(100)
+        self.quotes = QuoteRing(quote_capacity)
+
+    def add_trade(self, ts_ns, price, size):
+        # wire-level running stats, a few adds and compares per trade
+        self.trade_count += 1
+        if size >= 100:
+            self.round_lots += 1
+        self.volume += size
+        self.notional += price * size
+        if self.trade_high is None or price > self.trade_high:
+            self.trade_high = price
+        if self.trade_low is None or price < self.trade_low:
+            self.trade_low = price
+        self.last_trade_price = price
+        self.last_trade_size = size
+        self.last_trade_ns = ts_ns
+
+    @property
+    def trade_vwap(self):
+        return self.notional / self.volume if self.volume else None
+
+
+class MarketState(dict):
+    def __missing__(self, symbol):
+        state = self[symbol] = SymbolState(symbol)
+        return state
@@ -0,0 +1,220 @@
+import aiohttp
+import asyncio
+import msgpack
+import time
+
+
+SIP_URL = "wss://stream.data.alpaca.markets/v2/sip"
+IEX_URL = "wss://stream.data.alpaca.markets/v2/iex"
+
+
+# lean replacement for alpaca.data.live.StockDataStream (trades/quotes/bars only)...
+    # importing anything under alpaca.data runs its __init__, which loads pandas/numpy, every pydantic request/model and
+    # alpaca.trading (~0.7s of a ~1s cold start), none of it used by the live path
+    # messages become slotted objects with the same attribute names as alpaca's Trade/Quote/Bar, no pydantic validation per tick
+    # subscribe()/unsubscribe() are coroutines that work while running (StockDataStream's block on .result() from the loop thread)
+    # reconnects and resubscribes on dropped connections; auth/subscription errors raise ValueError like StockDataStream
+    # with trade_batch_handler set, a frame's consecutive trades skip the Trade objects and go to it in one call
+        # (per-symbol trade handlers then only mark what's subscribed), any other message flushes the batch first so order holds
+class Trade:
+    __slots__ = ("symbol", "id", "exchange", "price", "size", "timestamp", "conditions", "tape")
+
+    def __init__(self, msg):
+        self.symbol = msg["S"]
+        self.id = msg.get("i")
+        self.exchange = msg.get("x")
+        self.price = msg["p"]
+        self.size = msg["s"]
+        self.timestamp = msg["t"].to_datetime()
+        self.conditions = msg.get("c")
+        self.tape = msg.get("z")
+
+class Quote:
+    __slots__ = ("symbol", "bid_exchange", "bid_price", "bid_size", "ask_exchange", "ask_price", "ask_size", "timestamp", "conditions", "tape")
+
+    def __init__(self, msg):
+        self.symbol = msg["S"]
+        self.bid_exchange = msg.get("bx")
+        self.bid_price = msg["bp"]
+        self.bid_size = msg["bs"]
+        self.ask_exchange = msg.get("ax")
+        self.ask_price = msg["ap"]
+        self.ask_size = msg["as"]
+        self.timestamp = msg["t"].to_datetime()
+        self.conditions = msg.get("c")
+        self.tape = msg.get("z")
+
+class Bar:
+    __slots__ = ("symbol", "open", "high", "low", "close", "volume", "vwap", "trade_count", "timestamp")
+
+    def __init__(self, msg):
+        self.symbol = msg["S"]
+        self.open = msg["o"]
+        self.high = msg["h"]
+        self.low = msg["l"]
+        self.close = msg["c"]
+        self.volume = msg["v"]
+        self.vwap = msg.get("vw")
+        self.trade_count = msg.get("n")
+        self.timestamp = msg["t"].to_datetime()
+
+CHANNELS = {"t": ("trades", Trade), "q": ("quotes", Quote), "b": ("bars", Bar)}
+
+
+class MarketDataStream:
+    def __init__(self, api_key, secret_key, url=SIP_URL, reconnect_delay=1.0):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.url = url
+        self.reconnect_delay = reconnect_delay
+        self.handlers = {"trades": {}, "quotes": {}, "bars": {}} # channel -> symbol (or "*") -> async handler
+        self.running = False # connected + authenticated
+        self.frame_received_ns = 0 # perf_counter_ns when the frame being dispatched arrived, handlers measure their queueing from it
+        self.conflate = set() # symbols whose trades are conflated per frame (alpaca_utils shares feed_monitor.degraded here)
+        self.conflated = 0 # trades dropped by conflation
+        self.trade_batch_handler = None # async (msgs, frame_received_ns): subscribed trades as raw dicts, one call per run of them in a frame
+
+        self._session = None
+        self._ws = None
+        self._should_run = True
+
+    # registers only; sent with the initial subscribe when run_forever() connects
+    def subscribe_trades(self, handler, *symbols):
+        self._register("trades", handler, symbols)
+
+    def subscribe_quotes(self, handler, *symbols):
+        self._register("quotes", handler, symbols)
+
+    def subscribe_bars(self, handler, *symbols):
+        self._register("bars", handler, symbols)
+
+    def _register(self, channel, handler, symbols):
+        for symbol in symbols:
+            self.handlers[channel][symbol] = handler
+
+    async def subscribe(self, channel, symbol, handler):
+        self.handlers[channel][symbol] = handler
+        if self.running:
+            await self._send({"action": "subscribe", channel: [symbol]})
+
+    async def unsubscribe(self, channel, symbol):
+        if self.handlers[channel].pop(symbol, None) is not None and self.running:
+            await self._send({"action": "unsubscribe", channel: [symbol]})
+
+    async def _send(self, payload):
+        await self._ws.send_bytes(msgpack.packb(payload))
+
+    async def _receive(self):
+        frame = await self._ws.receive()
+        if frame.type != aiohttp.WSMsgType.BINARY:
+            raise ConnectionError(f"websocket closed ({frame.type.name})")
+        return msgpack.unpackb(frame.data)
+
+    async def _connect(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        self._ws = await self._session.ws_connect(
+            self.url,
+            headers={"Content-Type": "application/msgpack"},
+            heartbeat=10,
+            compress=15,
+            max_msg_size=0,
+        )
+        msg = (await self._receive())[0]
+        if msg.get("T") != "success" or msg.get("msg") != "connected":
+            raise ValueError("connected message not received")
+
+        await self._send({"action": "auth", "key": self.api_key, "secret": self.secret_key})
+        msg = (await self._receive())[0]
+        if msg.get("T") == "error":
+            raise ValueError(msg.get("msg", "auth failed"))
+        if msg.get("T") != "success" or msg.get("msg") != "authenticated":
+            raise ValueError("failed to authenticate")
+
+        subscriptions = {channel: list(symbols) for channel, symbols in self.handlers.items() if symbols}
+        if subscriptions:
+            await self._send({"action": "subscribe", **subscriptions})
+        self.running = True
+
+    async def _consume(self):
+        handlers = self.handlers
+        async for frame in self._ws:
+            if frame.type != aiohttp.WSMsgType.BINARY:
+                if frame.type == aiohttp.WSMsgType.ERROR:
+                    raise ConnectionError(f"websocket error: {self._ws.exception()}")
+                continue
+            self.frame_received_ns = time.perf_counter_ns()
+            msgs = msgpack.unpackb(frame.data)
+            if self.conflate:
+                msgs = self._conflate(msgs)
+            batch_handler = self.trade_batch_handler
+            batch = []
+            for msg in msgs:
+                kind = msg.get("T")
+                if batch_handler is not None:
+                    if kind == "t":
+                        if msg["S"] in handlers["trades"] or "*" in handlers["trades"]:
+                            batch.append(msg)
+                        continue
+                    if batch:
+                        await batch_handler(batch, self.frame_received_ns)
+                        batch = []
+                channel = CHANNELS.get(kind)
+                if channel is not None:
+                    symbol_handlers = handlers[channel[0]]
+                    handler = symbol_handlers.get(msg["S"]) or symbol_handlers.get("*")
+                    if handler is not None:
+                        await handler(channel[1](msg))
+                elif kind == "error":
+                    print(f"[WebSocket] Error {msg.get('code')}: {msg.get('msg')}")
+                    if msg.get("code") == 409: # insufficient subscription, reconnecting won't help
+                        raise ValueError(f"insufficient subscription: {msg.get('msg')}")
+                elif kind == "subscription":
+                    print(f"[WebSocket] Subscribed: {', '.join(f'{c} {len(msg.get(c) or [])}' for c in handlers)}")
+            if batch:
+                await batch_handler(batch, self.frame_received_ns)
+        if self._should_run:
+            raise ConnectionError("websocket closed by server")
+
+    def _conflate(self, msgs):
+        # a conflated symbol keeps only its newest round-lot trade in the frame (odd lots never reach the strategy anyway)
+            # the raw dicts are filtered before any Trade is built, so a backlog drains at decode speed
+            # quotes/bars and other symbols pass through untouched, in order
+        conflate = self.conflate
+        newest = {}
+        for i, msg in enumerate(msgs):
+            if msg.get("T") == "t" and msg["S"] in conflate and msg["s"] >= 100:
+                newest[msg["S"]] = i
+        kept = [msg for i, msg in enumerate(msgs) if msg.get("T") != "t" or msg["S"] not in conflate or newest.get(msg["S"]) == i]
+        self.conflated += len(msgs) - len(kept)
+        return kept
+
+    async def run_forever(self):
+        # waits for a first subscription like StockDataStream, returns after stop_ws()
+        self._should_run = True
+        while self._should_run and not any(self.handlers.values()):
+            await asyncio.sleep(0.1)
+        try:
+            while self._should_run:
+                try:
+                    await self._connect()
+                    await self._consume()
+                except (aiohttp.ClientError, ConnectionError, asyncio.TimeoutError) as e:
+                    if not self._should_run:
+                        break
+                    print(f"[WebSocket] Connection lost ({e!r}), reconnecting in {self.reconnect_delay}s...")
+                    await asyncio.sleep(self.reconnect_delay)
+                finally:
+                    self.running = False
+                    if self._ws is not None:
+                        await self._ws.close()
+                        self._ws = None
+        finally:
+            if self._session is not None:
+                await self._session.close()
+                self._session = None
+
+    async def stop_ws(self):
+        self._should_run = False
+        if self._ws is not None:
+            await self._ws.close()
@@ -0,0 +1,292 @@
+import asyncio
+import datetime
+import json
+import os
+import time
+from collections import defaultdict
+
+import clock
+
+
+# HDR-style histogram buckets: exact below 16, then 8 log-linear sub-buckets per power of two
+    # every value lands within 12.5% of its bucket's bounds, at any scale (1us or 10s)
+    # values are ints (us, queue depths), clipped to MAX_VALUE (~12 days in us)
+SUB_BITS = 3
+MAX_VALUE = (1 << 40) - 1
+BUCKETS = ((MAX_VALUE.bit_length() - SUB_BITS - 1) << SUB_BITS) + (1 << (SUB_BITS + 1))
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def bucket_of(value):
+    if value < 16:
+        return value if value > 0 else 0
+    if value > MAX_VALUE:
+        value = MAX_VALUE
+    shift = value.bit_length() - SUB_BITS - 1
+    return (shift << SUB_BITS) + (value >> shift)
+
+def bucket_high(index):
+    # largest value in the bucket, what quantiles report (HDR's "highest equivalent value")
+    if index < 16:
+        return index
+    shift = (index >> SUB_BITS) - 1
+    return (((index & 7) + 9) << shift) - 1
+
+
+# fixed-size count array, record() is a bit_length, a shift and an increment: no allocation, no sorting
+    # histograms of the same stage merge by adding counts, which is how the all-symbols series is built
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        # bucket_of() inlined, this runs several times per trade
+        if value < 16:
+            index = value if value > 0 else 0
+        else:
+            if value > MAX_VALUE:
+                value = MAX_VALUE
+            shift = value.bit_length() - SUB_BITS - 1
+            index = (shift << SUB_BITS) + (value >> shift)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        counts = self.counts
+        for i, n in enumerate(other.counts):
+            if n:
+                counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(bucket_high(i), self.max)
+        return self.max
+
+    def stats(self):
+        return {"count": self.count, "mean": self.total / self.count if self.count else 0, "max": self.max,
+                **{f"p{q * 100:g}": self.quantile(q) for q in QUANTILES}}
+
+
+# per-stage, per-symbol histograms and counters for the hot path...
+    # stages (histograms, us unless the name says otherwise):
+        # feed_lag_us          exchange trade timestamp -> handle_trade (clock.now()), how far behind the feed the bot is
+        # frame_us             websocket frame received -> its trades decoded, folded and published (handle_trade_batch), one per frame
+        # tick_to_step_us      newest tick of the step -> strategy step start (dispatcher backlog)
+        # step_us              strategy step duration
+        # order_ack_us         order REST request -> response
+        # log_queue_records    LogSink buffer depth at each flush
+    # counters: trade_verdicts{verdict} (handle_trade filter outcome), orders{status}
+    # gauges are callables read at scrape time, e.g. the live LogSink depth
+    # served as prometheus text on /metrics (serve()), dumped to json for eod_report.py (dump())
+class Metrics:
+    def __init__(self):
+        self.histograms = {} # (stage, symbol) -> Histogram
+        self.counters = defaultdict(int) # (name, symbol, label) -> n
+        self.gauges = {} # name -> callable
+        self.started = time.time()
+
+        self._task = None
+
+    def observe(self, stage, symbol, value):
+        histogram = self.histograms.get((stage, symbol))
+        if histogram is None:
+            histogram = self.histograms[stage, symbol] = Histogram()
+        histogram.record(value)
+
+    def count(self, name, symbol, label):
+        self.counters[name, symbol, label] += 1
+
+    def gauge(self, name, read):
+        self.gauges[name] = read
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+        self.started = time.time()
+
+    # ===== EXPORT ===== #
+    def stages(self):
+        # stage -> {symbol: Histogram}, plus "all" merged across symbols
+        stages = {}
+        for (stage, symbol), histogram in self.histograms.items():
+            stages.setdefault(stage, {})[symbol] = histogram
+        for by_symbol in stages.values():
+            merged = Histogram()
+            for histogram in by_symbol.values():
+                merged.merge(histogram)
+            by_symbol["all"] = merged
+        return stages
+
+    def render(self):
+        # prometheus text exposition format: stages as summaries (quantiles from the buckets), counters, gauges
+        lines = []
+        for stage, by_symbol in sorted(self.stages().items()):
+            name = f"bot_{stage}"
+            lines.append(f"# TYPE {name} summary")
+            for symbol, histogram in sorted(by_symbol.items()):
+                for q in QUANTILES:
+                    lines.append(f'{name}{{symbol="{symbol}",quantile="{q}"}} {histogram.quantile(q)}')
+                lines.append(f'{name}_sum{{symbol="{symbol}"}} {histogram.total}')
+                lines.append(f'{name}_count{{symbol="{symbol}"}} {histogram.count}')
+            lines.append(f"# TYPE {name}_max gauge")
+            for symbol, histogram in sorted(by_symbol.items()):
+                lines.append(f'{name}_max{{symbol="{symbol}"}} {histogram.max}')
+
+        counters = {}
+        for (name, symbol, label), n in self.counters.items():
+            counters.setdefault(name, []).append((symbol, label, n))
+        for name, rows in sorted(counters.items()):
+            lines.append(f"# TYPE bot_{name}_total counter")
+            for symbol, label, n in sorted(rows):
+                lines.append(f'bot_{name}_total{{symbol="{symbol}",label="{label}"}} {n}')
+
+        for name, read in sorted(self.gauges.items()):
+            lines.append(f"# TYPE bot_{name} gauge")
+            lines.append(f"bot_{name} {read()}")
+        lines.append(f"bot_uptime_seconds {time.time() - self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        # json-able copy of everything, what dump() writes and eod_report.py reads
+        counters = {}
+        for (name, symbol, label), n in self.counters.items():
+            counters.setdefault(name, {}).setdefault(symbol, {})[label] = n
+        return {
+            "started": self.started,
+            "at": time.time(),
+            "stages": {stage: {symbol: h.stats() for symbol, h in by_symbol.items()} for stage, by_symbol in self.stages().items()},
+            "counters": counters,
+            "gauges": {name: read() for name, read in self.gauges.items()},
+        }
+
+    def dump(self, directory="trade-log/metrics"):
+        # one file per ET date, rewritten each time: trade-log/metrics/2025-07-01.json
+        return write_dump(self.snapshot(), clock.now().date(), directory)
+
+    async def dump_async(self, directory="trade-log/metrics"):
+        # snapshot on the loop (the hot path keeps adding histograms/counters, gauges read live dicts), only the write in a thread
+        return await asyncio.to_thread(write_dump, self.snapshot(), clock.now().date(), directory)
+
+    # ===== SERVING ===== #
+    async def serve(self, host="127.0.0.1", port=9464):
+        # local only by default; returns the runner, runner.cleanup() stops it
+        from aiohttp import web # aiohttp.web (server side) isn't otherwise loaded by the bot, deferred like the other optional imports
+        async def handle(request):
+            return web.Response(text=self.render(), content_type="text/plain", charset="utf-8", headers={"X-Prometheus-Version": "0.0.4"})
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        print(f"[METRICS] Serving http://{host}:{port}/metrics")
+        return runner
+
+    def start(self, directory="trade-log/metrics", interval=60):
+        # dumps every interval so the EOD report has today's numbers even if the bot is still running (or crashed)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(directory, interval))
+
+    async def _run(self, directory, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.dump_async(directory)
+            except Exception as e:
+                print(f"[METRICS] Dump failed: {e}") # keeps dumping, one bad minute doesn't end it for the session
+
+    async def close(self, directory="trade-log/metrics"):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        return await self.dump_async(directory)
+
+
+def write_dump(data, date, directory="trade-log/metrics"):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{date.isoformat()}.json")
+    with open(path + ".tmp", "w") as file:
+        json.dump(data, file)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def format_report(data, stages=("feed_lag_us", "frame_us", "tick_to_step_us", "step_us", "order_ack_us", "log_queue_records"), top=5):
+    # text summary of a snapshot()/dump: all-symbols line per stage, then the worst symbols by p99
+    lines = [f"{'stage':<20} {'symbol':<8} {'count':>9} {'p50':>8} {'p99':>8} {'p99.9':>8} {'max':>9}"]
+    for stage in stages:
+        by_symbol = data["stages"].get(stage)
+        if not by_symbol:
+            continue
+        worst = sorted((s for s in by_symbol if s != "all"), key=lambda s: by_symbol[s]["p99"], reverse=True)[:top]
+        for symbol in ["all", *worst] if len(by_symbol) > 2 else ["all"]:
+            s = by_symbol[symbol]
+            lines.append(f"{stage:<20} {symbol:<8} {s['count']:>9,} {s['p50']:>8,} {s['p99']:>8,} {s['p99.9']:>8,} {s['max']:>9,}")
+    verdicts = defaultdict(int)
+    for labels in data["counters"].get("trade_verdicts", {}).values():
+        for label, n in labels.items():
+            verdicts[label] += n
+    if verdicts:
+        lines.append("verdicts: " + ", ".join(f"{label} {n:,}" for label, n in sorted(verdicts.items(), key=lambda kv: -kv[1])))
+    return "\n".join(lines)
+
+def load_dump(date, directory="trade-log/metrics"):
+    try:
+        with open(os.path.join(directory, f"{date.isoformat()}.json")) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+registry = Metrics()
+
+
+def check_buckets():
+    # every value within 12.5% of its bucket's high, buckets contiguous and in order
+    previous = -1
+    for value in list(range(0, 5000)) + [int(1.07 ** k) for k in range(130, 400)]:
+        index = bucket_of(value)
+        high = bucket_high(index)
+        assert index >= previous and value <= high <= max(value, 15) * 1.125 + 1, (value, index, high)
+        previous = index
+    assert bucket_of(MAX_VALUE) == BUCKETS - 1 and bucket_of(MAX_VALUE * 4) == BUCKETS - 1
+
+    histogram = Histogram()
+    for value in range(1, 100_001):
+        histogram.record(value)
+    for q in QUANTILES:
+        assert abs(histogram.quantile(q) - q * 100_000) <= q * 100_000 * 0.125, (q, histogram.quantile(q))
+    print(f"[METRICS] bucket check passed ({BUCKETS} buckets, p99 of 1..100000 = {histogram.quantile(0.99)})")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["check", "show"])
+    parser.add_argument("--date", type=datetime.date.fromisoformat, default=None, help="show: dump date, default today")
+    parser.add_argument("--dir", default="trade-log/metrics")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        check_buckets()
+    else:
+        data = load_dump(args.date or clock.now().date(), args.dir)
+        print(format_report(data) if data else "[METRICS] No dump for that date")
@@ -0,0 +1,151 @@
+import aiohttp
+import asyncio
+import os
+from collections import deque
+
+
+PUSHBULLET_URL = "https://api.pushbullet.com/v2/pushes"
+
+
+class SinkError(Exception):
+    def __init__(self, status, body):
+        super().__init__(f"{status}: {body}")
+        self.status = status
+        self.retryable = status == 429 or status >= 500 # rate limited / pushbullet down, anything else won't fix itself
+
+
+# ===== SINKS ===== #
+# anything with `async send(title, body)` and `async close()`; raise to have Notifier retry it
+class StdoutSink:
+    async def send(self, title, body):
+        print(f"[NOTIFY] {title}: {body}")
+
+    async def close(self):
+        pass
+
+class FileSink:
+    def __init__(self, path="trade-log/notifications.txt"):
+        self.path = path
+
+    def _append(self, line):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as file:
+            file.write(line)
+
+    async def send(self, title, body):
+        await asyncio.to_thread(self._append, f"{title}: {body}\n")
+
+    async def close(self):
+        pass
+
+# pushbullet REST api directly: one aiohttp session for the whole run, no account lookup at startup
+    # (pushbullet.Pushbullet() made a blocking request on construction, hence the old import-time retry loop)
+class PushbulletSink:
+    def __init__(self, api_key, url=PUSHBULLET_URL, timeout=10):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session = None
+
+    async def send(self, title, body):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(headers={"Access-Token": self.api_key}, timeout=self.timeout)
+        async with self._session.post(self.url, json={"type": "note", "title": title, "body": body}) as resp:
+            if resp.status >= 400:
+                raise SinkError(resp.status, await resp.text())
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+def default_sinks(pushbullet_api_key=None):
+    # pushbullet when there's a key, stdout otherwise; NOTIFY_FILE=path also keeps a local copy of every push
+    sinks = [PushbulletSink(pushbullet_api_key) if pushbullet_api_key else StdoutSink()]
+    if os.getenv("NOTIFY_FILE"):
+        sinks.append(FileSink(os.getenv("NOTIFY_FILE")))
+    return sinks
+
+
+# ===== NOTIFIER ===== #
+# push notifications off the trading path...
+    # notify() appends to a bounded queue and returns, the worker task does all network I/O
+    # a burst is coalesced: after the first message the worker waits coalesce_seconds, then sends one push per title
+        # (e.g. 5 EXIT notes in the same second = one "Hybrid bot" push with 5 lines)
+    # failed sends are retried per sink on retry_delays, messages queued meanwhile go out in the next push
+    # under overload the queue drops the oldest message and counts it, like LogSink
+class Notifier:
+    def __init__(self, sinks, capacity=200, coalesce_seconds=1.0, retry_delays=(2, 5, 15, 30)):
+        self.sinks = list(sinks)
+        self.capacity = capacity
+        self.coalesce_seconds = coalesce_seconds
+        self.retry_delays = retry_delays
+
+        self.queue = deque(maxlen=capacity)
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+
+        self._wakeup = asyncio.Event()
+        self._send_lock = asyncio.Lock()
+        self._task = None
+
+    def notify(self, title, body):
+        if len(self.queue) == self.capacity:
+            self.dropped += 1
+        self.queue.append((title, body))
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.coalesce_seconds)
+            self._wakeup.clear()
+            await self.flush()
+
+    def _coalesce(self, batch):
+        bodies = {} # title -> [body], first-seen order
+        for title, body in batch:
+            bodies.setdefault(title, []).append(body)
+        return [(title, "\n".join(lines)) for title, lines in bodies.items()]
+
+    async def flush(self):
+        async with self._send_lock:
+            if not self.queue:
+                return
+            batch, self.queue = self.queue, deque(maxlen=self.capacity)
+            for title, body in self._coalesce(batch):
+                for sink in self.sinks:
+                    await self._send(sink, title, body)
+
+    async def _send(self, sink, title, body):
+        for attempt in range(len(self.retry_delays) + 1):
+            try:
+                await sink.send(title, body)
+                self.sent += 1
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError, SinkError) as e:
+                if (isinstance(e, SinkError) and not e.retryable) or attempt == len(self.retry_delays):
+                    self.failed += 1
+                    print(f"[NOTIFY] {type(sink).__name__} failed ({e}), unsent: {title}, {body}")
+                    return
+                delay = self.retry_delays[attempt]
+                print(f"[NOTIFY] {type(sink).__name__} failed ({e!r}), retry {attempt + 1}/{len(self.retry_delays)} in {delay}s")
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        # sends whatever is still queued (with retries), then closes the sinks
+        if self._task is not None:
+            async with self._send_lock:
+                self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        for sink in self.sinks:
+            await sink.close()
+        if self.dropped:
+            print(f"[NOTIFY] {self.dropped} notifications dropped (queue full)")
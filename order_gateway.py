@@ -0,0 +1,105 @@
+import aiohttp
+import asyncio
+import time
+from collections import deque
+
+from metrics import registry as metrics
+
+
+PAPER_URL = "https://paper-api.alpaca.markets"
+LIVE_URL = "https://api.alpaca.markets"
+
+# order payload values (alpaca.trading.enums OrderSide/OrderType/TimeInForce .value)
+    # plain strings so the live path doesn't import alpaca.trading (TradingClient, pydantic trading models) at startup
+BUY, SELL = "buy", "sell"
+MARKET, LIMIT = "market", "limit"
+DAY = "day"
+
+
+class OrderError(Exception):
+    def __init__(self, status, body):
+        super().__init__(f"{status}: {body}")
+        self.status = status
+        self.body = body
+
+
+# async replacement for TradingClient.submit_order/close_position...
+    # TradingClient uses blocking requests; one call froze every monitor_trade and tick handler for a full round trip
+    # here each order is a coroutine on a shared keep-alive pool, so orders for different symbols overlap
+class OrderGateway:
+    def __init__(self, api_key, secret_key, paper=True, base_url=None, max_in_flight=8, timeout=5.0):
+        self.base_url = base_url or (PAPER_URL if paper else LIVE_URL)
+        self.headers = {
+            "APCA-API-KEY-ID": api_key or "",
+            "APCA-API-SECRET-KEY": secret_key or "",
+        }
+        self.max_in_flight = max_in_flight
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.latencies = deque(maxlen=1000) # (symbol, action, status, ms)
+
+        self._session = None
+        self._slots = None
+
+    def _get_session(self):
+        # created lazily so it binds to the running loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=60, ttl_dns_cache=3600)
+            self._session = aiohttp.ClientSession(
+                base_url=self.base_url,
+                headers=self.headers,
+                connector=connector,
+                timeout=self.timeout,
+            )
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        return self._session
+
+    async def _request(self, method, path, symbol, action, json=None, params=None):
+        session = self._get_session()
+        async with self._slots:
+            start = time.perf_counter_ns()
+            status = None
+            try:
+                async with session.request(method, path, json=json, params=params) as resp:
+                    status = resp.status
+                    body = await resp.json(content_type=None)
+                    if status >= 400:
+                        raise OrderError(status, body)
+                    return body
+            finally:
+                elapsed_ns = time.perf_counter_ns() - start
+                elapsed_ms = elapsed_ns / 1_000_000
+                self.latencies.append((symbol, action, status, elapsed_ms))
+                if symbol is not None:
+                    metrics.observe("order_ack_us", symbol, elapsed_ns // 1000)
+                    metrics.count("orders", symbol, f"{action} {status}")
+                print(f"[ORDER] {symbol} {action} {status} in {elapsed_ms:.1f}ms")
+
+    async def warm_up(self):
+        # opens the pooled connection before the first order needs it
+        try:
+            await self._request("GET", "/v2/account", None, "warm_up")
+        except Exception as e:
+            print(f"[ORDER] Warm up failed: {e}")
+
+    async def submit_order(self, order_data):
+        return await self._request("POST", "/v2/orders", order_data["symbol"], f"{order_data['side']} {order_data['type']}", json=order_data)
+
+    async def replace_order(self, order_id, changes, symbol=None):
+        return await self._request("PATCH", f"/v2/orders/{order_id}", symbol, "replace", json=changes)
+
+    async def cancel_order(self, order_id, symbol=None):
+        return await self._request("DELETE", f"/v2/orders/{order_id}", symbol, "cancel")
+
+    async def get_order(self, order_id, symbol=None):
+        return await self._request("GET", f"/v2/orders/{order_id}", symbol, "get_order")
+
+    async def close_position(self, symbol, qty=None):
+        params = {"qty": str(qty)} if qty is not None else None
+        return await self._request("DELETE", f"/v2/positions/{symbol}", symbol, "close_position", params=params)
+
+    async def close_all_positions(self):
+        return await self._request("DELETE", "/v2/positions", None, "close_all_positions")
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,318 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import uuid
+
+import clock
+
+
+TERMINAL = {"filled", "canceled", "expired", "rejected", "done_for_day", "replaced"}
+
+
+class TrackedOrder:
+    __slots__ = (
+        "id", "client_order_id", "symbol", "side", "qty", "type", "limit_price", "extended_hours",
+        "status", "filled_qty", "avg_price", "prior_filled", "prior_cost", "reprices", "deadline", "done",
+    )
+
+    def __init__(self, order_data):
+        self.id = None # alpaca order id, changes when the order is replaced
+        self.client_order_id = order_data["client_order_id"]
+        self.symbol = order_data["symbol"]
+        self.side = order_data["side"]
+        self.qty = float(order_data["qty"])
+        self.type = order_data["type"]
+        self.limit_price = order_data.get("limit_price")
+        self.extended_hours = order_data.get("extended_hours", False)
+        self.status = "pending_new"
+        self.filled_qty = 0.0 # across replacements
+        self.avg_price = None
+        self.prior_filled = 0.0 # filled on legs that were since replaced
+        self.prior_cost = 0.0
+        self.reprices = 0
+        self.deadline = None
+        self.done = asyncio.Event() # set on filled/canceled/expired/rejected
+
+    @property
+    def remaining(self):
+        return self.qty - self.filled_qty
+
+    async def wait(self, timeout=None):
+        # True once the order is final (check status/filled_qty), False on timeout
+        return await clock.wait(self.done, timeout)
+
+    def __repr__(self):
+        return f"TrackedOrder({self.symbol} {self.side} {self.filled_qty:g}/{self.qty:g} @ {self.avg_price} {self.status})"
+
+
+# in-memory book of this session's working orders, kept current by the trade_updates stream (no REST status polling)...
+    # orders are registered under a client_order_id before they're sent, so an update that beats the REST response still lands
+    # REST responses and stream updates go through the same apply(); filled_qty never goes backwards, a final status sticks
+    # extended-hours limit orders get a deadline: still working after reprice_after seconds -> replaced at reprice(order)'s
+        # new limit (up to max_reprices times), then canceled; one timer task for every order
+    # replaced orders keep their TrackedOrder, filled qty/avg price carry across legs
+class OrderManager:
+    def __init__(self, gateway, stream=None, reprice=None, reprice_after=5.0, max_reprices=2):
+        self.gateway = gateway
+        self.stream = stream # trade_stream.TradeUpdatesStream, None = REST responses only
+        self.reprice = reprice # reprice(order) -> new limit price or None to cancel
+        self.reprice_after = reprice_after
+        self.max_reprices = max_reprices
+        self.orders = {} # alpaca id or client_order_id -> TrackedOrder
+        self.working = {} # symbol -> {client_order_id: TrackedOrder}
+        self._connects = 0
+
+        self._deadlines = [] # (when, seq, order)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        if stream is not None:
+            stream.subscribe_trade_updates(self.on_trade_update)
+            stream.on_connect = self._on_connect
+
+    @property
+    def streaming(self):
+        # trade_updates connected; without it a working order's state is only what the last REST response said
+        return self.stream is not None and self.stream.running
+
+    async def _on_connect(self):
+        self._connects += 1
+        if self._connects > 1:
+            await self.resync()
+
+    async def wait_final(self, order, timeout=30):
+        # True once the order is final, False if it isn't by the timeout or there's no stream to say so
+        if order.done.is_set():
+            return True
+        if not self.streaming:
+            return False
+        return await order.wait(timeout)
+
+    async def submit(self, order_data):
+        order_data = dict(order_data, client_order_id=order_data.get("client_order_id") or uuid.uuid4().hex)
+        order = TrackedOrder(order_data)
+        self.orders[order.client_order_id] = order
+        self.working.setdefault(order.symbol, {})[order.client_order_id] = order
+        try:
+            body = await self.gateway.submit_order(order_data)
+            body.setdefault("client_order_id", order.client_order_id)
+            self.apply(body)
+        except Exception:
+            self._finish(order, "rejected")
+            raise
+        if order.type == "limit" and order.extended_hours and not order.done.is_set():
+            self._set_deadline(order)
+        return order
+
+    async def close_position(self, symbol, qty=None):
+        # DELETE /v2/positions is a market order alpaca creates for us, tracked from its response on
+        body = await self.gateway.close_position(symbol, qty)
+        order = TrackedOrder({
+            "client_order_id": body.get("client_order_id") or uuid.uuid4().hex,
+            "symbol": symbol, "side": body.get("side", "sell"), "qty": body.get("qty") or qty or 0, "type": body.get("type", "market"),
+        })
+        self.orders[order.client_order_id] = order
+        self.working.setdefault(symbol, {})[order.client_order_id] = order
+        self.apply(body)
+        return order
+
+    async def cancel(self, order):
+        # stops its reprices and cancels what's left, the stream reports the final status (and any last fill)
+        order.deadline = None
+        if order.done.is_set() or order.id is None or order.status == "pending_cancel":
+            return
+        order.status = "pending_cancel"
+        try:
+            await self.gateway.cancel_order(order.id, order.symbol)
+        except Exception as e:
+            print(f"[ORDER] {order.symbol} cancel failed: {e}") # usually filled in the meantime
+            return
+        if not self.streaming:
+            self._finish(order, "canceled")
+
+    def working_orders(self, symbol):
+        return list(self.working.get(symbol, {}).values())
+
+    def on_trade_update(self, data):
+        # TradeUpdatesStream handler
+        order = self.apply(data.get("order") or {}, data.get("event"))
+        if order is not None and data.get("event") in ("fill", "partial_fill"):
+            print(f"[ORDER] {order.symbol} {data['event']} {order.filled_qty:g}/{order.qty:g} @ {order.avg_price}")
+
+    def apply(self, body, event=None):
+        order = self.orders.get(body.get("id")) or self.orders.get(body.get("client_order_id"))
+        if order is None and body.get("replaces") in self.orders:
+            # PATCH response / first update of a replacement leg
+            order = self.orders[body["replaces"]]
+            if order.id == body["replaces"]:
+                self._next_leg(order, body["id"])
+        if order is None or order.done.is_set():
+            return order
+        if body.get("id") and order.id is None:
+            order.id = body["id"]
+            self.orders[order.id] = order
+        if body.get("id") and body["id"] != order.id:
+            return order # late update for a leg that's already been replaced
+
+        leg_filled = float(body.get("filled_qty") or 0)
+        if order.prior_filled + leg_filled > order.filled_qty:
+            leg_price = float(body.get("filled_avg_price") or 0)
+            order.filled_qty = order.prior_filled + leg_filled
+            order.avg_price = (order.prior_cost + leg_filled * leg_price) / order.filled_qty
+
+        status = body.get("status") or event
+        if status == "replaced":
+            if body.get("replaced_by"):
+                self._next_leg(order, body["replaced_by"])
+        elif status in TERMINAL:
+            self._finish(order, status)
+        elif status:
+            order.status = status
+        return order
+
+    def _next_leg(self, order, new_id):
+        # same TrackedOrder continues under the replacement's id
+        order.prior_filled = order.filled_qty
+        order.prior_cost = order.filled_qty * (order.avg_price or 0)
+        order.id = new_id
+        order.status = "new"
+        self.orders[new_id] = order
+
+    def _finish(self, order, status):
+        order.status = status
+        order.done.set()
+        symbol_orders = self.working.get(order.symbol)
+        if symbol_orders is not None:
+            symbol_orders.pop(order.client_order_id, None)
+            if not symbol_orders:
+                del self.working[order.symbol]
+
+    def _set_deadline(self, order):
+        order.deadline = clock.now() + datetime.timedelta(seconds=self.reprice_after)
+        heapq.heappush(self._deadlines, (order.deadline, next(self._seq), order))
+        self._wakeup.set()
+
+    async def _expire(self, order):
+        if order.done.is_set() or order.id is None:
+            return
+        limit = self.reprice(order) if self.reprice is not None and order.reprices < self.max_reprices else None
+        try:
+            if limit is not None:
+                order.reprices += 1
+                print(f"[ORDER] {order.symbol} {order.side} {order.remaining:g} unfilled after {self.reprice_after:g}s, repricing {order.limit_price} -> {limit} ({order.reprices}/{self.max_reprices})")
+                order.limit_price = limit
+                self.apply(await self.gateway.replace_order(order.id, {"limit_price": limit}, order.symbol))
+                if not order.done.is_set():
+                    self._set_deadline(order)
+            else:
+                print(f"[ORDER] {order.symbol} {order.side} {order.remaining:g} unfilled, canceling")
+                await self.gateway.cancel_order(order.id, order.symbol)
+                if not self.streaming:
+                    self._finish(order, "canceled")
+        except Exception as e:
+            # usually filled/canceled in the meantime (422), the stream has or will have the final word
+            print(f"[ORDER] {order.symbol} reprice/cancel failed: {e}")
+
+    async def resync(self):
+        # after a trade_updates reconnect: one GET per working order for anything missed while disconnected
+        for symbol_orders in list(self.working.values()):
+            for order in list(symbol_orders.values()):
+                if order.id is not None:
+                    try:
+                        self.apply(await self.gateway.get_order(order.id, order.symbol))
+                    except Exception as e:
+                        print(f"[ORDER] {order.symbol} resync failed: {e}")
+
+    async def run(self):
+        # deadline timer for every working order, sleeps until the earliest one
+        while True:
+            timeout = None
+            if self._deadlines:
+                timeout = max((self._deadlines[0][0] - clock.now()).total_seconds(), 0)
+            await clock.wait(self._wakeup, timeout)
+            self._wakeup.clear()
+
+            now = clock.now()
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, _, order = heapq.heappop(self._deadlines)
+                if not order.done.is_set() and order.deadline is not None and order.deadline <= now:
+                    order.deadline = None
+                    asyncio.create_task(self._expire(order))
+
+
+# ===== CHECK ===== #
+# OrderManager against fake_broker.py over real REST + trade_updates: fills, partial fills, reprices, replaced legs, cancels
+def _limit(symbol, qty, price, extended_hours=False):
+    return {"symbol": symbol, "qty": str(qty), "side": "buy", "type": "limit", "time_in_force": "day",
+            "limit_price": str(price), "extended_hours": extended_hours}
+
+async def check_orders(port=8091):
+    from fake_broker import start_fake_broker
+    from order_gateway import OrderGateway
+    from trade_stream import TradeUpdatesStream, stream_url
+
+    base_url = f"http://127.0.0.1:{port}"
+    broker, runner = await start_fake_broker(port=port, fill_delay_ms=100)
+    gateway = OrderGateway("check", "check", base_url=base_url)
+    stream = TradeUpdatesStream("check", "check", url=stream_url(base_url))
+    manager = OrderManager(gateway, stream, reprice=lambda order: round(float(order.limit_price) + 0.1, 2), reprice_after=0.2)
+    tasks = [asyncio.create_task(stream.run_forever()), asyncio.create_task(manager.run())]
+    while not stream.running:
+        await asyncio.sleep(0.01)
+
+    async def final(order):
+        assert await manager.wait_final(order, timeout=5), order
+        return order
+
+    def expect(order, filled, avg_price, status):
+        assert order.filled_qty == filled and order.status == status, order
+        assert avg_price is None or abs(order.avg_price - avg_price) < 1e-9, order
+        assert order.symbol not in manager.working, manager.working
+
+    try:
+        # instant: filled in the REST response
+        broker.fill = "instant"
+        expect(await final(await manager.submit(_limit("INST", 100, 10.0))), 100, 10.0, "filled")
+
+        # partial: half now, the rest from the stream
+        broker.fill = "partial"
+        expect(await final(await manager.submit(_limit("PART", 100, 10.0))), 100, 10.0, "filled")
+
+        # cancel after a partial fill: the filled half stays, remaining() is what's left
+        order = await manager.submit(_limit("PCXL", 100, 10.0))
+        await manager.cancel(order)
+        expect(await final(order), 50, 10.0, "canceled")
+        assert order.remaining == 50, order
+
+        # partial + extended hours: each leg half-fills, reprices carry the fills across replaced legs, then canceled
+        broker.fill_delay_ms = 10_000
+        order = await final(await manager.submit(_limit("PLEG", 100, 10.0, extended_hours=True)))
+        expect(order, 87, (50 * 10.0 + 25 * 10.1 + 12 * 10.2) / 87, "canceled")
+        assert order.reprices == 2, order
+
+        # stuck: sits unfilled until repriced, the replacement leg fills
+        broker.fill = "stuck"
+        order = await final(await manager.submit(_limit("STUK", 100, 10.0, extended_hours=True)))
+        expect(order, 100, 10.1, "filled")
+        assert order.reprices == 1, order
+
+        # stuck with no reprices left: canceled unfilled
+        manager.max_reprices = 0
+        expect(await final(await manager.submit(_limit("DEAD", 100, 10.0, extended_hours=True))), 0, None, "canceled")
+    finally:
+        await stream.stop_ws()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await gateway.close()
+        await runner.cleanup()
+    print("[ORDER] order manager check passed (instant, partial, cancel after partial, repriced legs, stuck, canceled)")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("--port", type=int, default=8091)
+    args = parser.parse_args()
+    asyncio.run(check_orders(args.port))
@@ -0,0 +1,135 @@
+import datetime
+from multiprocessing import shared_memory
+
+
+# row layout, 8-byte fields: one 64-byte row (a cache line) per symbol slot
+VERSION = 0 # seqlock: odd while the feed is writing the row
+RECEIVED_NS = 1 # perf_counter_ns the update was received (CLOCK_MONOTONIC, comparable across processes)
+BAR_TS_NS = 2 # 1m bar start, 0 before the first bar
+LAST_PRICE = 3 # floats from here on, NaN = None
+DAY_HIGH = 4
+VWAP = 5
+HIGH_1M = 6
+SYMBOL = 7 # 8 ascii bytes, nul padded, like the journal
+FIELDS = 8
+ROW = FIELDS * 8
+
+NAN = float("nan")
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+# latest confirmed price/high/vwap per symbol in shared memory, written by the feed process and read by the shard workers (shards.py)...
+    # the feed assigns slots as symbols first publish, slots are never reused so a worker can cache slot -> symbol
+    # one writer per row; readers retry while the version is odd or moved during the read, so a row is never seen half-written
+    # nothing is pickled or copied per update, a worker only gets the slot numbers over its pipe
+class PriceTable:
+    def __init__(self, capacity=256, name=None):
+        # name=None creates (feed process), a name attaches to an existing table (workers)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=capacity * ROW if self.owner else 0)
+        self.name = self.shm.name
+        self.capacity = self.shm.size // ROW
+        self.ints = self.shm.buf.cast("q")
+        self.floats = self.shm.buf.cast("d")
+        self.slots = {} # symbol -> slot, feed side
+        self.symbols = {} # slot -> symbol, reader cache
+
+    # ===== FEED SIDE ===== #
+    def slot(self, symbol):
+        # None once the table is full
+        slot = self.slots.get(symbol)
+        if slot is None:
+            if len(self.slots) == self.capacity:
+                return None
+            slot = self.slots[symbol] = len(self.slots)
+            offset = slot * ROW + SYMBOL * 8
+            self.shm.buf[offset:offset + 8] = symbol.encode()[:8].ljust(8, b"\0")
+        return slot
+
+    def write(self, slot, received_ns, last_price, day_high, vwap, high_1m, bar_ts_ns):
+        base = slot * FIELDS
+        ints, floats = self.ints, self.floats
+        ints[base] += 1
+        ints[base + RECEIVED_NS] = received_ns
+        ints[base + BAR_TS_NS] = bar_ts_ns or 0
+        floats[base + LAST_PRICE] = NAN if last_price is None else last_price
+        floats[base + DAY_HIGH] = NAN if day_high is None else day_high
+        floats[base + VWAP] = NAN if vwap is None else vwap
+        floats[base + HIGH_1M] = NAN if high_1m is None else high_1m
+        ints[base] += 1
+
+    # ===== WORKER SIDE ===== #
+    def symbol(self, slot):
+        symbol = self.symbols.get(slot)
+        if symbol is None:
+            offset = slot * ROW + SYMBOL * 8
+            symbol = self.symbols[slot] = bytes(self.shm.buf[offset:offset + 8]).rstrip(b"\0").decode()
+        return symbol
+
+    def read(self, slot, retries=10_000):
+        # (received_ns, bar_ts_ns, last_price, day_high, vwap, high_1m), None if the writer never finished the row
+        base = slot * FIELDS
+        ints, floats = self.ints, self.floats
+        for _ in range(retries):
+            version = ints[base]
+            if version & 1:
+                continue
+            row = (
+                ints[base + RECEIVED_NS], ints[base + BAR_TS_NS],
+                floats[base + LAST_PRICE], floats[base + DAY_HIGH], floats[base + VWAP], floats[base + HIGH_1M],
+            )
+            if ints[base] == version:
+                return row
+        return None
+
+    def close(self):
+        self.ints.release()
+        self.floats.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def value(x):
+    return None if x != x else x # NaN -> None
+
+def bar_datetime(bar_ts_ns):
+    # exact for whole-second bar starts, the same aware UTC datetime market_stream.Bar carries
+    return EPOCH + datetime.timedelta(microseconds=bar_ts_ns // 1000) if bar_ts_ns else None
+
+
+# ===== CHECK ===== #
+# one process rewrites a row as fast as it can with every field equal, the other reads it: any mixed row is a torn read
+def _hammer(name, rounds):
+    table = PriceTable(name=name)
+    slot = table.slot("TEST")
+    for i in range(1, rounds + 1):
+        table.write(slot, i, float(i), float(i), float(i), float(i), i)
+    table.close()
+
+def check_table(rounds=200_000):
+    import multiprocessing
+    table = PriceTable(capacity=4)
+    slot = table.slot("TEST")
+    table.write(slot, 0, 0.0, 0.0, 0.0, 0.0, 0)
+    writer = multiprocessing.get_context("spawn").Process(target=_hammer, args=(table.name, rounds))
+    writer.start()
+    reads = torn = 0
+    while writer.is_alive() or not reads:
+        row = table.read(slot)
+        if row is None:
+            continue
+        received_ns, bar_ts_ns, *prices = row
+        reads += 1
+        if any(p != received_ns for p in prices) or bar_ts_ns != received_ns:
+            torn += 1
+    writer.join()
+    last = table.read(slot)
+    assert torn == 0, f"{torn} torn reads out of {reads}"
+    assert last[0] == rounds and table.symbol(slot) == "TEST", last
+    table.close()
+    print(f"[PRICE TABLE] seqlock check passed ({reads:,} reads against {rounds:,} writes, 0 torn)")
+
+
+if __name__ == "__main__":
+    check_table()
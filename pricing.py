@@ -0,0 +1,77 @@
+import math
+
+from order_gateway import BUY, SELL
+
+
+# minimum price increments (reg NMS rule 612): limit price >= floor -> increment, highest floor first
+    # each row keeps 1/increment so rounding is one multiply + ceil/floor, no Decimal
+TICK_SIZES = (
+    (1.00, 0.01),
+    (0.00, 0.0001),
+)
+_TICK_TABLE = tuple((floor, round(1 / increment)) for floor, increment in TICK_SIZES)
+
+# float noise allowed before rounding moves a whole tick, in ticks: 1.2300000000000002 is 1.23, not 1.24
+_NOISE = 1e-6
+
+
+def ticks_per_dollar(price):
+    for floor, scale in _TICK_TABLE:
+        if price >= floor:
+            return scale
+    return _TICK_TABLE[-1][1]
+
+def round_to_tick(price, side):
+    # buys round up, sells round down, so the rounded limit is never less aggressive than the raw one
+        # the increment follows the limit price, not the last trade: 0.995 bought 1% through is 1.01, not a sub-penny 1.0050
+    scale = ticks_per_dollar(price)
+    if side == BUY:
+        return math.ceil(price * scale - _NOISE) / scale
+    return math.floor(price * scale + _NOISE) / scale
+
+def limit_price(last, side, offset=0.01):
+    # last trade +/- offset (1% default), rounded to a valid tick
+    return round_to_tick(last * (1 + offset) if side == BUY else last * (1 - offset), side)
+
+def quote_limit_price(bid, ask, side, through_ticks=2):
+    # through the far side of the quote: ask + n ticks to buy, bid - n ticks to sell, None if the quote is unusable
+    if bid <= 0 or ask <= 0 or ask < bid:
+        return None
+    if side == BUY:
+        return round_to_tick(ask + through_ticks / ticks_per_dollar(ask), BUY)
+    price = bid - through_ticks / ticks_per_dollar(bid)
+    return round_to_tick(price, SELL) if price > 0 else None
+
+
+def check_against_decimal(samples=200_000, seed=5):
+    # round_to_tick vs the old per-call Decimal quantize, same increment rule as before (last price >= $1 -> cents)
+        # differences are only allowed where Decimal moved a whole tick on float noise (0.505 -> 0.5051), or where the limit
+        # crossed $1 and now gets the limit price's increment
+    import random
+    from decimal import Decimal, ROUND_UP, ROUND_DOWN
+
+    rng = random.Random(seed)
+    boundary, straddle, failures = 0, 0, 0
+    for _ in range(samples):
+        last = round(rng.choice((rng.uniform(0.05, 1.2), rng.uniform(1, 50))), rng.choice((2, 3, 4)))
+        for side, raw, mode in ((BUY, last * 1.01, ROUND_UP), (SELL, last * 0.99, ROUND_DOWN)):
+            step = Decimal("0.01") if last >= 1.00 else Decimal("0.0001")
+            expected = float(Decimal(raw).quantize(step, rounding=mode))
+            got = limit_price(last, side)
+            if got == expected:
+                continue
+            scale = ticks_per_dollar(raw)
+            if (last >= 1.00) != (raw >= 1.00):
+                straddle += 1 # last and limit on either side of $1, the increment now follows the limit
+            elif abs(raw * scale - round(raw * scale)) < _NOISE:
+                boundary += 1 # exactly on a tick, Decimal moved a whole tick on float noise
+            else:
+                failures += 1
+                if failures <= 5:
+                    print(f"[PRICING] MISMATCH {side} last={last} decimal={expected} got={got}")
+    print(f"[PRICING] decimal check {'passed' if not failures else 'FAILED'} ({samples * 2:,} limits, {boundary:,} on a tick boundary, {straddle:,} across $1)")
+    return not failures
+
+
+if __name__ == "__main__":
+    check_against_decimal()
@@ -0,0 +1,337 @@
+import argparse
+import ast
+import asyncio
+import datetime
+import glob
+import os
+import struct
+import time
+import uuid
+from collections import defaultdict
+
+# replays never touch live services: dummy alpaca keys if none are set, no pushbullet
+os.environ.setdefault("API_KEY", "replay")
+os.environ.setdefault("SECRET_KEY", "replay")
+os.environ["PUSHBULLET_API_KEY"] = ""
+
+import clock
+from clock import eastern, SimClock
+from config_store import store as config_store, parse_configs
+from day_trades import DayTradeBudget
+from journal import Journal
+from log_sink import LogSink
+from market_state import timestamp_ns
+
+
+TRADE = 0
+BAR = 1
+QUOTE = 2
+
+
+# stand-ins for alpaca.data.models Trade/Bar/Quote; the handlers only read these attributes
+class ReplayTrade:
+    __slots__ = ("symbol", "price", "size", "timestamp", "conditions")
+
+    def __init__(self, symbol, price, size, timestamp, conditions=()):
+        self.symbol = symbol
+        self.price = price
+        self.size = size
+        self.timestamp = timestamp
+        self.conditions = conditions
+
+class ReplayBar:
+    __slots__ = ("symbol", "open", "high", "low", "close", "volume", "vwap", "timestamp")
+
+    def __init__(self, symbol, open, high, low, close, volume, vwap, timestamp):
+        self.symbol = symbol
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.vwap = vwap
+        self.timestamp = timestamp
+
+class ReplayQuote:
+    __slots__ = ("symbol", "bid_price", "bid_size", "ask_price", "ask_size", "timestamp")
+
+    def __init__(self, symbol, bid_price, bid_size, ask_price, ask_size, timestamp):
+        self.symbol = symbol
+        self.bid_price = bid_price
+        self.bid_size = bid_size
+        self.ask_price = ask_price
+        self.ask_size = ask_size
+        self.timestamp = timestamp
+
+
+# ===== LOADERS ===== #
+# price-stream-logs format (log_sink.py):
+    # "[TAG] {now},{symbol},PRICE {price},VOL {size}, COND {conditions}"
+    # NOTE: {now} is local receive time, used as both trade timestamp and replay time
+    # NOTE: trades between stop and entry aren't logged by handle_trade, so they're missing from these replays
+def parse_log_line(line):
+    try:
+        rest = line[line.index("] ") + 2:] if line.startswith("[") else line
+        now, symbol, price, rest = rest.split(",", 3)
+        size, conditions = rest.split(", COND ", 1)
+        return ReplayTrade(
+            symbol,
+            float(price[len("PRICE "):]),
+            float(size[len("VOL "):]),
+            datetime.datetime.fromisoformat(now.strip()),
+            ast.literal_eval(conditions.strip()),
+        )
+    except (ValueError, SyntaxError):
+        return None
+
+def load_price_stream_logs(paths):
+    trades = []
+    for path in paths:
+        with open(path, "r") as file:
+            for line in file:
+                trade = parse_log_line(line)
+                if trade is not None:
+                    trades.append(trade)
+    trades.sort(key=lambda t: t.timestamp)
+    return trades
+
+def bars_from_trades(trades):
+    # 1m OHLCV+VWAP bars, delivered at minute end like the live bar stream (timestamp = bar start)
+    bars = []
+    current = {}
+    for trade in trades:
+        minute = trade.timestamp.replace(second=0, microsecond=0)
+        bar = current.get(trade.symbol)
+        if bar is not None and bar[0] != minute:
+            bars.append(_close_bar(trade.symbol, bar))
+            bar = None
+        if bar is None:
+            current[trade.symbol] = [minute, trade.price, trade.price, trade.price, trade.price, trade.size, trade.price * trade.size]
+        else:
+            bar[2] = max(bar[2], trade.price)
+            bar[3] = min(bar[3], trade.price)
+            bar[4] = trade.price
+            bar[5] += trade.size
+            bar[6] += trade.price * trade.size
+    for symbol, bar in current.items():
+        bars.append(_close_bar(symbol, bar))
+    return bars
+
+def _close_bar(symbol, bar):
+    minute, open, high, low, close, volume, notional = bar
+    vwap = notional / volume if volume else close
+    return ReplayBar(symbol, open, high, low, close, volume, vwap, minute)
+
+def build_events(trades, bars=None, quotes=()):
+    if bars is None:
+        bars = bars_from_trades(trades)
+    events = [(t.timestamp, TRADE, t) for t in trades]
+    events += [(b.timestamp + datetime.timedelta(minutes=1), BAR, b) for b in bars]
+    events += [(q.timestamp, QUOTE, q) for q in quotes]
+    events.sort(key=lambda e: (e[0], e[1]))
+    return events
+
+
+# compact binary capture: fixed 65-byte records, an order of magnitude faster to load than the text logs
+    # trade: (ts_ns, TRADE, symbol, price, size, 0, 0, 0, 0) - conditions are not kept
+    # bar:   (ts_ns, BAR, symbol, open, high, low, close, volume, vwap) - ts is bar start
+    # quote: (ts_ns, QUOTE, symbol, bid, bid_size, ask, ask_size, 0, 0)
+CAPTURE_RECORD = struct.Struct("<qB8s6d")
+
+def _from_ns(ns):
+    return datetime.datetime.fromtimestamp(ns / 1_000_000_000, eastern)
+
+def write_capture(path, events):
+    with open(path, "wb") as file:
+        for _, kind, msg in events:
+            if kind == TRADE:
+                values = (msg.price, msg.size, 0.0, 0.0, 0.0, 0.0)
+            elif kind == QUOTE:
+                values = (msg.bid_price, msg.bid_size, msg.ask_price, msg.ask_size, 0.0, 0.0)
+            else:
+                values = (msg.open, msg.high, msg.low, msg.close, msg.volume, msg.vwap)
+            file.write(CAPTURE_RECORD.pack(timestamp_ns(msg.timestamp), kind, msg.symbol.encode(), *values))
+
+def read_capture(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    trades, bars, quotes = [], [], []
+    for ts_ns, kind, symbol, a, b, c, d, e, f in CAPTURE_RECORD.iter_unpack(data):
+        symbol = symbol.rstrip(b"\0").decode()
+        if kind == TRADE:
+            trades.append(ReplayTrade(symbol, a, b, _from_ns(ts_ns)))
+        elif kind == QUOTE:
+            quotes.append(ReplayQuote(symbol, a, b, c, d, _from_ns(ts_ns)))
+        else:
+            bars.append(ReplayBar(symbol, a, b, c, d, e, f, _from_ns(ts_ns)))
+    return build_events(trades, bars, quotes)
+
+
+# ===== SIMULATED BROKER ===== #
+# same interface as order_gateway.OrderGateway; fills instantly at limit price, or last confirmed price for market orders
+class SimBroker:
+    def __init__(self, get_price):
+        self.get_price = get_price
+        self.fills = []
+        self.positions = defaultdict(float)
+        self.cash = defaultdict(float)
+
+    def _fill(self, symbol, side, qty, price):
+        qty = float(qty)
+        signed = qty if side == "buy" else -qty
+        self.positions[symbol] += signed
+        self.cash[symbol] -= signed * price
+        self.fills.append((clock.now(), symbol, side, qty, price))
+        return {
+            "id": str(uuid.uuid4()),
+            "symbol": symbol,
+            "side": side,
+            "qty": str(qty),
+            "filled_qty": str(qty),
+            "filled_avg_price": str(price),
+            "status": "filled",
+        }
+
+    async def warm_up(self):
+        pass
+
+    async def submit_order(self, order_data):
+        symbol = order_data["symbol"]
+        price = order_data.get("limit_price") or self.get_price(symbol)
+        return self._fill(symbol, order_data["side"], order_data["qty"], price)
+
+    async def close_position(self, symbol, qty=None):
+        qty = qty if qty is not None else abs(self.positions[symbol])
+        return self._fill(symbol, "sell", qty, self.get_price(symbol))
+
+    async def close_all_positions(self):
+        results = []
+        for symbol, qty in list(self.positions.items()):
+            if qty > 0:
+                results.append({"symbol": symbol, "status": 200, "body": self._fill(symbol, "sell", qty, self.get_price(symbol))})
+        return results
+
+    async def close(self):
+        pass
+
+    def summary(self):
+        for when, symbol, side, qty, price in self.fills:
+            print(f"[FILL] {when} {symbol} {side} {qty:g} @ {price}")
+        for symbol in sorted(self.cash):
+            if self.positions[symbol] == 0 and any(f[1] == symbol and f[2] == "buy" for f in self.fills):
+                print(f"[P/L] {symbol}: {self.cash[symbol]:+.2f}")
+
+
+# ===== ENGINE ===== #
+# feeds recorded messages through the live DataHandler and main's StrategyEngine...
+    # speed=None replays as fast as possible, speed=k replays at k x real time
+    # simulated clock + SimBroker, so runs are deterministic and never touch alpaca/pushbullet
+    # one session (date) per run; filter state in alpaca_utils is module-level
+async def replay(events, configs_path=None, speed=None, out_dir="replay-output", thresholds=None):
+    import alpaca_utils
+    import main
+
+    if not events:
+        print("[REPLAY] Nothing to replay")
+        return None
+
+    if configs_path:
+        config_store.publish(parse_configs(configs_path))
+    for name, value in (thresholds or {}).items():
+        setattr(alpaca_utils, name, value)
+
+    sim = SimClock(events[0][0])
+    clock.set_clock(sim)
+    broker = SimBroker(alpaca_utils.get_current_price)
+    alpaca_utils.gateway = alpaca_utils.order_manager.gateway = broker
+    os.makedirs(out_dir, exist_ok=True)
+    alpaca_utils.log_sink = LogSink(directory=os.path.join(out_dir, "price-stream-logs"), shed=False) # runs faster than live, keep every line to diff
+    alpaca_utils.log_sink.start()
+    main.journal = Journal(os.path.join(out_dir, "journal")) # python3 journal.py show --journal <out>/journal
+    main.day_trades = DayTradeBudget(":memory:") # live limits, fresh budget: the replay never sees (or spends) the live day trades
+    main.CRYPTO_LOG_PATH = os.path.join(out_dir, "crypot_trade_log.txt") # eod_exit's separator lines, not the live file
+
+    replay_symbols = sorted({msg.symbol for _, _, msg in events} & set(config_store.symbols()))
+    tasks = main.engine.tasks # dispatcher + in-flight order/log actions, settled on after every message
+    main.engine.start()
+    for symbol in replay_symbols:
+        main.start_monitor(config_store.get(symbol))
+    await sim.settle(tasks)
+
+    handler = alpaca_utils.handler
+    wall_start = time.perf_counter()
+    first_ts = events[0][0]
+    for when, kind, msg in events:
+        if speed:
+            delay = wall_start + (when - first_ts).total_seconds() / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await sim.advance_to(when, tasks)
+        if kind == TRADE:
+            await handler.handle_trade(msg)
+        elif kind == QUOTE:
+            await handler.handle_quote(msg)
+        else:
+            await handler.handle_bar(msg)
+        await sim.settle(tasks)
+
+    # run the clock past the EOD exit so open positions get closed like a live session
+    session_end = events[-1][0].replace(hour=18, minute=0, second=0, microsecond=0)
+    await sim.advance_to(max(session_end, events[-1][0]), tasks)
+
+    pending = list(tasks)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    await alpaca_utils.log_sink.close()
+    await main.journal.close()
+    await main.notifier.close() # never started: the session's pushes go to stdout here, coalesced
+    clock.set_clock(clock.RealClock())
+
+    elapsed = time.perf_counter() - wall_start
+    print(f"[REPLAY] {len(events)} messages, {len(replay_symbols)} symbols in {elapsed:.2f}s ({len(events) / elapsed:,.0f} msg/s)")
+    return broker
+
+
+def load_events(paths, date=None):
+    if len(paths) == 1 and paths[0].endswith(".bin"):
+        events = read_capture(paths[0])
+    else:
+        events = build_events(load_price_stream_logs(paths))
+    if events:
+        date = date or events[0][0].date()
+        events = [e for e in events if e[0].date() == date]
+    return events
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*", default=sorted(glob.glob("price-stream-logs/price_stream_log_*.txt")))
+    parser.add_argument("--configs", default=None, help="configs json to replay against (default: configs.json)")
+    parser.add_argument("--date", default=None, help="YYYY-MM-DD, default first date in the data")
+    parser.add_argument("--speed", type=float, default=None, help="real-time multiplier, omit for as fast as possible")
+    parser.add_argument("--out", default="replay-output")
+    parser.add_argument("--convert", default=None, help="write the loaded messages to a binary capture and exit")
+    parser.add_argument("--gap-up", type=float, default=None)
+    parser.add_argument("--gap-ticks", type=int, default=None)
+    parser.add_argument("--entry-ticks", type=int, default=None)
+    args = parser.parse_args()
+
+    date = datetime.date.fromisoformat(args.date) if args.date else None
+    events = load_events(args.paths, date)
+
+    if args.convert:
+        write_capture(args.convert, events)
+        print(f"[REPLAY] {len(events)} messages written to {args.convert}")
+    else:
+        thresholds = {}
+        if args.gap_up is not None:
+            thresholds["GAP_UP_THRESHOLD"] = args.gap_up
+        if args.gap_ticks is not None:
+            thresholds["GAP_UP_CONSOLIDATION_TICKS"] = args.gap_ticks
+        if args.entry_ticks is not None:
+            thresholds["ENTRY_CONSOLIDATION_TICKS"] = args.entry_ticks
+
+        broker = asyncio.run(replay(events, args.configs, args.speed, args.out, thresholds))
+        if broker is not None:
+            broker.summary()
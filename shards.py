@@ -0,0 +1,384 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import threading
+import zlib
+from array import array
+
+import clock
+from metrics import registry as metrics
+
+
+# sharded runtime: python3 shards.py [--shards N] instead of python3 main.py...
+    # feed process (this one): the market data websocket, DataHandler filters, price stream logs, journal, push notes, /metrics
+        # every confirmed update is written to a PriceTable row (price_table.py, shared memory) and its slot number is sent,
+        # once per websocket frame, to the worker that owns the symbol
+    # N worker processes: main.py's StrategyEngine + step for the symbols shard_of() gives them, each with its own
+        # order gateway, order manager and trade_updates stream, so a slow/CPU-heavy symbol only holds up its own shard
+        # a worker copies the table row into its local market_state and publishes it on its own market_bus,
+        # so main.step, the getters and limit pricing run unchanged (LIMIT_PRICING=quote falls back to last trade, quotes stay in the feed)
+        # journal rows, push notes and unsubscribes go back to the feed over the same pipe (ShardLink)
+    # the PDT limit is main.day_trades (day_trades.py): every worker opens the same sqlite budget, reserve() is atomic across them
+    # per-worker metrics (tick -> step, step, order ack) are dumped to trade-log/metrics/shard-<n>/
+    # workers ignore SIGINT/SIGTERM, the feed stops them (stop message, then their pipe closes) before its own shutdown
+SHARDS = int(os.getenv("SHARDS", str(max(1, min(4, (os.cpu_count() or 2) - 1))))) # one core left for the feed
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+
+def shard_of(symbol, shards):
+    # stable across processes and restarts (hash() is salted per process)
+    return zlib.crc32(symbol.encode()) % shards
+
+
+# ===== WORKER ===== #
+# worker end of the feed pipe, stands in for main.journal / main.notifier / main.stop_price_quote_bar_stream
+class ShardLink:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def record(self, kind, symbol, qty, price, at=None):
+        self.conn.send(("journal", kind, symbol, float(qty), price, at or clock.now()))
+
+    def notify(self, title, body):
+        self.conn.send(("notify", title, body))
+
+    async def unsubscribe(self, symbol):
+        self.conn.send(("unsubscribe", symbol))
+
+def run_worker(shard, shards, conn, table_name):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    try:
+        asyncio.run(worker_main(shard, shards, conn, table_name))
+    finally:
+        conn.close()
+
+async def worker_main(shard, shards, conn, table_name):
+    import alpaca_utils
+    import main
+    from market_state import timestamp_ns
+    from price_table import PriceTable, value, bar_datetime
+
+    table = PriceTable(name=table_name)
+    link = ShardLink(conn)
+    main.journal = link
+    main.notifier = link
+    main.stop_price_quote_bar_stream = link.unsubscribe
+    market_state, bus = alpaca_utils.market_state, alpaca_utils.market_bus
+    stopped = asyncio.Event()
+
+    def apply(slots):
+        # feed rows -> local market_state, then one flush: main.engine.notify per symbol like in-process
+        for slot in slots:
+            row = table.read(slot)
+            if row is None:
+                continue
+            received_ns, bar_ts_ns, last_price, day_high, vwap, high_1m = row
+            symbol = table.symbol(slot)
+            state = market_state[symbol]
+            state.last_price = value(last_price)
+            state.day_high = value(day_high)
+            state.vwap = value(vwap)
+            state.high_1m = value(high_1m)
+            if bar_ts_ns and (state.bar_timestamp is None or timestamp_ns(state.bar_timestamp) != bar_ts_ns):
+                state.bar_timestamp = bar_datetime(bar_ts_ns)
+            bus.publish(symbol, received_ns)
+        bus.flush()
+
+    def on_message():
+        try:
+            while conn.poll():
+                data = conn.recv_bytes()
+                if not data:
+                    stopped.set()
+                    return
+                apply(array("H", data))
+        except (EOFError, OSError):
+            stopped.set() # feed gone
+
+    def owned(symbol):
+        return shard_of(symbol, shards) == shard
+
+    async def on_config_change(diff):
+        # the feed (re)subscribes the stream, the worker only starts monitoring its new symbols
+        for symbol in diff.added:
+            if owned(symbol):
+                main.start_monitor(main.config_store.get(symbol))
+
+    loop = asyncio.get_running_loop()
+    loop.add_reader(conn.fileno(), on_message)
+    metrics_dir = f"trade-log/metrics/shard-{shard}"
+    metrics.start(metrics_dir)
+    metrics.gauge("day_trades_left", lambda: main.day_trades.last_left)
+    main.config_watcher.add_listener(on_config_change)
+    main.config_watcher.start()
+    tasks = [
+        asyncio.create_task(alpaca_utils.gateway.warm_up()),
+        asyncio.create_task(main.supervisor(alpaca_utils.trade_stream.run_forever, name=f"shard {shard} trade_stream")),
+        asyncio.create_task(main.supervisor(alpaca_utils.order_manager.run, name=f"shard {shard} order_manager")),
+    ]
+    main.engine.start()
+    setups = [setup for symbol, setup in main.config_store.configs.items() if owned(symbol)]
+    for setup in setups:
+        main.start_monitor(setup)
+    print(f"[SHARD {shard}] {len(setups)} symbols: {', '.join(setup.symbol for setup in setups)}")
+
+    await stopped.wait()
+    loop.remove_reader(conn.fileno())
+    await main.config_watcher.stop()
+    await alpaca_utils.trade_stream.stop_ws()
+    pending = tasks + list(main.engine.tasks)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    await alpaca_utils.gateway.close()
+    await metrics.close(metrics_dir)
+    main.day_trades.close()
+    table.close()
+
+
+# ===== FEED ===== #
+# feed -> worker slot messages, sent from a thread per shard...
+    # send_bytes is a blocking pipe write: a worker that stops reading (stuck step, GC pause) fills the pipe
+        # and would stall the feed's loop, i.e. every other shard and the websocket with it
+    # send() only queues on the loop; while the thread is busy, newer updates of the same slot coalesce into one
+        # (the table row holds the latest values, the worker only needs to know which rows to re-read)
+class ShardWriter:
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.slots = {} # slot -> None, insertion-ordered set of the slots not sent yet
+        self.closing = False
+        self.coalesced = 0
+        self.sent = 0
+        self._ready = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def send(self, slots):
+        with self._ready:
+            before = len(self.slots)
+            self.slots.update(dict.fromkeys(slots))
+            self.coalesced += before + len(slots) - len(self.slots)
+            self._ready.notify()
+
+    def close(self):
+        # sends what's queued, then the empty stop message
+        with self._ready:
+            self.closing = True
+            self._ready.notify()
+
+    def _run(self):
+        while True:
+            with self._ready:
+                while not self.slots and not self.closing:
+                    self._ready.wait()
+                slots, self.slots = self.slots, {}
+                closing = self.closing
+            try:
+                if slots:
+                    self.conn.send_bytes(array("H", slots).tobytes())
+                    self.sent += 1
+                if closing:
+                    self.conn.send_bytes(b"")
+                    return
+            except OSError:
+                return # worker gone, on_message reports it
+
+class ShardedFeed:
+    def __init__(self, shards=SHARDS, capacity=256, worker=run_worker):
+        from price_table import PriceTable
+        self.shards = shards
+        self.table = PriceTable(capacity)
+        self.owners = {} # symbol -> shard, shard_of() cached
+        self.pending = [[] for _ in range(shards)] # slots updated this flush, per shard
+        self.exited = [asyncio.Event() for _ in range(shards)]
+        self.stopping = False
+        self.table_full = False
+
+        context = multiprocessing.get_context("spawn") # no fork: the parent's loop/sessions must not leak into workers
+        self.conns, self.processes, self.writers = [], [], []
+        for shard in range(shards):
+            conn, child_conn = context.Pipe()
+            process = context.Process(target=worker, args=(shard, shards, child_conn, self.table.name),
+                                      name=f"shard-{shard}", daemon=True)
+            process.start()
+            child_conn.close()
+            self.conns.append(conn)
+            self.processes.append(process)
+            self.writers.append(ShardWriter(conn, f"shard-{shard}-writer"))
+
+    def start(self, journal, notifier):
+        import alpaca_utils
+        self.journal = journal
+        self.notifier = notifier
+        self.market_state = alpaca_utils.market_state
+        alpaca_utils.market_bus.subscribe(self.publish)
+        alpaca_utils.market_bus.subscribe_flush(self.send)
+        loop = asyncio.get_running_loop()
+        for shard, conn in enumerate(self.conns):
+            loop.add_reader(conn.fileno(), self.on_message, shard)
+        metrics.gauge("shards_alive", lambda: sum(not exited.is_set() for exited in self.exited))
+        metrics.gauge("shard_slots_coalesced", lambda: sum(writer.coalesced for writer in self.writers)) # > 0: a worker fell behind
+
+    def publish(self, symbol, received_ns):
+        # market_bus subscriber: one table row write per confirmed update
+        from market_state import timestamp_ns
+        slot = self.table.slot(symbol)
+        if slot is None:
+            if not self.table_full:
+                self.table_full = True
+                print(f"[SHARDS] Price table full ({self.table.capacity} symbols), {symbol} not routed")
+            return
+        state = self.market_state[symbol]
+        bar_ts_ns = timestamp_ns(state.bar_timestamp) if state.bar_timestamp is not None else 0
+        self.table.write(slot, received_ns, state.last_price, state.day_high, state.vwap, state.high_1m, bar_ts_ns)
+        shard = self.owners.get(symbol)
+        if shard is None:
+            shard = self.owners[symbol] = shard_of(symbol, self.shards)
+        self.pending[shard].append(slot)
+
+    def send(self):
+        # end of a market_bus flush: one message per shard with updates, handed to its writer thread (never blocks the loop)
+        for shard, slots in enumerate(self.pending):
+            if slots:
+                if not self.exited[shard].is_set():
+                    self.writers[shard].send(slots)
+                slots.clear()
+
+    def on_message(self, shard):
+        import alpaca_utils
+        conn = self.conns[shard]
+        try:
+            while conn.poll():
+                message = conn.recv()
+                kind = message[0]
+                if kind == "journal":
+                    self.journal.record(*message[1:])
+                elif kind == "notify":
+                    self.notifier.notify(*message[1:])
+                elif kind == "unsubscribe":
+                    asyncio.create_task(alpaca_utils.stop_price_quote_bar_stream(message[1]))
+        except (EOFError, OSError):
+            asyncio.get_running_loop().remove_reader(conn.fileno())
+            self.exited[shard].set()
+            if not self.stopping:
+                print(f"[SHARDS] Shard {shard} exited (code {self.processes[shard].exitcode}), its symbols are unmanaged")
+                self.notifier.notify("Hybrid bot", f"Shard {shard} exited, its symbols are unmanaged")
+
+    async def stop(self, timeout=30):
+        # workers finish their shutdown (and last journal rows) before the feed closes the journal
+        import alpaca_utils
+        self.stopping = True
+        alpaca_utils.market_bus.unsubscribe(self.publish)
+        alpaca_utils.market_bus.unsubscribe_flush(self.send)
+        for writer in self.writers:
+            writer.close()
+        try:
+            await asyncio.wait_for(asyncio.gather(*(exited.wait() for exited in self.exited)), timeout)
+        except asyncio.TimeoutError:
+            print(f"[SHARDS] Workers still running after {timeout}s, terminating")
+        for process in self.processes:
+            await asyncio.to_thread(process.join, 5)
+            if process.is_alive():
+                process.terminate()
+        for writer in self.writers:
+            await asyncio.to_thread(writer.thread.join, 5) # a terminated worker's closed pipe unblocks a stuck send
+        for shard, conn in enumerate(self.conns):
+            if not self.exited[shard].is_set():
+                asyncio.get_running_loop().remove_reader(conn.fileno())
+            conn.close()
+        self.table.close()
+
+
+async def feed_main(feed):
+    import alpaca_utils
+    from alpaca_utils import start_price_quote_bar_stream, stop_price_quote_bar_stream, subscribe_price_quote_bar_stream
+    from alpaca_utils import run_bar_close_timer, log_sink, stock_stream, set_feed_alert
+    from config_store import store as config_store, ConfigWatcher
+    from journal import Journal
+    from notifier import Notifier, default_sinks
+
+    notifier = Notifier(default_sinks(os.getenv("PUSHBULLET_API_KEY")))
+    journal = Journal()
+    config_watcher = ConfigWatcher(config_store)
+    symbols = config_store.symbols()
+    metrics_runner = None
+    set_feed_alert(lambda message: notifier.notify("Hybrid bot", message))
+
+    async def on_config_change(diff):
+        for symbol in diff.added:
+            if symbol not in symbols:
+                symbols.append(symbol)
+            await subscribe_price_quote_bar_stream(symbol)
+        for symbol in diff.removed:
+            if symbol in symbols:
+                symbols.remove(symbol)
+            await stop_price_quote_bar_stream(symbol)
+
+    try:
+        log_sink.start()
+        notifier.start()
+        journal.start()
+        metrics.start()
+        if METRICS_PORT:
+            try:
+                metrics_runner = await metrics.serve(port=METRICS_PORT)
+            except OSError as e:
+                print(f"[METRICS] Not serving on port {METRICS_PORT}: {e}")
+        feed.start(journal, notifier)
+        config_watcher.add_listener(on_config_change)
+        config_watcher.start()
+        asyncio.create_task(main_supervisor(run_bar_close_timer, "bar_close_timer"))
+        print(f"[SHARDS] Feed up, {feed.shards} strategy workers, {len(symbols)} symbols")
+        await main_supervisor(start_price_quote_bar_stream, "data_stream", symbols)
+    except asyncio.CancelledError:
+        pass # SIGINT/SIGTERM
+    finally:
+        print("Shutting down...")
+        await feed.stop()
+        for symbol in symbols:
+            await stop_price_quote_bar_stream(symbol)
+        await stock_stream.stop_ws()
+        await config_watcher.stop()
+        await log_sink.close()
+        await notifier.close()
+        await journal.close()
+        await metrics.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task() and not t.done()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        print("Cleanup complete. Exiting...")
+
+async def main_supervisor(coro_func, name, *args):
+    # main.supervisor without importing main (its engine/notifier belong to the workers here)
+    try:
+        await coro_func(*args)
+    except Exception as e:
+        print(f"{name} crashed: {e}")
+
+
+def main_start(shards=SHARDS):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    feed = ShardedFeed(shards)
+    feed_task = loop.create_task(feed_main(feed))
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, feed_task.cancel)
+    try:
+        loop.run_until_complete(feed_task)
+    finally:
+        loop.close()
+        print("Event loop closed")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, default=SHARDS, help="strategy worker processes (default SHARDS env or cores - 1, max 4)")
+    args = parser.parse_args()
+    main_start(args.shards)
@@ -0,0 +1,155 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import time
+import traceback
+
+import clock
+from metrics import registry as metrics
+
+
+FLAT = "FLAT"
+PENDING_ENTRY = "PENDING_ENTRY"
+LONG = "LONG"
+HALF_EXITED = "HALF_EXITED"
+CLOSED = "CLOSED"
+
+
+class SymbolRecord:
+    __slots__ = ("symbol", "phase", "busy", "sleep_until", "gate_timestamp", "gate_high", "held", "exiting")
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.phase = FLAT
+        self.busy = False # an order/log action is in flight, events wait for it
+        self.sleep_until = None # ignore events until then (e.g. PDT skip), the timer wakes it
+        self.gate_timestamp = None # 1m bar the last take-profit check ran on
+        self.gate_high = None
+        self.held = 0 # shares held, set by the entry and lowered by what exits actually fill
+        self.exiting = None # exit order still working (TrackedOrder), the record isn't busy while it reprices
+
+
+# one dispatcher task for every symbol, replaces a long-lived monitor_trade coroutine per ticker...
+    # the stream handlers call notify(symbol) (via alpaca_utils.market_bus, once per websocket frame), timers come from schedule(symbol, when)
+    # each wakeup drains the symbols marked since the last one and calls step(record) once per symbol, newest data only
+        # a burst of ticks for one symbol costs one step, quiet symbols cost nothing
+    # step() is synchronous and decides; anything that awaits (orders, trade log, push notes) goes through act(),
+        # which runs it as its own task so one slow order never holds up the other symbols
+        # the record is busy until the action finishes, then takes the given phase and gets stepped again with fresh data
+    # tasks holds the dispatcher plus in-flight actions, replay settles on it
+class StrategyEngine:
+    def __init__(self, step, on_error=None):
+        self.step = step
+        self.on_error = on_error # async on_error(record) after a step/action raised, e.g. unsubscribe the symbol
+        self.records = {}
+        self.tasks = set()
+        self._dirty = {} # symbol -> perf_counter_ns of its newest update (None for timers/actions), insertion ordered
+        self._timers = [] # (when, seq, symbol)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def add(self, symbol):
+        # (re)starts tracking a symbol, a CLOSED record is replaced by a fresh FLAT one
+        record = self.records.get(symbol)
+        if record is None or record.phase == CLOSED:
+            record = self.records[symbol] = SymbolRecord(symbol)
+            self._mark(symbol)
+        return record
+
+    def remove(self, symbol):
+        record = self.records.pop(symbol, None)
+        if record is not None:
+            record.phase = CLOSED
+
+    def notify(self, symbol, received_ns=None):
+        # busy/sleeping/closed records don't wake the dispatcher, the action's completion or the timer does
+        record = self.records.get(symbol)
+        if record is not None and not record.busy and record.sleep_until is None and record.phase != CLOSED:
+            self._mark(symbol, received_ns)
+
+    def _mark(self, symbol, received_ns=None):
+        if received_ns is not None or symbol not in self._dirty:
+            self._dirty[symbol] = received_ns
+        self._wakeup.set()
+
+    def schedule(self, symbol, when):
+        heapq.heappush(self._timers, (when, next(self._seq), symbol))
+        self._wakeup.set()
+
+    def sleep(self, record, seconds):
+        record.sleep_until = clock.now() + datetime.timedelta(seconds=seconds)
+        self.schedule(record.symbol, record.sleep_until)
+
+    def act(self, record, action, phase, pending=None):
+        # runs coroutine `action` off the dispatcher, record.phase = phase once it's done
+            # pending = phase while it's in flight (e.g. PENDING_ENTRY), rolled back if the action raises
+        record.busy = True
+        previous = record.phase
+        if pending is not None:
+            record.phase = pending
+        task = asyncio.create_task(self._run_action(record, action, phase, previous))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run_action(self, record, action, phase, previous):
+        try:
+            await action
+        except Exception as e:
+            # like the old monitor_trade loop: log, run on_error, retry on the next event (not straight away)
+            record.phase = previous
+            record.busy = False
+            print(f"[{record.symbol}] Error: {e}", flush=True)
+            traceback.print_exc()
+            if self.on_error is not None:
+                await self.on_error(record)
+            return
+        record.phase = phase
+        record.busy = False
+        if phase != CLOSED:
+            self.notify(record.symbol)
+
+    def _dispatch(self, symbol, received_ns=None):
+        record = self.records.get(symbol)
+        if record is None or record.busy or record.phase == CLOSED:
+            return
+        if record.sleep_until is not None:
+            if clock.now() < record.sleep_until:
+                return
+            record.sleep_until = None
+        start = time.perf_counter_ns()
+        if received_ns is not None:
+            metrics.observe("tick_to_step_us", symbol, (start - received_ns) // 1000)
+        try:
+            self.step(record)
+            metrics.observe("step_us", symbol, (time.perf_counter_ns() - start) // 1000)
+        except Exception as e:
+            print(f"[{symbol}] Error: {e}", flush=True)
+            traceback.print_exc()
+            if self.on_error is not None:
+                task = asyncio.create_task(self.on_error(record))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+
+    def start(self):
+        task = asyncio.create_task(self.run())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def run(self):
+        while True:
+            if not self._dirty:
+                timeout = None
+                if self._timers:
+                    timeout = max((self._timers[0][0] - clock.now()).total_seconds(), 0)
+                await clock.wait(self._wakeup, timeout)
+            self._wakeup.clear()
+
+            now = clock.now()
+            while self._timers and self._timers[0][0] <= now:
+                self._mark(heapq.heappop(self._timers)[2])
+
+            dirty, self._dirty = self._dirty, {}
+            for symbol, received_ns in dirty.items():
+                self._dispatch(symbol, received_ns)
@@ -0,0 +1,99 @@
+import aiohttp
+import asyncio
+import json
+
+
+PAPER_STREAM_URL = "wss://paper-api.alpaca.markets/stream"
+LIVE_STREAM_URL = "wss://api.alpaca.markets/stream"
+
+
+def stream_url(base_url):
+    # trading REST base url -> its trade updates websocket (fake_broker.py serves both on one port)
+    return base_url.replace("https://", "wss://").replace("http://", "ws://").rstrip("/") + "/stream"
+
+
+# alpaca trading websocket, trade_updates only (order events for this account)...
+    # same shape as market_stream.MarketDataStream: run_forever() connects, authenticates, listens, reconnects on drops
+    # alpaca sends JSON in binary frames on this endpoint (text frames on some proxies), both are accepted
+    # handler(data) gets the "data" dict of each trade_updates message: {"event": "fill", "order": {...}, ...}
+    # on_connect() runs after every (re)connect, e.g. to resync orders that changed while disconnected
+class TradeUpdatesStream:
+    def __init__(self, api_key, secret_key, url=PAPER_STREAM_URL, reconnect_delay=1.0):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.url = url
+        self.reconnect_delay = reconnect_delay
+        self.handler = None
+        self.on_connect = None
+        self.running = False # connected + authorized + listening
+
+        self._session = None
+        self._ws = None
+        self._should_run = True
+
+    def subscribe_trade_updates(self, handler):
+        self.handler = handler
+
+    async def _receive(self):
+        frame = await self._ws.receive()
+        if frame.type not in (aiohttp.WSMsgType.BINARY, aiohttp.WSMsgType.TEXT):
+            raise ConnectionError(f"websocket closed ({frame.type.name})")
+        return json.loads(frame.data)
+
+    async def _connect(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        self._ws = await self._session.ws_connect(self.url, heartbeat=10)
+
+        await self._ws.send_str(json.dumps({"action": "auth", "key": self.api_key, "secret": self.secret_key}))
+        msg = await self._receive()
+        if msg.get("stream") != "authorization" or msg.get("data", {}).get("status") != "authorized":
+            raise ValueError(f"trade updates auth failed: {msg}")
+
+        await self._ws.send_str(json.dumps({"action": "listen", "data": {"streams": ["trade_updates"]}}))
+        msg = await self._receive()
+        if msg.get("stream") != "listening" or "trade_updates" not in msg.get("data", {}).get("streams", []):
+            raise ValueError(f"trade updates listen failed: {msg}")
+        self.running = True
+        print("[TRADE STREAM] Listening for trade updates")
+        if self.on_connect is not None:
+            await self.on_connect()
+
+    async def _consume(self):
+        async for frame in self._ws:
+            if frame.type == aiohttp.WSMsgType.ERROR:
+                raise ConnectionError(f"websocket error: {self._ws.exception()}")
+            if frame.type not in (aiohttp.WSMsgType.BINARY, aiohttp.WSMsgType.TEXT):
+                continue
+            msg = json.loads(frame.data)
+            if msg.get("stream") == "trade_updates" and self.handler is not None:
+                self.handler(msg["data"])
+        if self._should_run:
+            raise ConnectionError("websocket closed by server")
+
+    async def run_forever(self):
+        self._should_run = True
+        try:
+            while self._should_run:
+                try:
+                    await self._connect()
+                    await self._consume()
+                except (aiohttp.ClientError, ConnectionError, asyncio.TimeoutError) as e:
+                    if not self._should_run:
+                        break
+                    print(f"[TRADE STREAM] Connection lost ({e!r}), reconnecting in {self.reconnect_delay}s...")
+                    await asyncio.sleep(self.reconnect_delay)
+                finally:
+                    self.running = False
+                    if self._ws is not None:
+                        await self._ws.close()
+                        self._ws = None
+        finally:
+            if self._session is not None:
+                await self._session.close()
+                self._session = None
+
+    async def stop_ws(self):
+        self._should_run = False
+        if self._ws is not None:
+            await self._ws.close()